@@ -1,32 +1,2347 @@
 import cv2
 import numpy as np
 import requests
-from ultralytics import YOLO
+from model_backends import ModelBackends
 import time
 import os
+import re
+import json
+import ssl
+import threading
+import asyncio
+import weakref
+import bisect
+import multiprocessing
+from multiprocessing import shared_memory
+from collections import deque, OrderedDict
+from queue import Queue, Empty, Full
+
+try:
+    import websocket  # websocket-client, hanya untuk capture_source="websocket"
+except ImportError:
+    websocket = None
+
+try:
+    import paho.mqtt.client as mqtt  # hanya untuk camera discovery
+except ImportError:
+    mqtt = None
+
+try:
+    import aiohttp  # hanya untuk AsyncDeviceIO (server v1-v3)
+except ImportError:
+    aiohttp = None
+
+class FrameReader:
+    def __init__(self, url, timeout=5, reconnect_delay=1.0, max_reconnect_delay=10.0):
+        """
+        Base untuk persistent camera reader (MJPEG /stream, WebSocket)
+        Background thread menyimpan JPEG terbaru, read() mengambil frame (+ timestamp) yang belum dibaca
+        """
+        self.url = url
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        
+        # Latest frame (JPEG bytes) dari kamera
+        self.latest_jpeg = None
+        self.latest_timestamp = 0.0
+        self.frame_seq = 0
+        self._last_read_seq = 0
+        self._condition = threading.Condition()
+        
+        # Frame interval (detik) antar frame yang diterima
+        self.frame_interval = 0.0
+        self.avg_frame_interval = 0.0
+        self._last_frame_time = 0.0
+        
+        # Connection state
+        self.connected = False
+        self.reconnect_count = 0
+        self.running = False
+        self.closed = False
+        self._thread = None
+    
+    def start(self):
+        """Start background reader thread"""
+        if not self.running and not self.closed:
+            self.running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop background reader thread and close connection"""
+        self.running = False
+        self._close()
+        if self._thread:
+            self._thread.join(timeout=2)
+        with self._condition:
+            self._condition.notify_all()
+    
+    def close(self):
+        """Stop for good: start() is ignored afterwards (reader diganti saat IP kamera berubah)"""
+        self.closed = True
+        self.stop()
+    
+    def read(self, timeout=2.0):
+        """
+        Return newest JPEG frame yang belum pernah dibaca beserta waktu diterimanya
+        Returns (jpeg, timestamp), (None, None) jika tidak ada frame baru dalam waktu timeout
+        """
+        with self._condition:
+            if self.frame_seq == self._last_read_seq:
+                self._condition.wait_for(
+                    lambda: self.frame_seq != self._last_read_seq or not self.running,
+                    timeout=timeout
+                )
+            if self.frame_seq == self._last_read_seq:
+                return None, None
+            self._last_read_seq = self.frame_seq
+            return self.latest_jpeg, self.latest_timestamp
+    
+    @property
+    def fps(self):
+        """Frame rate yang dikirim kamera (dari rata-rata frame interval)"""
+        return 1.0 / self.avg_frame_interval if self.avg_frame_interval > 0 else 0.0
+    
+    def _run(self):
+        raise NotImplementedError
+    
+    def _close(self):
+        """Close the active connection (called from stop)"""
+    
+    def _mark_connected(self):
+        """Connection (re)opened: interval berikutnya diukur dari frame pertama koneksi ini"""
+        self.connected = True
+        self._last_frame_time = 0.0
+    
+    def _publish(self, jpeg):
+        """Replace latest frame, update frame interval and wake up waiting readers"""
+        now = time.time()
+        with self._condition:
+            if self._last_frame_time:
+                self.frame_interval = now - self._last_frame_time
+                # Exponential moving average
+                if self.avg_frame_interval:
+                    self.avg_frame_interval = 0.9 * self.avg_frame_interval + 0.1 * self.frame_interval
+                else:
+                    self.avg_frame_interval = self.frame_interval
+            self._last_frame_time = now
+            self.latest_jpeg = jpeg
+            self.latest_timestamp = now
+            self.frame_seq += 1
+            self._condition.notify_all()
+
+class MJPEGStreamReader(FrameReader):
+    def __init__(self, stream_url, timeout=5, chunk_size=4096, reconnect_delay=1.0, max_reconnect_delay=10.0):
+        """
+        Persistent reader untuk endpoint /stream (multipart MJPEG)
+        Koneksi dibuka sekali, frame JPEG dipisah per boundary di background thread
+        """
+        super().__init__(stream_url, timeout=timeout, reconnect_delay=reconnect_delay,
+                         max_reconnect_delay=max_reconnect_delay)
+        self.stream_url = stream_url
+        self.chunk_size = chunk_size
+        self._response = None
+    
+    def _close(self):
+        if self._response is not None:
+            try:
+                self._response.close()
+            except Exception:
+                pass
+    
+    def _run(self):
+        """Connect, read multipart stream and reconnect with backoff on failure"""
+        delay = self.reconnect_delay
+        
+        while self.running:
+            try:
+                self._response = requests.get(self.stream_url, stream=True, timeout=self.timeout)
+                if self._response.status_code != 200:
+                    raise ConnectionError(f"stream responded with status {self._response.status_code}")
+                
+                boundary = self._parse_boundary(self._response.headers.get("Content-Type", ""))
+                self._mark_connected()
+                print(f"✅ MJPEG stream connected: {self.stream_url}")
+                
+                buffer = bytearray()
+                for chunk in self._response.iter_content(chunk_size=self.chunk_size):
+                    if not self.running:
+                        break
+                    if not chunk:
+                        continue
+                    buffer.extend(chunk)
+                    
+                    for jpeg in self._split_frames(buffer, boundary):
+                        self._publish(jpeg)
+                        delay = self.reconnect_delay
+                
+                if self.running:
+                    raise ConnectionError("stream closed by camera")
+                
+            except Exception as e:
+                if not self.running:
+                    break
+                self.connected = False
+                self.reconnect_count += 1
+                print(f"⚠️ MJPEG stream error: {e} - reconnecting in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            
+            finally:
+                self.connected = False
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+    
+    @staticmethod
+    def _parse_boundary(content_type):
+        """Get boundary token from multipart Content-Type header"""
+        match = re.search(r'boundary=\"?([^";]+)\"?', content_type)
+        # Default boundary dari firmware ESP32-CAM
+        boundary = match.group(1) if match else "123456789000000000000987654321"
+        # Firmware menulis boundary dengan "--" baik di header maupun body,
+        # jadi cocokkan token tanpa dash agar kedua format terbaca
+        return boundary.strip().lstrip("-").encode("latin-1")
+    
+    @staticmethod
+    def _split_frames(buffer, boundary):
+        """Extract complete JPEG parts from buffer, leaving partial data in place"""
+        frames = []
+        
+        while True:
+            start = buffer.find(boundary)
+            if start < 0:
+                # Keep tail in case the boundary is split across chunks
+                if len(buffer) > len(boundary):
+                    del buffer[:len(buffer) - len(boundary)]
+                break
+            
+            header_start = start + len(boundary)
+            header_end = buffer.find(b"\r\n\r\n", header_start)
+            if header_end < 0:
+                del buffer[:start]
+                break
+            
+            headers = bytes(buffer[header_start:header_end]).decode("latin-1").lower()
+            body_start = header_end + 4
+            length_match = re.search(r"content-length:\s*(\d+)", headers)
+            
+            if length_match:
+                body_end = body_start + int(length_match.group(1))
+                if len(buffer) < body_end:
+                    del buffer[:start]
+                    break
+                # memoryview: satu copy ke bytes, tanpa bytearray slice sementara
+                with memoryview(buffer) as view:
+                    frames.append(bytes(view[body_start:body_end]))
+                del buffer[:body_end]
+            else:
+                # Tanpa Content-Length: body berakhir di boundary berikutnya
+                next_boundary = buffer.find(boundary, body_start)
+                if next_boundary < 0:
+                    del buffer[:start]
+                    break
+                frames.append(bytes(buffer[body_start:next_boundary]).rstrip(b"-").rstrip(b"\r\n"))
+                del buffer[:next_boundary]
+        
+        return frames
+
+class WebSocketFrameReader(FrameReader):
+    def __init__(self, ws_url, timeout=5, reconnect_delay=1.0, max_reconnect_delay=10.0):
+        """
+        Persistent reader untuk WebSocket ESP32-CAM v7 (port 81)
+        Kirim START_STREAM, kamera push frame JPEG sebagai binary message
+        """
+        if websocket is None:
+            raise ImportError("websocket-client is required for capture_source='websocket' "
+                              "(pip install websocket-client)")
+        super().__init__(ws_url, timeout=timeout, reconnect_delay=reconnect_delay,
+                         max_reconnect_delay=max_reconnect_delay)
+        self.ws_url = ws_url
+        self.camera_status = {}
+        self._ws = None
+    
+    def _close(self):
+        if self._ws is not None:
+            try:
+                self._ws.abort()
+            except Exception:
+                pass
+    
+    def _run(self):
+        """Connect, start streaming, receive binary frames and reconnect with backoff on failure"""
+        delay = self.reconnect_delay
+        
+        while self.running:
+            try:
+                self._ws = websocket.create_connection(self.ws_url, timeout=self.timeout)
+                self._ws.send("START_STREAM")
+                self._mark_connected()
+                print(f"✅ WebSocket connected: {self.ws_url}")
+                
+                while self.running:
+                    # Timeout tanpa frame = stream macet, reconnect
+                    opcode, payload = self._ws.recv_data()
+                    if opcode == websocket.ABNF.OPCODE_BINARY:
+                        # JPEG bytes langsung dari frame buffer kamera
+                        self._publish(payload)
+                        delay = self.reconnect_delay
+                    elif opcode == websocket.ABNF.OPCODE_TEXT:
+                        # Welcome / status message (JSON)
+                        try:
+                            self.camera_status = json.loads(payload)
+                        except ValueError:
+                            pass
+                    elif opcode == websocket.ABNF.OPCODE_CLOSE:
+                        raise ConnectionError("socket closed by camera")
+                
+            except Exception as e:
+                if not self.running:
+                    break
+                self.connected = False
+                self.reconnect_count += 1
+                print(f"⚠️ WebSocket error: {e} - reconnecting in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+            
+            finally:
+                self.connected = False
+                if self._ws is not None:
+                    try:
+                        self._ws.close(timeout=1)
+                    except Exception:
+                        pass
+                    self._ws = None
+
+class JpegDecoder:
+    # Reduction factor -> imread flag (libjpeg DCT scaling, tanpa decode full resolution dulu)
+    REDUCED_FLAGS = {
+        1: cv2.IMREAD_COLOR,
+        2: cv2.IMREAD_REDUCED_COLOR_2,
+        4: cv2.IMREAD_REDUCED_COLOR_4,
+        8: cv2.IMREAD_REDUCED_COLOR_8,
+    }
+    
+    def __init__(self, min_size=640, max_reduction=8, roi=None):
+        """
+        JPEG decode pada skala terkecil yang masih >= input model
+        min_size: sisi terpanjang (bagian yang di-inference) minimal setelah decode, None = full resolution
+        roi: RegionOfInterest, yang harus >= min_size adalah crop ROI, bukan full frame
+        """
+        self.min_size = min_size
+        self.max_reduction = max_reduction
+        self.roi = roi
+        
+        self.scale = 1
+        self.source_size = None
+        
+        # Statistics
+        self.frames = 0
+        self.last_decode_time = 0.0
+        self.avg_decode_time = 0.0
+    
+    @staticmethod
+    def jpeg_size(data):
+        """(width, height) dari SOF marker tanpa decode, None jika tidak ditemukan"""
+        index, length = 2, len(data)
+        while index + 9 < length:
+            if data[index] != 0xFF:
+                index += 1
+                continue
+            marker = data[index + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                index += 1 if marker == 0xFF else 2
+                continue
+            segment = (data[index + 2] << 8) | data[index + 3]
+            # SOF0..SOF15 kecuali DHT (C4), JPG (C8), DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height = (data[index + 5] << 8) | data[index + 6]
+                width = (data[index + 7] << 8) | data[index + 8]
+                return width, height
+            index += 2 + segment
+        return None
+    
+    def choose_scale(self, width, height):
+        """Reduction terbesar yang masih menyisakan min_size pixel di sisi terpanjang"""
+        if not self.min_size:
+            return 1
+        fx, fy = self.roi.extent(width, height) if self.roi is not None else (1.0, 1.0)
+        needed = max(width * fx, height * fy)
+        for scale in (8, 4, 2):
+            if scale <= self.max_reduction and needed / scale >= self.min_size:
+                return scale
+        return 1
+    
+    def decode(self, jpeg):
+        """Decode JPEG bytes ke BGR frame pada skala yang dipilih, None jika gagal"""
+        if jpeg is None:
+            return None
+        start_time = time.perf_counter()
+        
+        size = self.jpeg_size(jpeg)
+        if size is not None and size != self.source_size:
+            self.source_size = size
+            self.scale = self.choose_scale(*size)
+            if self.roi is not None:
+                self.roi.pixel_scale = self.scale
+        
+        # OpenCV Python tidak punya imdecode(dst=...), buffer output selalu dialokasikan oleh imdecode
+        frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), self.REDUCED_FLAGS[self.scale])
+        
+        self.last_decode_time = time.perf_counter() - start_time
+        self.frames += 1
+        self.avg_decode_time = self.last_decode_time if self.frames == 1 else \
+            0.9 * self.avg_decode_time + 0.1 * self.last_decode_time
+        return frame
+
+class FramePool:
+    def __init__(self, max_free=4):
+        """
+        Pool frame-sized NumPy buffers (annotation, overlay) supaya tidak alokasi baru setiap frame
+        acquire() ambil buffer bebas dengan shape/dtype yang sama, release() kembalikan ke pool
+        Buffer yang tidak pernah di-release (mis. dibuang pipeline) cukup di-garbage-collect
+        max_free: buffer bebas maksimum per shape
+        """
+        self.max_free = max_free
+        self._free = {}
+        self._in_use = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        
+        # Statistics
+        self.allocations = 0
+        self.reuses = 0
+    
+    @property
+    def in_use(self):
+        return len(self._in_use)
+    
+    @property
+    def free(self):
+        return sum(len(buffers) for buffers in self._free.values())
+    
+    @property
+    def occupancy(self):
+        """Fraksi buffer pool yang sedang dipakai"""
+        total = self.in_use + self.free
+        return self.in_use / total if total else 0.0
+    
+    @property
+    def reuse_ratio(self):
+        total = self.allocations + self.reuses
+        return self.reuses / total if total else 0.0
+    
+    def acquire(self, shape, dtype=np.uint8):
+        """Buffer kosong (isi tidak di-reset) dengan shape & dtype ini"""
+        key = (tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            free = self._free.get(key)
+            buffer = free.pop() if free else None
+            if buffer is None:
+                self.allocations += 1
+            else:
+                self.reuses += 1
+        if buffer is None:
+            buffer = np.empty(shape, dtype=dtype)
+        with self._lock:
+            self._in_use[id(buffer)] = buffer
+        return buffer
+    
+    def copy(self, frame):
+        """Pengganti frame.copy() dari pool"""
+        buffer = self.acquire(frame.shape, frame.dtype)
+        np.copyto(buffer, frame)
+        return buffer
+    
+    def release(self, buffer):
+        """Kembalikan buffer ke pool (buffer yang bukan dari pool / sudah di-release diabaikan)"""
+        if buffer is None:
+            return
+        with self._lock:
+            if self._in_use.get(id(buffer)) is not buffer:
+                return
+            del self._in_use[id(buffer)]
+            free = self._free.setdefault((buffer.shape, buffer.dtype.str), [])
+            if len(free) < self.max_free:
+                free.append(buffer)
+    
+    def stats(self):
+        return {
+            'in_use': self.in_use,
+            'free': self.free,
+            'occupancy': self.occupancy,
+            'allocations': self.allocations,
+            'reuses': self.reuses,
+        }
+
+class OverlayRenderer:
+    def __init__(self, cache_size=256, font=cv2.FONT_HERSHEY_SIMPLEX):
+        """
+        Annotation murah: label box di-render sekali ke sprite (LRU cache), lalu hanya di-copy ke frame
+        Panel semi-transparan di-blend hanya pada area panel, bukan seluruh frame
+        cache_size: jumlah sprite maksimum (label per class + confidence)
+        """
+        self.cache_size = cache_size
+        self.font = font
+        self._sprites = OrderedDict()
+        self._panels = {}
+        
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+    
+    @property
+    def cached(self):
+        return len(self._sprites)
+    
+    def _sprite(self, text, background, color, scale, thickness):
+        """Label (kotak background + text) yang sudah di-render, dari cache kalau ada"""
+        key = (text, background, color, scale, thickness)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        
+        # Geometri sama dengan rectangle (x, y - h - 10)..(x + w, y) + putText di (x, y - 5)
+        (width, height), _ = cv2.getTextSize(text, self.font, scale, thickness)
+        sprite = np.empty((height + 11, width + 1, 3), dtype=np.uint8)
+        sprite[:] = background
+        cv2.putText(sprite, text, (0, height + 5), self.font, scale, color, thickness)
+        
+        self._sprites[key] = sprite
+        if len(self._sprites) > self.cache_size:
+            self._sprites.popitem(last=False)
+        return sprite
+    
+    def draw_label(self, frame, text, x, y, background, color=(255, 255, 255), scale=0.6, thickness=2,
+                   prefix=None):
+        """
+        Label di atas box (x, y = pojok kiri atas box), di-copy dari sprite cache
+        prefix: teks yang terus berganti (track id) digambar langsung dengan putText di kiri sprite,
+        supaya tidak ikut jadi key cache
+        """
+        if prefix:
+            (width, height), _ = cv2.getTextSize(prefix, self.font, scale, thickness)
+            cv2.rectangle(frame, (x, y - height - 10), (x + width, y), background, -1)
+            cv2.putText(frame, prefix, (x, y - 5), self.font, scale, color, thickness)
+            x += width + 1
+        sprite = self._sprite(text, background, color, scale, thickness)
+        x0, y0 = x, y - sprite.shape[0] + 1
+        height, width = frame.shape[:2]
+        
+        # Clip sprite ke dalam frame (box di tepi atas/kiri)
+        fx0, fy0 = max(x0, 0), max(y0, 0)
+        fx1, fy1 = min(x0 + sprite.shape[1], width), min(y0 + sprite.shape[0], height)
+        if fx0 >= fx1 or fy0 >= fy1:
+            return frame
+        frame[fy0:fy1, fx0:fx1] = sprite[fy0 - y0:fy1 - y0, fx0 - x0:fx1 - x0]
+        return frame
+    
+    def panel(self, frame, top_left, bottom_right, alpha=0.6, color=(0, 0, 0)):
+        """Panel semi-transparan: addWeighted hanya pada ROI panel (panel solid di-cache per ukuran)"""
+        height, width = frame.shape[:2]
+        x0, y0 = max(top_left[0], 0), max(top_left[1], 0)
+        x1, y1 = min(bottom_right[0] + 1, width), min(bottom_right[1] + 1, height)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+        roi = frame[y0:y1, x0:x1]
+        
+        key = (roi.shape, color)
+        solid = self._panels.get(key)
+        if solid is None:
+            solid = np.full(roi.shape, color, dtype=np.uint8)
+            self._panels[key] = solid
+        cv2.addWeighted(solid, alpha, roi, 1.0 - alpha, 0, dst=roi)
+        return frame
+
+class BufferedFrame:
+    def __init__(self, frame, timestamp, seq):
+        """Frame yang disimpan di ring buffer beserta waktu capture"""
+        self.frame = frame
+        self.timestamp = timestamp
+        self.seq = seq
+    
+    @property
+    def age(self):
+        """Seconds since the frame was captured"""
+        return time.time() - self.timestamp
+
+class FrameRingBuffer:
+    def __init__(self, capacity=3):
+        """
+        Fixed-size ring buffer, latest-frame-wins
+        Frame terlama dibuang saat buffer penuh
+        """
+        self.capacity = capacity
+        self._frames = deque(maxlen=capacity)
+        self._condition = threading.Condition()
+        
+        # Statistics
+        self.seq = 0
+        self.dropped_frames = 0
+    
+    def put(self, frame, timestamp=None):
+        """Add frame, evicting the oldest one if the buffer is full"""
+        with self._condition:
+            if len(self._frames) == self.capacity:
+                self.dropped_frames += 1
+            self.seq += 1
+            self._frames.append(BufferedFrame(frame, timestamp or time.time(), self.seq))
+            self._condition.notify_all()
+    
+    def get_latest(self, timeout=2.0):
+        """
+        Take newest frame and discard older ones (counted as dropped)
+        Returns None jika buffer tetap kosong sampai timeout
+        """
+        with self._condition:
+            if not self._frames:
+                self._condition.wait_for(lambda: len(self._frames) > 0, timeout=timeout)
+            if not self._frames:
+                return None
+            latest = self._frames.pop()
+            self.dropped_frames += len(self._frames)
+            self._frames.clear()
+            return latest
+    
+    def clear(self):
+        """Drop all buffered frames without counting them"""
+        with self._condition:
+            self._frames.clear()
+    
+    def __len__(self):
+        return len(self._frames)
+
+class SharedFrameBus:
+    # Sequence counter bersama di awal segmen: writer yang di-restart (proses capture baru
+    # untuk bus yang sama) melanjutkan seq, bukan mulai dari 0 lagi
+    COUNTER_DTYPE = np.dtype(np.int64)
+    # Header per slot: sequence number (-1 = sedang ditulis), jumlah reader aktif, ukuran frame,
+    # reduction factor JPEG decode, waktu capture
+    HEADER_DTYPE = np.dtype([('seq', np.int64), ('readers', np.int32), ('height', np.int32),
+                             ('width', np.int32), ('channels', np.int32), ('scale', np.int32),
+                             ('timestamp', np.float64)])
+    
+    def __init__(self, slots=4, max_shape=(1200, 1600, 3)):
+        """
+        Frame bus antar proses di atas multiprocessing.shared_memory
+        Frame hasil decode ditulis ke slot tetap, hanya metadata kecil (slot, seq, timestamp) lewat Queue
+        Reader memakai frame langsung dari shared memory (zero-copy), slot yang sedang dibaca tidak ditimpa
+        max_shape: frame terbesar yang muat di satu slot (default UXGA ESP32-CAM)
+        Proses lain attach hanya dengan menerima objek ini (argumen multiprocessing.Process),
+        supaya lock & queue ikut ter-share; attach lewat nama saja tidak didukung
+        """
+        self.slots = slots
+        self.max_shape = tuple(max_shape)
+        self.slot_size = int(np.prod(self.max_shape))
+        header_size = self.COUNTER_DTYPE.itemsize + self.HEADER_DTYPE.itemsize * slots
+        
+        self._owner = True
+        self._shm = shared_memory.SharedMemory(create=True, size=header_size + self.slot_size * slots)
+        self._lock = multiprocessing.Lock()
+        self.queue = multiprocessing.Queue(maxsize=slots - 1)
+        self._attach()
+        
+        self._counter[0] = 0
+        self._header['seq'] = -1
+        self._header['readers'] = 0
+    
+    def _attach(self):
+        counter_size = self.COUNTER_DTYPE.itemsize
+        header_size = counter_size + self.HEADER_DTYPE.itemsize * self.slots
+        self._counter = np.ndarray((1,), dtype=self.COUNTER_DTYPE, buffer=self._shm.buf)
+        self._header = np.ndarray((self.slots,), dtype=self.HEADER_DTYPE, buffer=self._shm.buf,
+                                  offset=counter_size)
+        self._data = np.ndarray((self.slots, self.slot_size), dtype=np.uint8, buffer=self._shm.buf,
+                                offset=header_size)
+        
+        # State lokal per proses
+        self._next_slot = 0
+        self._held = None
+        self.dropped = 0
+    
+    def __getstate__(self):
+        # Pickle hanya nama shared memory + primitive multiprocessing, bukan isi frame
+        return {'slots': self.slots, 'max_shape': self.max_shape, 'slot_size': self.slot_size,
+                'name': self._shm.name, 'lock': self._lock, 'queue': self.queue}
+    
+    def __setstate__(self, state):
+        self.slots = state['slots']
+        self.max_shape = state['max_shape']
+        self.slot_size = state['slot_size']
+        self._owner = False
+        self._shm = shared_memory.SharedMemory(name=state['name'])
+        self._lock = state['lock']
+        self.queue = state['queue']
+        self._attach()
+    
+    @property
+    def name(self):
+        return self._shm.name
+    
+    @property
+    def closed(self):
+        return self._header is None
+    
+    @property
+    def seq(self):
+        """Sequence number frame terakhir yang ditulis (oleh writer mana pun)"""
+        return int(self._counter[0])
+    
+    def put(self, frame, timestamp=None, scale=1):
+        """
+        Writer (satu proses): copy frame ke slot bebas, kirim metadata ke reader
+        scale: reduction factor JPEG decode (JpegDecoder.scale) supaya reader bisa map koordinat
+        Returns sequence number, None jika frame terlalu besar / semua slot sedang dibaca
+        """
+        if frame.dtype != np.uint8 or frame.size > self.slot_size:
+            print(f"⚠️ Frame {frame.shape} does not fit shared frame slot {self.max_shape}")
+            return None
+        
+        with self._lock:
+            for offset in range(self.slots):
+                slot = (self._next_slot + offset) % self.slots
+                if self._header[slot]['readers'] == 0:
+                    break
+            else:
+                self.dropped += 1
+                return None
+            self._header[slot]['seq'] = -1
+        
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+        self._data[slot, :frame.size].reshape(frame.shape)[...] = frame
+        
+        timestamp = timestamp or time.time()
+        with self._lock:
+            self._counter[0] += 1
+            seq = int(self._counter[0])
+            header = self._header[slot]
+            header['height'], header['width'], header['channels'] = height, width, channels
+            header['scale'], header['timestamp'] = scale, timestamp
+            header['seq'] = seq
+        self._next_slot = (slot + 1) % self.slots
+        
+        # Latest-frame-wins: metadata terlama dibuang kalau reader tertinggal
+        meta = (slot, seq, timestamp)
+        while True:
+            try:
+                self.queue.put_nowait(meta)
+                break
+            except Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except Empty:
+                    pass
+        return seq
+    
+    def _view(self, slot):
+        header = self._header[slot]
+        shape = (int(header['height']), int(header['width']))
+        if header['channels'] > 1:
+            shape += (int(header['channels']),)
+        return self._data[slot, :int(np.prod(shape))].reshape(shape)
+    
+    def _hold(self, slot, seq):
+        """Tandai slot sedang dibaca jika isinya masih frame seq (belum ditimpa)"""
+        with self._lock:
+            if seq < 0 or self._header[slot]['seq'] != seq:
+                return False
+            self._header[slot]['readers'] += 1
+        self._held = slot
+        return True
+    
+    def release(self):
+        """Lepas slot yang sedang dibaca supaya bisa ditulis lagi"""
+        if self._held is not None:
+            with self._lock:
+                self._header[self._held]['readers'] -= 1
+            self._held = None
+    
+    def get(self, timeout=2.0):
+        """
+        Consumer utama (lewat queue): frame terbaru, view langsung ke shared memory
+        Frame valid sampai get()/latest()/release() berikutnya
+        Returns (frame, seq, timestamp, scale) atau None saat timeout
+        """
+        self.release()
+        deadline = time.time() + max(timeout, 0)
+        while True:
+            try:
+                remaining = deadline - time.time()
+                meta = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except Empty:
+                return None
+            
+            # Lewati metadata lama yang sudah menumpuk
+            while True:
+                try:
+                    meta = self.queue.get_nowait()
+                    self.dropped += 1
+                except Empty:
+                    break
+            
+            slot, seq, timestamp = meta
+            if self._hold(slot, seq):
+                return self._view(slot), seq, timestamp, int(self._header[slot]['scale'])
+    
+    def latest(self, after_seq=0):
+        """
+        Observer tambahan (mis. web server) tanpa queue: frame terbaru dengan seq > after_seq
+        Returns (frame, seq, timestamp, scale) atau None jika belum ada frame baru
+        """
+        self.release()
+        with self._lock:
+            seqs = self._header['seq']
+            slot = int(np.argmax(seqs))
+            seq = int(seqs[slot])
+        if seq <= after_seq or not self._hold(slot, seq):
+            return None
+        header = self._header[slot]
+        return self._view(slot), seq, float(header['timestamp']), int(header['scale'])
+    
+    def detach(self):
+        """Lepas shared memory di proses ini (segmen tetap ada untuk proses lain)"""
+        if self._header is None:
+            return
+        self.release()
+        self._counter = self._header = self._data = None
+        self._shm.close()
+    
+    def close(self):
+        """Detach dari shared memory, owner juga menghapus segmennya"""
+        self.detach()
+        if self._owner:
+            self._shm.unlink()
+            self._owner = False
+
+class CaptureProcess:
+    def __init__(self, esp32_cam_ip, capture_source="stream", frame_bus=None, decoder=None):
+        """
+        Capture + JPEG decode di proses terpisah (GIL sendiri), frame dikirim lewat SharedFrameBus
+        Proses inference hanya menerima frame siap pakai tanpa pickling numpy
+        """
+        self.esp32_cam_ip = esp32_cam_ip
+        self.capture_source = capture_source
+        self.frame_bus = frame_bus or SharedFrameBus()
+        self.decoder = decoder or JpegDecoder(min_size=None)
+        self._stop_event = multiprocessing.Event()
+        self._process = None
+    
+    @property
+    def running(self):
+        return self._process is not None and self._process.is_alive()
+    
+    def start(self):
+        if self.running:
+            return
+        if self.frame_bus.closed:
+            self.frame_bus = SharedFrameBus(self.frame_bus.slots, self.frame_bus.max_shape)
+        self._stop_event.clear()
+        self._process = multiprocessing.Process(
+            target=CaptureProcess.run, name=f"capture-{self.esp32_cam_ip}", daemon=True,
+            args=(self.esp32_cam_ip, self.capture_source, self.frame_bus, self.decoder, self._stop_event))
+        self._process.start()
+    
+    def stop(self):
+        self._stop_event.set()
+        if self._process is not None:
+            self._process.join(timeout=3)
+            if self._process.is_alive():
+                self._process.terminate()
+            self._process = None
+    
+    def close(self):
+        """Stop proses capture dan hapus shared memory"""
+        self.stop()
+        self.frame_bus.close()
+    
+    @staticmethod
+    def run(esp32_cam_ip, capture_source, frame_bus, decoder, stop_event):
+        """Entry point proses capture"""
+        reader = None
+        if capture_source == "stream":
+            reader = MJPEGStreamReader(f"http://{esp32_cam_ip}/stream")
+        elif capture_source == "websocket":
+            reader = WebSocketFrameReader(f"ws://{esp32_cam_ip}:81")
+        capture_url = f"http://{esp32_cam_ip}/capture"
+        
+        try:
+            if reader is not None:
+                reader.start()
+            while not stop_event.is_set():
+                if reader is not None:
+                    jpeg, timestamp = reader.read(timeout=1.0)
+                else:
+                    jpeg, timestamp = None, time.time()
+                    try:
+                        response = requests.get(capture_url, timeout=5)
+                        if response.status_code == 200:
+                            jpeg = response.content
+                    except Exception as e:
+                        print(f"Capture error: {e}")
+                    if jpeg is None:
+                        time.sleep(1)
+                if jpeg is None:
+                    continue
+                
+                frame = decoder.decode(jpeg)
+                if frame is not None:
+                    frame_bus.put(frame, timestamp, decoder.scale)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if reader is not None:
+                reader.stop()
+            # Dengan fork, objek bus di child adalah salinan milik owner: jangan unlink
+            frame_bus.detach()
+
+class PipelineStage:
+    def __init__(self, name, func, input_queue=None, output_queue=None, drop_oldest=False):
+        """
+        Satu tahap pipeline yang berjalan di thread sendiri
+        input_queue None berarti stage ini adalah sumber (capture)
+        drop_oldest: buang item terlama saat output penuh, selain itu tunggu (backpressure)
+        """
+        self.name = name
+        self.func = func
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        self.drop_oldest = drop_oldest
+        
+        # Statistics
+        self.processed = 0
+        self.dropped = 0
+        self.busy_time = 0.0
+        self._completions = deque(maxlen=30)
+        
+        self.running = False
+        self._thread = None
+    
+    @property
+    def throughput(self):
+        """Items per second over the last completions"""
+        if len(self._completions) < 2:
+            return 0.0
+        elapsed = self._completions[-1] - self._completions[0]
+        return (len(self._completions) - 1) / elapsed if elapsed > 0 else 0.0
+    
+    @property
+    def avg_latency(self):
+        """Average processing time per item (seconds)"""
+        return self.busy_time / self.processed if self.processed else 0.0
+    
+    @property
+    def queue_depth(self):
+        """Items waiting in front of this stage"""
+        return self.input_queue.qsize() if self.input_queue is not None else 0
+    
+    def start(self):
+        """Start stage worker thread"""
+        if not self.running:
+            self.running = True
+            self._thread = threading.Thread(target=self._run, name=f"pipeline-{self.name}", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop stage worker thread"""
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+    
+    def _run(self):
+        """Take item, process it and hand it to the next stage"""
+        while self.running:
+            item = None
+            if self.input_queue is not None:
+                try:
+                    item = self.input_queue.get(timeout=0.5)
+                except Empty:
+                    continue
+            
+            start_time = time.time()
+            try:
+                output = self.func(item)
+            except Exception as e:
+                print(f"Pipeline stage '{self.name}' error: {e}")
+                continue
+            
+            if output is None:
+                continue
+            
+            finish_time = time.time()
+            self.busy_time += finish_time - start_time
+            self.processed += 1
+            self._completions.append(finish_time)
+            self._emit(output)
+    
+    def _emit(self, item):
+        """Put item into output queue (drop oldest or block)"""
+        if self.output_queue is None:
+            return
+        
+        if self.drop_oldest:
+            while True:
+                try:
+                    self.output_queue.put_nowait(item)
+                    return
+                except Full:
+                    try:
+                        self.output_queue.get_nowait()
+                        self.dropped += 1
+                    except Empty:
+                        pass
+        
+        # Backpressure: tunggu sampai stage berikutnya punya tempat
+        while self.running:
+            try:
+                self.output_queue.put(item, timeout=0.5)
+                return
+            except Full:
+                continue
+
+class DetectionPipeline:
+    def __init__(self, stages, queue_size=2):
+        """
+        Staged pipeline: setiap stage punya worker sendiri,
+        dihubungkan dengan bounded queue
+        stages: list of (name, func)
+        """
+        self.stages = []
+        self.output_queue = Queue(maxsize=1)
+        
+        input_queue = None
+        for index, (name, func) in enumerate(stages):
+            is_first = index == 0
+            is_last = index == len(stages) - 1
+            output_queue = self.output_queue if is_last else Queue(maxsize=queue_size)
+            
+            # Live camera & display hanya butuh frame terbaru, stage lain pakai backpressure
+            stage = PipelineStage(name, func, input_queue, output_queue,
+                                  drop_oldest=is_first or is_last)
+            self.stages.append(stage)
+            input_queue = output_queue
+    
+    def start(self):
+        """Start all stage workers"""
+        for stage in self.stages:
+            stage.start()
+    
+    def stop(self):
+        """Stop all stage workers"""
+        for stage in self.stages:
+            stage.running = False
+        for stage in self.stages:
+            stage.stop()
+    
+    def get(self, timeout=2.0):
+        """Get newest item from the last stage"""
+        try:
+            return self.output_queue.get(timeout=timeout)
+        except Empty:
+            return None
+    
+    def stats(self):
+        """Throughput, latency and queue depth per stage"""
+        return [{
+            'stage': stage.name,
+            'throughput': stage.throughput,
+            'avg_latency': stage.avg_latency,
+            'queue_depth': stage.queue_depth,
+            'processed': stage.processed,
+            'dropped': stage.dropped
+        } for stage in self.stages]
+    
+    def print_stats(self):
+        """Print per-stage statistics"""
+        for stat in self.stats():
+            print(f"  {stat['stage']:<10} {stat['throughput']:6.1f} it/s  "
+                  f"{stat['avg_latency'] * 1000:7.1f} ms  "
+                  f"queue: {stat['queue_depth']}  dropped: {stat['dropped']}")
+
+class DetectionResult:
+    def __init__(self, boxes, confidences, class_ids, names, track_ids=None):
+        """
+        Hasil deteksi satu frame dalam bentuk NumPy array
+        boxes: (N, 4) int xyxy, confidences: (N,), class_ids: (N,)
+        track_ids: (N,) diisi oleh VehicleTracker (None jika belum di-track)
+        Iterasi menghasilkan dict {'class', 'confidence', 'box', 'track_id'} untuk drawing/logging
+        """
+        self.boxes = boxes
+        self.confidences = confidences
+        self.class_ids = class_ids
+        self.names = names
+        self.track_ids = track_ids
+    
+    @classmethod
+    def empty(cls, names):
+        return cls(np.zeros((0, 4), dtype=np.int32), np.zeros(0, dtype=np.float32),
+                   np.zeros(0, dtype=np.int32), names)
+    
+    def __len__(self):
+        return len(self.class_ids)
+    
+    def __iter__(self):
+        # Python objects are only built when someone actually draws or prints
+        track_ids = self.track_ids.tolist() if self.track_ids is not None else [None] * len(self)
+        for box, conf, cls_id, track_id in zip(self.boxes.tolist(), self.confidences.tolist(),
+                                               self.class_ids.tolist(), track_ids):
+            yield {
+                'class': self.names[cls_id],
+                'confidence': conf,
+                'box': tuple(box),
+                'track_id': track_id
+            }
+    
+    def count(self, class_id):
+        """Number of boxes with the given class id"""
+        return int(np.count_nonzero(self.class_ids == class_id))
+
+class Track:
+    def __init__(self, track_id, box, class_id, confidence, timestamp):
+        """Satu kendaraan yang di-track: box terakhir, kecepatan (px/detik), waktu pertama & terakhir terlihat"""
+        self.track_id = track_id
+        self.box = np.asarray(box, dtype=np.float32)
+        self.class_id = class_id
+        self.confidence = confidence
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.first_center = self.center
+        self.velocity = np.zeros(2, dtype=np.float32)
+        self.hits = 1
+        self.counted = False
+    
+    @property
+    def center(self):
+        return (self.box[:2] + self.box[2:]) / 2
+    
+    @property
+    def dwell_time(self):
+        """Lama kendaraan terlihat (detik)"""
+        return self.last_seen - self.first_seen
+    
+    @property
+    def direction(self):
+        """Arah gerak dominan sejak pertama terlihat: left/right/up/down/static"""
+        dx, dy = (self.center - self.first_center).tolist()
+        if max(abs(dx), abs(dy)) < 10:
+            return "static"
+        if abs(dx) >= abs(dy):
+            return "right" if dx > 0 else "left"
+        return "down" if dy > 0 else "up"
+    
+    def update(self, box, confidence, timestamp, hit=True):
+        """Match baru: update box dan kecepatan (smoothed), hit=False untuk box hasil propagasi"""
+        box = np.asarray(box, dtype=np.float32)
+        dt = timestamp - self.last_seen
+        if dt > 0:
+            instant = ((box[:2] + box[2:]) / 2 - self.center) / dt
+            self.velocity = 0.5 * self.velocity + 0.5 * instant
+        self.box = box
+        self.confidence = confidence
+        self.last_seen = timestamp
+        if hit:
+            self.hits += 1
+    
+    def predict(self, timestamp):
+        """Box diperkirakan pada timestamp (constant velocity)"""
+        shift = self.velocity * max(0.0, timestamp - self.last_seen)
+        return self.box + np.concatenate((shift, shift))
+
+class VehicleTracker:
+    def __init__(self, names, iou_threshold=0.3, max_age=1.0, min_hits=3):
+        """
+        IoU tracker ringan di atas output detect_vehicles (matching matrix NumPy, greedy)
+        Track ID stabil, dwell time & arah per kendaraan, jumlah kendaraan unik per class
+        max_age: track dihapus jika tidak terlihat selama N detik
+        min_hits: kendaraan baru dihitung setelah N deteksi (filter false positive)
+        """
+        self.names = names
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.min_hits = min_hits
+        
+        self.tracks = []
+        self.next_id = 1
+        self.counts = {}
+        self.completed = deque(maxlen=100)
+    
+    @staticmethod
+    def iou_matrix(boxes_a, boxes_b):
+        """IoU (N, M) antara dua set box xyxy"""
+        x1 = np.maximum(boxes_a[:, None, 0], boxes_b[None, :, 0])
+        y1 = np.maximum(boxes_a[:, None, 1], boxes_b[None, :, 1])
+        x2 = np.minimum(boxes_a[:, None, 2], boxes_b[None, :, 2])
+        y2 = np.minimum(boxes_a[:, None, 3], boxes_b[None, :, 3])
+        intersection = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+        area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+        area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+        union = area_a[:, None] + area_b[None, :] - intersection
+        return intersection / np.maximum(union, 1e-6)
+    
+    def update(self, detected_objects, timestamp=None, detected=True):
+        """
+        Match deteksi frame ini ke track yang ada, buat track baru untuk sisanya
+        detected=False: box hasil propagasi (bukan YOLO), tidak menambah hits / membuat track baru
+        detected_objects.track_ids diisi, returns track yang terlihat di frame ini
+        """
+        timestamp = timestamp or time.time()
+        boxes = detected_objects.boxes.astype(np.float32)
+        track_ids = np.zeros(len(boxes), dtype=np.int32)
+        matched_detections = set()
+        seen = []
+        
+        if self.tracks and len(boxes):
+            predicted = np.array([track.predict(timestamp) for track in self.tracks])
+            iou = self.iou_matrix(predicted, boxes)
+            # Hanya class yang sama boleh di-match
+            track_classes = np.array([track.class_id for track in self.tracks])
+            iou[track_classes[:, None] != detected_objects.class_ids[None, :]] = 0.0
+            
+            # Greedy: pasangan dengan IoU tertinggi dulu
+            rows, cols = np.unravel_index(np.argsort(iou, axis=None)[::-1], iou.shape)
+            matched_tracks = set()
+            for row, col in zip(rows.tolist(), cols.tolist()):
+                if iou[row, col] < self.iou_threshold:
+                    break
+                if row in matched_tracks or col in matched_detections:
+                    continue
+                matched_tracks.add(row)
+                matched_detections.add(col)
+                track = self.tracks[row]
+                track.update(boxes[col], float(detected_objects.confidences[col]), timestamp, hit=detected)
+                track_ids[col] = track.track_id
+                seen.append(track)
+        
+        for col in range(len(boxes)):
+            if col in matched_detections or not detected:
+                continue
+            track = Track(self.next_id, boxes[col], int(detected_objects.class_ids[col]),
+                          float(detected_objects.confidences[col]), timestamp)
+            self.next_id += 1
+            self.tracks.append(track)
+            track_ids[col] = track.track_id
+            seen.append(track)
+        
+        # Kendaraan unik: dihitung sekali saat track terkonfirmasi
+        for track in seen:
+            if not track.counted and track.hits >= self.min_hits:
+                track.counted = True
+                name = self.names[track.class_id]
+                self.counts[name] = self.counts.get(name, 0) + 1
+        
+        self._expire(timestamp)
+        detected_objects.track_ids = track_ids
+        return seen
+    
+    def _expire(self, timestamp):
+        """Hapus track yang sudah tidak terlihat lebih dari max_age"""
+        alive = []
+        for track in self.tracks:
+            if timestamp - track.last_seen <= self.max_age:
+                alive.append(track)
+            elif track.counted:
+                self.completed.append({
+                    'track_id': track.track_id,
+                    'class': self.names[track.class_id],
+                    'dwell_time': track.dwell_time,
+                    'direction': track.direction,
+                })
+                print(f"🏁 {self.names[track.class_id].upper()} #{track.track_id} left after "
+                      f"{track.dwell_time:.1f}s (direction: {track.direction})")
+        self.tracks = alive
+    
+    def predict(self, timestamp=None):
+        """
+        Carry-forward tanpa YOLO: box semua track terkonfirmasi diperkirakan pada timestamp
+        Returns DetectionResult (dengan track_ids)
+        """
+        timestamp = timestamp or time.time()
+        tracks = [track for track in self.tracks if track.counted]
+        if not tracks:
+            return DetectionResult.empty(self.names)
+        return DetectionResult(
+            np.array([track.predict(timestamp) for track in tracks]).round().astype(np.int32),
+            np.array([track.confidence for track in tracks], dtype=np.float32),
+            np.array([track.class_id for track in tracks], dtype=np.int32),
+            self.names,
+            np.array([track.track_id for track in tracks], dtype=np.int32)
+        )
+    
+    def reset_counts(self):
+        self.counts = {}
+        for track in self.tracks:
+            track.counted = track.hits >= self.min_hits
+
+class RegionOfInterest:
+    def __init__(self, points):
+        """
+        Region of interest (zona perlintasan) untuk ROI-cropped inference
+        points: polygon [[x, y], ...] dalam pixel, atau relatif (0-1) terhadap ukuran frame
+        Hanya bounding box polygon yang dikirim ke model, box di-map balik ke full frame
+        """
+        self.points = np.asarray(points, dtype=np.float32)
+        self.normalized = bool(self.points.max() <= 1.0)
+        # Pixel ROI pada frame hasil reduced decode (JpegDecoder): koordinat dibagi scale
+        self.pixel_scale = 1
+        
+        # Pixel geometry, dihitung ulang hanya jika ukuran frame berubah
+        self._shape = None
+        self.polygon = None
+        self.box = None
+        self.mask = None
+    
+    @classmethod
+    def from_rect(cls, x1, y1, x2, y2):
+        return cls([[x1, y1], [x2, y1], [x2, y2], [x1, y2]])
+    
+    @classmethod
+    def from_config(cls, path, camera_ip):
+        """
+        ROI kamera dari file JSON, None jika tidak dikonfigurasi (full frame)
+        Format: {"<camera ip>": {"polygon": [[x, y], ...]}, "default": {"rect": [x1, y1, x2, y2]}}
+        """
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            config = json.load(f)
+        entry = config.get(camera_ip, config.get("default"))
+        if not entry:
+            return None
+        if "rect" in entry:
+            return cls.from_rect(*entry["rect"])
+        return cls(entry["polygon"])
+    
+    def _update(self, shape):
+        """Polygon & crop box dalam pixel untuk ukuran frame ini"""
+        if (shape[:2], self.pixel_scale) == self._shape:
+            return
+        height, width = shape[:2]
+        points = self.points * [width, height] if self.normalized else self.points / self.pixel_scale
+        self.polygon = np.clip(points, 0, [width - 1, height - 1]).round().astype(np.int32)
+        x1, y1 = self.polygon.min(axis=0)
+        x2, y2 = self.polygon.max(axis=0) + 1
+        self.box = (int(x1), int(y1), int(x2), int(y2))
+        # Mask polygon (1 = di dalam zona, termasuk tepi) untuk contains() tanpa loop per box
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(self.mask, [self.polygon], 1)
+        self._shape = (shape[:2], self.pixel_scale)
+    
+    def extent(self, width, height):
+        """Fraksi lebar & tinggi frame (full resolution) yang dicakup crop box"""
+        points = self.points if self.normalized else self.points / [width, height]
+        span = np.clip(points, 0, 1).max(axis=0) - np.clip(points, 0, 1).min(axis=0)
+        return float(span[0]), float(span[1])
+    
+    def crop(self, frame):
+        """Crop (view, tanpa copy) di sekitar zona perlintasan"""
+        self._update(frame.shape)
+        x1, y1, x2, y2 = self.box
+        return frame[y1:y2, x1:x2]
+    
+    def to_frame(self, boxes):
+        """Box [x1, y1, x2, y2] koordinat crop -> koordinat full frame"""
+        x1, y1 = self.box[:2]
+        return boxes + np.array([x1, y1, x1, y1], dtype=boxes.dtype)
+    
+    def contains(self, boxes):
+        """
+        Mask box yang titik bawah-tengahnya (posisi kendaraan di jalan) ada di dalam polygon
+        Satu lookup NumPy ke mask polygon untuk semua box (titik di luar frame di-clip ke tepi)
+        """
+        boxes = np.asarray(boxes)
+        height, width = self.mask.shape
+        xc = np.clip((boxes[:, 0] + boxes[:, 2]) // 2, 0, width - 1).astype(np.intp)
+        y2 = np.clip(boxes[:, 3], 0, height - 1).astype(np.intp)
+        return self.mask[y2, xc].astype(bool)
+    
+    def draw(self, frame, color=(0, 255, 255)):
+        """Gambar outline zona pada frame (full frame coordinates)"""
+        self._update(frame.shape)
+        cv2.polylines(frame, [self.polygon], True, color, 2)
+        return frame
+
+class MotionGate:
+    def __init__(self, threshold=25, min_changed=0.005, width=160, force_interval=2.0):
+        """
+        Cheap motion pre-filter di depan YOLO (frame differencing)
+        Frame di-downscale ke grayscale kecil, inference hanya jika ada pixel yang berubah
+        threshold: beda intensitas minimal per pixel (0-255)
+        min_changed: fraksi pixel berubah minimal agar dianggap ada gerakan
+        force_interval: paksa full inference setiap N detik (safety net)
+        """
+        self.threshold = threshold
+        self.min_changed = min_changed
+        self.width = width
+        self.force_interval = force_interval
+        
+        self.previous = None
+        self.last_inference_time = 0.0
+        self.changed_ratio = 0.0
+        
+        # Statistics
+        self.checked = 0
+        self.skipped = 0
+    
+    @property
+    def skip_ratio(self):
+        """Fraksi frame yang tidak di-inference"""
+        return self.skipped / self.checked if self.checked else 0.0
+    
+    def check(self, frame):
+        """True jika frame harus di-inference (ada gerakan / forced), False jika boleh di-skip"""
+        height = max(1, frame.shape[0] * self.width // frame.shape[1])
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        
+        previous, self.previous = self.previous, gray
+        self.checked += 1
+        now = time.time()
+        
+        if previous is None or previous.shape != gray.shape:
+            self.changed_ratio = 1.0
+        else:
+            diff = cv2.absdiff(gray, previous)
+            self.changed_ratio = np.count_nonzero(diff > self.threshold) / diff.size
+        
+        if self.changed_ratio >= self.min_changed or now - self.last_inference_time >= self.force_interval:
+            self.last_inference_time = now
+            return True
+        
+        self.skipped += 1
+        return False
+    
+    def reset(self):
+        """Paksa inference pada frame berikutnya (mis. setelah ganti kamera)"""
+        self.previous = None
+
+class FlowPropagator:
+    def __init__(self, width=320, grid=4):
+        """
+        Propagasi box antar deteksi YOLO dengan sparse optical flow (Lucas-Kanade)
+        grid x grid titik per box di-track pada grayscale kecil, box digeser sebesar median gerakan
+        """
+        self.width = width
+        self.grid = grid
+        self.previous = None
+        
+        # Titik sampling relatif di dalam box
+        steps = (np.arange(grid, dtype=np.float32) + 0.5) / grid
+        gx, gy = np.meshgrid(steps, steps)
+        self.offsets = np.stack((gx.ravel(), gy.ravel()), axis=1)
+    
+    def _gray(self, frame):
+        scale = self.width / frame.shape[1]
+        height = max(1, round(frame.shape[0] * scale))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), scale
+    
+    def observe(self, frame):
+        """Simpan frame (setelah deteksi YOLO) sebagai referensi propagasi berikutnya"""
+        self.previous, _ = self._gray(frame)
+    
+    def propagate(self, frame, detected_objects):
+        """
+        Geser box dari frame sebelumnya ke frame ini
+        Returns: DetectionResult baru, quality (fraksi titik yang berhasil di-track, box terburuk)
+        """
+        current, scale = self._gray(frame)
+        previous, self.previous = self.previous, current
+        if previous is None or previous.shape != current.shape:
+            return detected_objects, 0.0
+        if not len(detected_objects):
+            return detected_objects, 1.0
+        
+        boxes = detected_objects.boxes.astype(np.float32) * scale
+        points = boxes[:, None, :2] + self.offsets[None] * (boxes[:, None, 2:] - boxes[:, None, :2])
+        p0 = points.reshape(-1, 1, 2).astype(np.float32)
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(previous, current, p0, None, winSize=(15, 15), maxLevel=2)
+        
+        status = status.reshape(len(boxes), -1).astype(bool)
+        motion = (p1 - p0).reshape(len(boxes), -1, 2)
+        shifts = np.zeros((len(boxes), 2), dtype=np.float32)
+        for i in range(len(boxes)):
+            if status[i].any():
+                shifts[i] = np.median(motion[i][status[i]], axis=0)
+        
+        height, width = frame.shape[:2]
+        moved = (boxes + np.concatenate((shifts, shifts), axis=1)) / scale
+        moved = np.clip(moved, 0, [width - 1, height - 1, width - 1, height - 1]).round().astype(np.int32)
+        result = DetectionResult(moved, detected_objects.confidences, detected_objects.class_ids,
+                                 detected_objects.names, detected_objects.track_ids)
+        return result, float(status.mean(axis=1).min())
+
+class DetectionScheduler:
+    def __init__(self, target_latency=0.05, max_interval=10, min_quality=0.5):
+        """
+        Detect-every-N: YOLO hanya setiap N frame, di antaranya box dipropagasi optical flow
+        N menyesuaikan otomatis agar rata-rata waktu analisis per frame <= target_latency (detik)
+        min_quality: propagasi di bawah kualitas ini memaksa deteksi pada frame berikutnya
+        """
+        self.target_latency = target_latency
+        self.max_interval = max_interval
+        self.min_quality = min_quality
+        
+        self.interval = 1
+        self.frames_since_detection = 0
+        self.last_quality = 1.0
+        self.avg_inference_time = 0.0
+        self.avg_propagation_time = 0.0
+        
+        # Statistics
+        self.detections = 0
+        self.propagations = 0
+    
+    @property
+    def detection_ratio(self):
+        """Fraksi frame yang benar-benar di-inference YOLO"""
+        total = self.detections + self.propagations
+        return self.detections / total if total else 1.0
+    
+    def should_detect(self):
+        return self.frames_since_detection + 1 >= self.interval or self.last_quality < self.min_quality
+    
+    def record_detection(self, elapsed):
+        self.avg_inference_time = elapsed if not self.detections else \
+            0.8 * self.avg_inference_time + 0.2 * elapsed
+        self.detections += 1
+        self.frames_since_detection = 0
+        self.last_quality = 1.0
+        self._adjust_interval()
+    
+    def record_propagation(self, elapsed, quality):
+        self.avg_propagation_time = elapsed if not self.propagations else \
+            0.8 * self.avg_propagation_time + 0.2 * elapsed
+        self.propagations += 1
+        self.frames_since_detection += 1
+        self.last_quality = quality
+    
+    def _adjust_interval(self):
+        """Smallest N with (t_infer + (N-1) * t_propagate) / N <= target_latency"""
+        if self.avg_inference_time <= self.target_latency:
+            self.interval = 1
+        elif self.avg_propagation_time >= self.target_latency:
+            self.interval = self.max_interval
+        else:
+            needed = (self.avg_inference_time - self.avg_propagation_time) / \
+                     (self.target_latency - self.avg_propagation_time)
+            self.interval = int(min(self.max_interval, max(1, np.ceil(needed))))
+
+class ResolutionController:
+    def __init__(self, sizes=(320, 480, 640), latency_budget=0.2, empty_frames=15, hold_time=2.0):
+        """
+        Adaptive imgsz: resolusi inference turun saat antrian menumpuk (latency > budget)
+        atau scene kosong, kembali ke resolusi penuh saat ada kendaraan di zona perlintasan
+        latency_budget: detik dari capture sampai hasil inference
+        empty_frames: jumlah inference berturut-turut tanpa kendaraan sebelum resolusi diturunkan
+        hold_time: jeda minimum antar penurunan resolusi (anti flapping), naik selalu langsung
+        """
+        self.sizes = sorted(sizes)
+        self.index = len(self.sizes) - 1
+        self.latency_budget = latency_budget
+        self.empty_frames = empty_frames
+        self.hold_time = hold_time
+        
+        self.empty_streak = 0
+        self.last_change = 0.0
+        self.last_reason = "start"
+        
+        # Latency/accuracy tradeoff per resolusi (confidence rata-rata sebagai proxy akurasi)
+        self.changes = 0
+        self.stats = {size: {'frames': 0, 'avg_inference_ms': 0.0, 'detections': 0, 'avg_confidence': 0.0}
+                      for size in self.sizes}
+    
+    @property
+    def imgsz(self):
+        return self.sizes[self.index]
+    
+    def _record(self, inference_time, detected_objects):
+        stats = self.stats[self.imgsz]
+        stats['frames'] += 1
+        stats['avg_inference_ms'] += (inference_time * 1000.0 - stats['avg_inference_ms']) / stats['frames']
+        if len(detected_objects):
+            total = stats['detections'] + len(detected_objects)
+            stats['avg_confidence'] += (float(detected_objects.confidences.sum())
+                                        - stats['avg_confidence'] * len(detected_objects)) / total
+            stats['detections'] = total
+    
+    def _fitting_index(self):
+        """Resolusi terbesar yang inference time-nya (terukur) masih dalam budget"""
+        for index in range(len(self.sizes) - 1, 0, -1):
+            measured = self.stats[self.sizes[index]]
+            if not measured['frames'] or measured['avg_inference_ms'] <= self.latency_budget * 1000.0:
+                return index
+        return 0
+    
+    def update(self, latency, inference_time, detected_objects):
+        """
+        Catat hasil inference pada resolusi sekarang, lalu pilih resolusi berikutnya
+        detected_objects sudah difilter ROI, jadi kendaraan = kendaraan di dekat perlintasan
+        Returns: imgsz untuk inference berikutnya
+        """
+        self._record(inference_time, detected_objects)
+        
+        occupied = len(detected_objects) > 0
+        backlog = latency > self.latency_budget
+        self.empty_streak = 0 if occupied else self.empty_streak + 1
+        
+        index, reason = self.index, None
+        if occupied:
+            index, reason = self._fitting_index(), "vehicles"
+            if backlog:
+                index, reason = min(index, self.index - 1), "backlog"
+        elif backlog:
+            index, reason = self.index - 1, "backlog"
+        elif self.empty_streak >= self.empty_frames:
+            index, reason = self.index - 1, "empty scene"
+        
+        index = max(0, index)
+        now = time.time()
+        if index > self.index or (index < self.index and now - self.last_change >= self.hold_time):
+            print(f"🔍 Inference resolution {self.imgsz} -> {self.sizes[index]} ({reason})")
+            self.index = index
+            self.last_change = now
+            self.last_reason = reason
+            self.changes += 1
+        return self.imgsz
+    
+    def print_stats(self):
+        """Tabel latency/accuracy tradeoff per resolusi"""
+        for size in self.sizes:
+            stats = self.stats[size]
+            marker = "*" if size == self.imgsz else " "
+            print(f"  {marker}{size:<5} {stats['frames']:6d} frames  {stats['avg_inference_ms']:7.1f} ms  "
+                  f"avg conf: {stats['avg_confidence']:.2f} ({stats['detections']} detections)")
+
+class FrameRateGovernor:
+    def __init__(self, target_fps=20, idle_fps=None, idle_after=5.0, clock=time.perf_counter, sleep=time.sleep):
+        """
+        Pengganti time.sleep tetap di detection loop: tidur hanya sisa waktu dari 1/target_fps
+        target_fps: None/0 = secepat mungkin (dibatasi kamera & inference)
+        idle_fps: FPS hemat daya saat scene kosong selama idle_after detik (None = tidak pernah idle)
+        Opt-in: selama idle, kendaraan baru baru di-inference paling lambat 1/idle_fps detik kemudian
+        clock / sleep: sumber waktu (detik) dan fungsi tidur, bisa diganti di test
+        """
+        self.target_fps = target_fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.clock = clock
+        self.sleep = sleep
+        
+        self.idle = False
+        self._last_active = clock()
+        self._iteration_start = None
+        
+        # Statistics
+        self.frames = 0
+        self.achieved_fps = 0.0
+        self.sleep_time = 0.0
+        self.idle_time = 0.0
+    
+    @property
+    def current_target(self):
+        """FPS yang sedang dikejar (None = unlimited)"""
+        return self.idle_fps if self.idle else self.target_fps
+    
+    def wait(self, active=True):
+        """
+        Panggil sekali di akhir setiap iterasi
+        active: ada kendaraan / aktivitas di frame ini (reset timer idle)
+        """
+        now = self.clock()
+        if active:
+            self._last_active = now
+            if self.idle:
+                print("⚡ Vehicle detected - back to full frame rate")
+            self.idle = False
+        elif self.idle_fps and not self.idle and now - self._last_active >= self.idle_after:
+            print(f"💤 Scene empty for {self.idle_after:.0f}s - idling at {self.idle_fps} FPS")
+            self.idle = True
+        
+        fps = self.current_target
+        if fps and self._iteration_start is not None:
+            remaining = 1.0 / fps - (now - self._iteration_start)
+            if remaining > 0:
+                self.sleep(remaining)
+                self.sleep_time += remaining
+        
+        end = self.clock()
+        if self._iteration_start is not None:
+            interval = end - self._iteration_start
+            self.achieved_fps = 1.0 / interval if not self.frames else \
+                0.9 * self.achieved_fps + 0.1 / max(interval, 1e-6)
+            self.frames += 1
+            if self.idle:
+                self.idle_time += interval
+        self._iteration_start = end
+    
+    def stats(self):
+        return {
+            'achieved_fps': round(self.achieved_fps, 2),
+            'target_fps': self.current_target,
+            'idle': self.idle,
+        }
+    
+    def report(self):
+        target = f"{self.current_target} FPS" if self.current_target else "unlimited"
+        return f"{self.achieved_fps:.1f} FPS achieved (target {target}{', idle' if self.idle else ''})"
+
+class MetricsRegistry:
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    
+    def __init__(self, namespace="smart_crossing"):
+        """
+        Counters & histograms format Prometheus untuk endpoint /metrics
+        Setiap thread menulis ke shard miliknya sendiri (tanpa lock di hot path),
+        render() menjumlahkan semua shard saat di-scrape
+        """
+        self.namespace = namespace
+        self._metrics = OrderedDict()  # name -> (type, help, buckets)
+        self._gauges = {}  # name -> [(labels, func)]
+        self._info = {}  # name -> labels
+        self._shards = []
+        self._local = threading.local()
+        self._shard_lock = threading.Lock()
+    
+    def counter(self, name, help_text):
+        self._metrics[name] = ("counter", help_text, None)
+    
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self._metrics[name] = ("histogram", help_text, tuple(sorted(buckets)))
+    
+    def gauge(self, name, help_text, func, **labels):
+        """Gauge dibaca saat scrape (mis. queue depth), func() -> angka"""
+        self._metrics[name] = ("gauge", help_text, None)
+        self._gauges.setdefault(name, []).append((tuple(sorted(labels.items())), func))
+    
+    def info(self, name, help_text, **labels):
+        """Metadata statis sebagai gauge bernilai 1 (mis. model backend)"""
+        self._metrics[name] = ("gauge", help_text, None)
+        self._info[name] = tuple(sorted(labels.items()))
+    
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Hanya sekali per thread: daftarkan shard baru
+            shard = self._local.shard = {}
+            with self._shard_lock:
+                self._shards.append(shard)
+        return shard
+    
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        shard = self._shard()
+        shard[key] = shard.get(key, 0) + amount
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())) if labels else ())
+        shard = self._shard()
+        counts = shard.get(key)
+        if counts is None:
+            # Per-bucket counts (+Inf di akhir), lalu sum
+            counts = shard[key] = [0] * (len(self._metrics[name][2]) + 1) + [0.0]
+        counts[bisect.bisect_left(self._metrics[name][2], value)] += 1
+        counts[-1] += value
+    
+    def timer(self, name, **labels):
+        """with metrics.timer("decode_seconds"): ... -> observe durasi blok"""
+        return _MetricsTimer(self, name, labels)
+    
+    def _collect(self):
+        """Jumlahkan semua shard: (name, labels) -> value / bucket counts"""
+        with self._shard_lock:
+            shards = list(self._shards)
+        totals = {}
+        for shard in shards:
+            for key, value in list(shard.items()):
+                if isinstance(value, list):
+                    value = list(value)
+                    total = totals.get(key)
+                    totals[key] = value if total is None else [a + b for a, b in zip(total, value)]
+                else:
+                    totals[key] = totals.get(key, 0) + value
+        return totals
+    
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        labels = tuple(labels) + tuple(extra)
+        if not labels:
+            return ""
+        pairs = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+                         for k, v in labels)
+        return "{" + pairs + "}"
+    
+    @staticmethod
+    def _format_value(value):
+        return repr(float(value)) if isinstance(value, float) else str(value)
+    
+    def render(self):
+        """Text exposition format Prometheus"""
+        totals = self._collect()
+        lines = []
+        for name, (kind, help_text, buckets) in self._metrics.items():
+            full_name = f"{self.namespace}_{name}"
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+    
+            if name in self._info:
+                lines.append(f"{full_name}{self._format_labels(self._info[name])} 1")
+            for labels, func in self._gauges.get(name, ()):
+                try:
+                    value = func()
+                except Exception:
+                    continue
+                lines.append(f"{full_name}{self._format_labels(labels)} {self._format_value(value)}")
+    
+            series = sorted((key[1], value) for key, value in totals.items() if key[0] == name)
+            for labels, value in series:
+                if kind != "histogram":
+                    lines.append(f"{full_name}{self._format_labels(labels)} {self._format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float("inf"),), value[:-1]):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels, (('le', le),))} {cumulative}")
+                lines.append(f"{full_name}_sum{self._format_labels(labels)} {self._format_value(value[-1])}")
+                lines.append(f"{full_name}_count{self._format_labels(labels)} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+class _MetricsTimer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+class CrossingStateMachine:
+    def __init__(self, lower_hits=3, raise_misses=2, lower_confidence=0.7, hold_confidence=0.4,
+                 window=None, min_down_time=2.0, min_up_time=1.0, max_gap=10.0, on_transition=None):
+        """
+        Debounce palang perlintasan: UP -> DOWN -> UP dengan hysteresis
+        lower_hits: deteksi bus berturut-turut sebelum palang turun
+        raise_misses: frame tanpa bus berturut-turut sebelum palang naik
+        lower_confidence: rata-rata confidence (window terakhir) minimal untuk menurunkan palang
+        hold_confidence: selama DOWN, deteksi dengan confidence >= ini tetap dihitung sebagai bus
+            (caller harus menjalankan model dengan conf <= hold_confidence selama DOWN)
+        min_down_time / min_up_time: lama minimum (detik) di state sekarang sebelum boleh berubah
+            palang naik setelah raise_misses frame tanpa bus DAN >= min_down_time detik DOWN
+            (min_down_time=0: naik setelah raise_misses frame saja, seperti history list lama)
+        max_gap: history di-reset jika tidak ada update selama ini (detik)
+        on_transition(event): dipanggil untuk setiap transisi, return False = batal (dicoba lagi frame berikutnya)
+        """
+        self.lower_hits = lower_hits
+        self.raise_misses = raise_misses
+        self.lower_confidence = lower_confidence
+        self.hold_confidence = hold_confidence
+        self.min_down_time = min_down_time
+        self.min_up_time = min_up_time
+        self.max_gap = max_gap
+        self.on_transition = on_transition
+        
+        # Window confidence dengan running sum: O(1) per frame
+        self.window = deque(maxlen=window or lower_hits)
+        self.confidence_sum = 0.0
+        self.hits = 0
+        self.misses = 0
+        
+        self.state = "UP"
+        self.state_since = 0.0
+        self.last_update = None
+        self.events = deque(maxlen=50)
+    
+    @property
+    def avg_confidence(self):
+        return self.confidence_sum / len(self.window) if self.window else 0.0
+    
+    def reset(self):
+        """Kosongkan history (state palang tetap)"""
+        self.window.clear()
+        self.confidence_sum = 0.0
+        self.hits = 0
+        self.misses = 0
+    
+    def update(self, present, confidence, timestamp=None):
+        """
+        Satu frame hasil deteksi (present = bus terdeteksi)
+        Returns: event dict jika terjadi transisi, None jika state tetap
+        """
+        timestamp = timestamp or time.time()
+        if self.last_update is not None and timestamp - self.last_update > self.max_gap:
+            self.reset()
+        self.last_update = timestamp
+        
+        # Hysteresis: saat DOWN, confidence lebih rendah masih dihitung sebagai bus
+        threshold = self.hold_confidence if self.state == "DOWN" else 0.0
+        hit = bool(present) and confidence >= threshold
+        if hit:
+            self.hits += 1
+            self.misses = 0
+        else:
+            self.hits = 0
+            self.misses += 1
+        
+        value = confidence if hit else 0.0
+        if len(self.window) == self.window.maxlen:
+            self.confidence_sum -= self.window[0]
+        self.window.append(value)
+        self.confidence_sum += value
+        
+        held = timestamp - self.state_since
+        if (self.state == "UP" and self.hits >= self.lower_hits and held >= self.min_up_time
+                and self.avg_confidence > self.lower_confidence):
+            return self._transition("DOWN", "BARRIER_LOWERED", timestamp,
+                                    f"{self.hits} consecutive bus detections (avg conf: {self.avg_confidence:.2f})")
+        if self.state == "DOWN" and self.misses >= self.raise_misses and held >= self.min_down_time:
+            return self._transition("UP", "BARRIER_RAISED", timestamp,
+                                    f"no bus for {self.misses} frames")
+        return None
+    
+    def sync(self, state, timestamp=None, reason="external"):
+        """State diubah dari luar (manual control), dicatat sebagai event tanpa veto"""
+        if state == self.state:
+            return None
+        action = "BARRIER_LOWERED" if state == "DOWN" else "BARRIER_RAISED"
+        return self._transition(state, action, timestamp or time.time(), reason, forced=True)
+    
+    def _transition(self, state, action, timestamp, reason, forced=False):
+        event = {
+            'event': action,
+            'from': self.state,
+            'to': state,
+            'timestamp': timestamp,
+            'reason': reason,
+            'confidence': self.avg_confidence,
+        }
+        if self.on_transition is not None and self.on_transition(event) is False and not forced:
+            return None
+        self.state = state
+        self.state_since = timestamp
+        self.events.append(event)
+        return event
+
+class AsyncDeviceIO:
+    def __init__(self, capture_url, intersection_status_url, train_control_url,
+                 status_poll_interval=0.5, command_timeout=10, command_retries=2, metrics=None):
+        """
+        Asyncio I/O layer untuk semua ESP32 (kamera, intersection, train)
+        Event loop berjalan di thread sendiri sehingga detection thread
+        tidak pernah menunggu network
+        intersection_status_url: None = tanpa polling intersection (server v1/v2)
+        metrics: MetricsRegistry untuk capture latency & dropped frames (opsional)
+        """
+        if aiohttp is None:
+            raise ImportError("aiohttp is required for AsyncDeviceIO (pip install aiohttp)")
+        self.capture_url = capture_url
+        self.intersection_status_url = intersection_status_url
+        self.train_control_url = train_control_url
+        self.status_poll_interval = status_poll_interval
+        self.command_timeout = command_timeout
+        self.command_retries = command_retries
+        self.metrics = metrics
+        
+        # Cached device state (diisi oleh background tasks)
+        self.intersection_barrier = "UNKNOWN"
+        self.intersection_updated = 0
+        self.latest_jpeg = None
+        self.frame_seq = 0
+        self._last_read_seq = 0
+        self._frame_condition = threading.Condition()
+        
+        # Commands currently in flight, keyed by (command, value)
+        self.pending_commands = {}
+        
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.running = False
+        self._thread = None
+        self._intersection_task = None
+        self._camera_task = None
+        self._start_lock = threading.Lock()
+    
+    def start(self):
+        """Start event loop thread and intersection polling"""
+        with self._start_lock:
+            if self.running:
+                return
+            self.running = True
+            self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+            self._thread.start()
+            asyncio.run_coroutine_threadsafe(self._start_tasks(), self.loop).result()
+    
+    def stop(self):
+        """Cancel background tasks and stop the event loop"""
+        if not self.running:
+            return
+        self.running = False
+        asyncio.run_coroutine_threadsafe(self._stop_tasks(), self.loop).result(timeout=5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=2)
+        with self._frame_condition:
+            self._frame_condition.notify_all()
+    
+    async def _start_tasks(self):
+        self.session = aiohttp.ClientSession()
+        if self.intersection_status_url:
+            self._intersection_task = asyncio.create_task(self._intersection_loop())
+    
+    async def _stop_tasks(self):
+        tasks = [task for task in (self._camera_task, self._intersection_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.session.close()
+    
+    # ==================== CAMERA ====================
+    
+    def start_camera(self):
+        """Start prefetching frames (only needed while detection runs)"""
+        self.start()
+        self.loop.call_soon_threadsafe(self._create_camera_task)
+    
+    def stop_camera(self):
+        """Stop prefetching frames"""
+        if self.running:
+            self.loop.call_soon_threadsafe(self._cancel_camera_task)
+    
+    def _create_camera_task(self):
+        if self._camera_task is None or self._camera_task.done():
+            self._camera_task = asyncio.ensure_future(self._camera_loop())
+    
+    def _cancel_camera_task(self):
+        if self._camera_task is not None:
+            self._camera_task.cancel()
+            self._camera_task = None
+    
+    async def _camera_loop(self):
+        """Keep fetching /capture so a fresh frame is always ready"""
+        timeout = aiohttp.ClientTimeout(total=3)
+        while self.running:
+            try:
+                start = time.perf_counter()
+                async with self.session.get(self.capture_url, timeout=timeout) as response:
+                    if response.status == 200:
+                        jpeg = await response.read()
+                        with self._frame_condition:
+                            # Frame sebelumnya belum sempat diambil detection thread -> tertimpa
+                            superseded = self.frame_seq != self._last_read_seq
+                            self.latest_jpeg = jpeg
+                            self.frame_seq += 1
+                            self._frame_condition.notify_all()
+                        if self.metrics is not None:
+                            self.metrics.observe("capture_seconds", time.perf_counter() - start)
+                            if superseded:
+                                self.metrics.inc("frames_dropped_total", reason="superseded")
+                    else:
+                        if self.metrics is not None:
+                            self.metrics.inc("frames_dropped_total", reason="http_error")
+                        await asyncio.sleep(0.5)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Frame capture error: {e}")
+                if self.metrics is not None:
+                    self.metrics.inc("frames_dropped_total", reason="capture_error")
+                await asyncio.sleep(1)
+    
+    def get_latest_jpeg(self, timeout=3):
+        """Newest JPEG not yet returned, None if nothing new arrived in time"""
+        with self._frame_condition:
+            self._frame_condition.wait_for(
+                lambda: self.frame_seq != self._last_read_seq or not self.running,
+                timeout=timeout
+            )
+            if self.frame_seq == self._last_read_seq:
+                return None
+            self._last_read_seq = self.frame_seq
+            return self.latest_jpeg
+    
+    # ==================== INTERSECTION ====================
+    
+    async def _intersection_loop(self):
+        """Poll intersection barrier status in the background"""
+        timeout = aiohttp.ClientTimeout(total=3)
+        while self.running:
+            try:
+                async with self.session.get(self.intersection_status_url, timeout=timeout) as response:
+                    if response.status == 200:
+                        data = await response.json(content_type=None)
+                        self.intersection_barrier = data.get("barrier", "UNKNOWN")
+                        self.intersection_updated = time.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Intersection status error: {e}")
+                self.intersection_barrier = "UNKNOWN"
+            await asyncio.sleep(self.status_poll_interval)
+    
+    # ==================== TRAIN COMMANDS ====================
+    
+    def send_command(self, command, value, on_done=None):
+        """
+        Schedule command to ESP32 train without blocking
+        Returns concurrent Future (result: True/False); identical commands
+        already in flight are not sent twice
+        """
+        key = (command, value)
+        future = self.pending_commands.get(key)
+        if future is not None and not future.done():
+            return future
+        
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._send_command(command, value), self.loop)
+        self.pending_commands[key] = future
+        
+        def finished(done_future):
+            if self.pending_commands.get(key) is done_future:
+                del self.pending_commands[key]
+            if on_done is not None:
+                on_done(done_future)
+        
+        future.add_done_callback(finished)
+        return future
+    
+    async def _send_command(self, command, value):
+        """POST command with retries; sleeps here never touch the detection thread"""
+        payload = {
+            "command": command,
+            "value": value,
+            "timestamp": time.time()
+        }
+        timeout = aiohttp.ClientTimeout(total=self.command_timeout)
+        
+        for attempt in range(self.command_retries):
+            try:
+                async with self.session.post(self.train_control_url, json=payload, timeout=timeout) as response:
+                    if response.status == 200:
+                        return True
+                    print(f"⚠️  Command response {response.status}: {command}={value}")
+                    
+            except asyncio.TimeoutError:
+                print(f"⏱️  Timeout on attempt {attempt + 1}/{self.command_retries} for {command}={value}")
+                if attempt == self.command_retries - 1:
+                    # Servo mungkin masih bergerak, command kemungkinan sudah diterima
+                    return True
+                
+            except aiohttp.ClientError as e:
+                print(f"🔌 Connection error attempt {attempt + 1}: {e}")
+            
+            if attempt < self.command_retries - 1:
+                await asyncio.sleep(1)
+        
+        return False
+
+class CameraDiscovery:
+    def __init__(self, mqtt_broker, mqtt_port, mqtt_user, mqtt_pass, topic="smartTrain/camera/ip"):
+        """
+        Camera IP discovery via MQTT
+        Firmware ESP32-CAM publish {"ip": "x.x.x.x"} ke smartTrain/camera/ip saat boot & setiap 10 detik
+        Registry menyimpan IP terbaru per kamera, callback dipanggil hanya saat IP berubah
+        """
+        if mqtt is None:
+            raise ImportError("paho-mqtt is required for camera discovery (pip install paho-mqtt)")
+        self.mqtt_broker = mqtt_broker
+        self.mqtt_port = mqtt_port
+        self.topic = topic
+        
+        # Registry: camera_id -> {'ip', 'last_seen'}
+        self.cameras = {}
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self.on_ip_change = None  # callback(camera_id, new_ip, old_ip)
+        
+        # MQTT Client (sama seperti SmartCrossingDetector)
+        self.mqtt_client = mqtt.Client()
+        self.mqtt_client.username_pw_set(mqtt_user, mqtt_pass)
+        self.mqtt_client.tls_set(cert_reqs=ssl.CERT_REQUIRED, tls_version=ssl.PROTOCOL_TLS)
+        self.mqtt_client.on_connect = self.on_mqtt_connect
+        self.mqtt_client.on_message = self.on_mqtt_message
+    
+    def on_mqtt_connect(self, client, userdata, flags, rc):
+        """MQTT connection callback"""
+        if rc == 0:
+            print("✅ Connected to MQTT Broker (camera discovery)")
+            client.subscribe(self.topic)
+        else:
+            print(f"❌ Failed to connect, return code {rc}")
+    
+    def on_mqtt_message(self, client, userdata, msg):
+        """MQTT message received callback: update registry"""
+        try:
+            payload = json.loads(msg.payload.decode())
+            ip = payload.get("ip")
+            if not ip:
+                return
+            # Firmware sekarang hanya kirim IP, "id" disiapkan untuk multi-camera
+            camera_id = payload.get("id", "default")
+            
+            with self._condition:
+                entry = self.cameras.get(camera_id)
+                old_ip = entry['ip'] if entry else None
+                self.cameras[camera_id] = {'ip': ip, 'last_seen': time.time()}
+                self._condition.notify_all()
+            
+            if ip != old_ip:
+                print(f"📡 Camera '{camera_id}' IP: {old_ip} -> {ip}")
+                if self.on_ip_change:
+                    self.on_ip_change(camera_id, ip, old_ip)
+        except Exception as e:
+            print(f"MQTT message error: {e}")
+    
+    def connect(self):
+        """Connect to MQTT broker"""
+        try:
+            print(f"Connecting to MQTT Broker: {self.mqtt_broker}:{self.mqtt_port}")
+            self.mqtt_client.connect(self.mqtt_broker, self.mqtt_port, 60)
+            self.mqtt_client.loop_start()
+            return True
+        except Exception as e:
+            print(f"❌ MQTT connection failed: {e}")
+            return False
+    
+    def disconnect(self):
+        """Stop MQTT loop"""
+        self.mqtt_client.loop_stop()
+        self.mqtt_client.disconnect()
+    
+    def get_ip(self, camera_id="default"):
+        """IP terbaru kamera, None jika belum pernah terlihat"""
+        with self._lock:
+            entry = self.cameras.get(camera_id)
+            return entry['ip'] if entry else None
+    
+    def wait_for_ip(self, camera_id="default", timeout=15):
+        """Tunggu sampai kamera mem-publish IP"""
+        with self._condition:
+            self._condition.wait_for(lambda: camera_id in self.cameras, timeout=timeout)
+            entry = self.cameras.get(camera_id)
+            return entry['ip'] if entry else None
+    
+    def is_online(self, camera_id="default", max_age=30):
+        """Kamera dianggap online jika publish IP dalam max_age detik terakhir"""
+        with self._lock:
+            entry = self.cameras.get(camera_id)
+            return entry is not None and time.time() - entry['last_seen'] <= max_age
 
 class VehicleDetector:
-    def __init__(self, esp32_cam_ip, model_path):
+    def __init__(self, esp32_cam_ip, model_path, capture_source="stream", buffer_size=3, model=None,
+                 headless=False, backend="auto", motion_gate=False, roi_config=None, target_latency=None,
+                 adaptive_resolution=False, capture_process=False, target_fps=20, idle_fps=None, imgsz=640):
         """
         Simple Vehicle Detector
         Hanya untuk deteksi bus dan car, tidak ada kontrol otomatis
+        capture_source: "stream" (persistent MJPEG /stream), "websocket" (firmware v7, ws://ip:81)
+                        atau "http" (/capture per frame)
+        model: YOLO model yang sudah di-load (shared antar kamera), None untuk load sendiri
+        headless: tanpa window/annotation, hanya structured detection results
+        backend: "auto", "pytorch", "onnx", "openvino", "onnx-int8", "openvino-int8"
+            ("auto" = tercepat menurut backend_report.json, PyTorch kalau belum ada report)
+        motion_gate: skip YOLO pada frame statis (hasil terakhir dipakai ulang)
+        roi_config: file JSON region of interest per kamera, hanya zona perlintasan yang di-inference
+        target_latency: detik per frame untuk detect-every-N + optical flow (None = YOLO setiap frame)
+        adaptive_resolution: imgsz turun saat beban tinggi / scene kosong (ResolutionController)
+        capture_process: capture + decode di proses terpisah, frame lewat SharedFrameBus (run_detection / multi-camera)
+        target_fps / idle_fps: frame rate run_detection (None = secepat mungkin) dan saat scene kosong
+        imgsz: resolusi inference (juga ukuran minimum JPEG decode dan imgsz backend report)
         """
         self.esp32_cam_ip = esp32_cam_ip
         self.capture_url = f"http://{esp32_cam_ip}/capture"
+        self.stream_url = f"http://{esp32_cam_ip}/stream"
+        self.ws_url = f"ws://{esp32_cam_ip}:81"
         
-        # Load YOLO model
-        print(f"Loading YOLO model from: {model_path}")
-        self.model = YOLO(model_path)
+        # Capture backend (di proses ini, atau CaptureProcess -> shared memory)
+        self.capture_source = capture_source
+        self.capture_process = None
+        self.stream_reader = self.create_stream_reader()
+        
+        # Background capture thread -> ring buffer
+        self.frame_buffer = FrameRingBuffer(capacity=buffer_size)
+        self.capture_running = False
+        self.capture_thread = None
+        self.last_frame_timestamp = 0.0
+        
+        # Staged pipeline (run_pipelined_detection)
+        self.pipeline = None
+        
+        # Output: structured result terakhir, annotation dibuat saat diminta
+        # (buffer annotation & overlay dari pool, dikembalikan setelah ditampilkan)
+        self.headless = headless
+        self.frame_pool = FramePool()
+        self.overlay = OverlayRenderer()
+        self.window_name = "Vehicle Detection - ESP32-CAM"
+        self.latest_result = None
+        
+        # Load YOLO model (exported backend di-cache di samping weights)
+        if model is None:
+            print(f"Loading YOLO model from: {model_path}")
+            model_backends = ModelBackends(model_path, imgsz=imgsz)
+            model = model_backends.load(backend)
+            backend = model_backends.backend
+        self.model = model
+        self.backend = backend
         self.conf_threshold = 0.6
+        self.imgsz = imgsz
+        sizes = tuple(size for size in (320, 480) if size < imgsz) + (imgsz,)
+        self.resolution = ResolutionController(sizes=sizes) if adaptive_resolution else None
         
-        # Statistics
+        # Region of interest (None = full frame), dimuat ulang saat IP kamera berubah
+        self.roi_config = roi_config
+        self.roi = RegionOfInterest.from_config(roi_config, esp32_cam_ip)
+        
+        # JPEG decode langsung ke skala terkecil yang masih >= imgsz (crop ROI)
+        self.decoder = JpegDecoder(min_size=self.imgsz, roi=self.roi)
+        if capture_process:
+            self.capture_process = CaptureProcess(esp32_cam_ip, capture_source, decoder=self.decoder)
+            self.stream_reader = None
+        
+        # Motion pre-filter: hasil terakhir dipakai ulang saat tidak ada gerakan
+        self.motion_gate = MotionGate() if motion_gate else None
+        self.last_analysis = None
+        self.last_detected = True
+        
+        # Detect-every-N: YOLO hanya tiap N frame, box di antaranya dari optical flow
+        self.scheduler = None
+        self.propagator = None
+        if target_latency:
+            self.scheduler = DetectionScheduler(target_latency=target_latency)
+            self.propagator = FlowPropagator()
+        
+        # Class ids untuk bus dan car (dipakai untuk filter NumPy)
+        self.target_classes = {name: cls_id for cls_id, name in self.model.names.items()
+                               if name in ['bus', 'car']}
+        self.target_class_ids = np.array(list(self.target_classes.values()), dtype=np.int32)
+        
+        # Statistics (bus/car count = kendaraan unik dari tracker, bukan jumlah frame)
+        self.tracker = VehicleTracker(self.model.names)
         self.total_frames = 0
         self.bus_detected_count = 0
         self.car_detected_count = 0
         
+        # Barrier decision (hanya status, tidak mengirim perintah)
+        self.barrier_state = "UP"
+        
+        # Frame rate run_detection (sleep hanya sisa waktu per frame)
+        self.governor = FrameRateGovernor(target_fps=target_fps, idle_fps=idle_fps)
+        
         print(f"✅ Vehicle Detector Initialized")
-        print(f"📷 ESP32-CAM: {esp32_cam_ip}")
-        print(f"🤖 Model loaded: {model_path}")
+        print(f"📷 ESP32-CAM: {esp32_cam_ip} ({capture_source})")
+        print(f"🤖 Model loaded: {model_path} ({self.backend})")
     
     def test_camera_connection(self):
         """Test ESP32-CAM connection"""
@@ -42,14 +2357,123 @@ class VehicleDetector:
             print(f"❌ ESP32-CAM not reachable: {e}")
             return False
     
-    def capture_frame(self):
-        """Capture frame from ESP32-CAM"""
+    def set_camera_ip(self, esp32_cam_ip):
+        """
+        Hot-swap kamera ke IP baru (DHCP berubah) tanpa restart / reload model
+        Reader lama ditutup, reader baru di-start oleh capture_jpeg berikutnya
+        """
+        if esp32_cam_ip == self.esp32_cam_ip:
+            return
+        print(f"🔄 Switching camera {self.esp32_cam_ip} -> {esp32_cam_ip}")
+        self.esp32_cam_ip = esp32_cam_ip
+        self.capture_url = f"http://{esp32_cam_ip}/capture"
+        self.stream_url = f"http://{esp32_cam_ip}/stream"
+        self.ws_url = f"ws://{esp32_cam_ip}:81"
+        
+        # ROI di roi_config per IP kamera: zona kamera lama tidak berlaku lagi
+        self.roi = RegionOfInterest.from_config(self.roi_config, esp32_cam_ip)
+        self.decoder.roi = self.roi
+        self.decoder.source_size = None  # scale decode dipilih ulang untuk ROI baru
+        
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.scheduler is not None:
+            # Box kamera lama tidak valid untuk propagasi, paksa deteksi penuh
+            self.last_analysis = None
+        
+        old_reader = self.stream_reader
+        self.stream_reader = self.create_stream_reader()
+        if old_reader is not None:
+            old_reader.close()
+        
+        if self.capture_process is not None:
+            old_process = self.capture_process
+            old_process.stop()
+            self.capture_process = CaptureProcess(esp32_cam_ip, self.capture_source, old_process.frame_bus,
+                                                  self.decoder)
+            if self.capture_running:
+                self.capture_process.start()
+    
+    def create_stream_reader(self):
+        """Persistent reader sesuai capture_source (None untuk http / capture process)"""
+        if self.capture_process is not None:
+            return None
+        if self.capture_source == "stream":
+            return MJPEGStreamReader(self.stream_url)
+        if self.capture_source == "websocket":
+            return WebSocketFrameReader(self.ws_url)
+        return None
+    
+    def start_capture(self):
+        """Start capture backend and producer thread filling the ring buffer"""
+        if self.capture_process is not None:
+            self.capture_running = True
+            self.capture_process.start()
+            return
+        
+        if self.stream_reader is not None:
+            self.stream_reader.start()
+        
+        if not self.capture_running:
+            self.capture_running = True
+            self.capture_thread = threading.Thread(target=self.capture_loop, daemon=True)
+            self.capture_thread.start()
+    
+    def stop_capture(self):
+        """Stop producer thread and capture backend"""
+        self.capture_running = False
+        if self.capture_process is not None:
+            self.capture_process.close()
+        if self.stream_reader is not None:
+            self.stream_reader.stop()
+        if self.capture_thread:
+            self.capture_thread.join(timeout=2)
+        if self.stream_reader is not None:
+            # capture_jpeg may have reopened the stream while we were joining
+            self.stream_reader.stop()
+        self.frame_buffer.clear()
+    
+    def capture_loop(self):
+        """Producer: keep pulling frames so the camera never waits for inference"""
+        while self.capture_running:
+            frame = self.capture_frame()
+            if frame is not None:
+                self.frame_buffer.put(frame)
+            elif self.capture_source == "http":
+                # Avoid hammering an unreachable camera
+                time.sleep(1)
+    
+    def get_latest_frame(self, timeout=2.0):
+        """Consumer: newest buffered frame, older ones are dropped"""
+        if self.capture_process is not None:
+            # View ke shared memory, valid sampai get_latest_frame berikutnya
+            shared = self.capture_process.frame_bus.get(timeout=timeout)
+            if shared is None:
+                return None
+            frame, _, self.last_frame_timestamp, scale = shared
+            if self.roi is not None:
+                self.roi.pixel_scale = scale
+            return frame
+        
+        buffered = self.frame_buffer.get_latest(timeout=timeout)
+        if buffered is None:
+            return None
+        self.last_frame_timestamp = buffered.timestamp
+        return buffered.frame
+    
+    def capture_jpeg(self):
+        """Get raw JPEG bytes from ESP32-CAM"""
+        reader = self.stream_reader
+        if reader is not None:
+            # Newest frame from the open stream, no HTTP round trip
+            reader.start()
+            jpeg, _ = reader.read()
+            return jpeg
+        
         try:
             response = requests.get(self.capture_url, timeout=5)
             if response.status_code == 200:
-                img_array = np.frombuffer(response.content, np.uint8)
-                frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
-                return frame
+                return response.content
             else:
                 print(f"Failed to capture: {response.status_code}")
                 return None
@@ -57,67 +2481,181 @@ class VehicleDetector:
             print(f"Capture error: {e}")
             return None
     
-    def detect_vehicles(self, frame):
+    def decode_frame(self, jpeg):
+        """Decode JPEG bytes to BGR frame (reduced scale kalau kamera jauh lebih besar dari input model)"""
+        return self.decoder.decode(jpeg)
+    
+    def capture_frame(self):
+        """Capture frame from ESP32-CAM"""
+        return self.decode_frame(self.capture_jpeg())
+    
+    def model_input(self, frame):
+        """Frame yang dikirim ke model: crop ROI atau full frame"""
+        return self.roi.crop(frame) if self.roi is not None else frame
+    
+    def run_inference(self, frame):
+        """Run YOLO detection on a frame (ROI crop only, if configured)"""
+        return self.model(self.model_input(frame), conf=self.conf_threshold, imgsz=self.imgsz, verbose=False)
+    
+    def needs_inference(self, frame):
+        """Motion gate check; False = hasil terakhir masih berlaku"""
+        if self.motion_gate is None:
+            return True
+        # Hanya gerakan di dalam zona perlintasan yang dihitung
+        run = self.motion_gate.check(self.model_input(frame)) or self.last_analysis is None
+        if not run:
+            # Hasil lama dipakai ulang: bukan deteksi baru, tracker tidak boleh menambah hits
+            self.last_detected = False
+        return run
+    
+    def should_propagate(self):
+        """Detect-every-N: True jika frame ini cukup dengan propagasi optical flow"""
+        return (self.scheduler is not None and self.last_analysis is not None
+                and not self.scheduler.should_detect())
+    
+    def analyze_frame(self, frame, timestamp=None):
         """
-        Detect bus and car using YOLO
-        Returns: detections dict, max_confidence, annotated_frame
+        Inference + post-processing, di-skip oleh motion gate jika frame statis
+        dan diganti propagasi optical flow di antara deteksi (detect-every-N)
+        timestamp: waktu capture frame, untuk latency adaptive resolution
+        Returns: detections dict, max_confidence, detected_objects
         """
-        try:
-            # Run YOLO detection
-            results = self.model(frame, conf=self.conf_threshold, verbose=False)
-            
-            detections = {"bus": False, "car": False}
-            max_confidence = 0.0
-            detected_objects = []
+        if not self.needs_inference(frame):
+            return self.last_analysis
+        if self.should_propagate():
+            return self.propagate_frame(frame)
+        
+        start_time = time.perf_counter()
+        self.last_analysis = self.parse_results(self.run_inference(frame))
+        self.record_detection(frame, time.perf_counter() - start_time, timestamp)
+        return self.last_analysis
+    
+    def record_detection(self, frame, elapsed, timestamp=None):
+        """YOLO baru saja dijalankan pada frame ini"""
+        self.last_detected = True
+        if self.scheduler is not None:
+            self.scheduler.record_detection(elapsed)
+            self.propagator.observe(frame)
+        if self.resolution is not None:
+            # Latency capture -> hasil (termasuk waktu antri), tanpa timestamp = inference saja
+            timestamp = timestamp or self.last_frame_timestamp
+            latency = time.time() - timestamp if timestamp else elapsed
+            self.imgsz = self.resolution.update(latency, elapsed, self.last_analysis[2])
+    
+    def propagate_frame(self, frame):
+        """Box deteksi terakhir digeser optical flow ke frame ini (tanpa YOLO)"""
+        start_time = time.perf_counter()
+        detected_objects, quality = self.propagator.propagate(frame, self.last_analysis[2])
+        detections, max_confidence = self.summarize(detected_objects)
+        self.scheduler.record_propagation(time.perf_counter() - start_time, quality)
+        self.last_analysis = (detections, max_confidence, detected_objects)
+        self.last_detected = False
+        return self.last_analysis
+    
+    def summarize(self, detected_objects):
+        """bus/car present flags and max confidence of a DetectionResult"""
+        counts = np.bincount(detected_objects.class_ids, minlength=len(self.model.names))
+        detections = {"bus": False, "car": False}
+        for name, cls_id in self.target_classes.items():
+            detections[name] = bool(counts[cls_id])
+        max_confidence = float(detected_objects.confidences.max()) if len(detected_objects) else 0.0
+        return detections, max_confidence
+    
+    def parse_results(self, results):
+        """
+        Filter YOLO results to bus and car using array operations
+        Returns: detections dict, max_confidence, detected_objects (DetectionResult)
+        """
+        # One device -> host transfer per result: [x1, y1, x2, y2, conf, cls]
+        arrays = [result.boxes.data.cpu().numpy() for result in results
+                  if result.boxes is not None and len(result.boxes)]
+        if not arrays:
+            return {"bus": False, "car": False}, 0.0, DetectionResult.empty(self.model.names)
+        data = np.concatenate(arrays) if len(arrays) > 1 else arrays[0]
+        
+        if self.roi is not None:
+            # Crop -> full-frame coordinates, drop vehicles outside the crossing zone
+            data = np.hstack((self.roi.to_frame(data[:, :4]), data[:, 4:]))
+            data = data[self.roi.contains(data[:, :4])]
+        
+        # Only detect bus and car
+        class_ids = data[:, 5].astype(np.int32)
+        mask = np.isin(class_ids, self.target_class_ids)
+        detected_objects = DetectionResult(
+            data[mask, :4].astype(np.int32),
+            data[mask, 4],
+            class_ids[mask],
+            self.model.names
+        )
+        
+        detections, max_confidence = self.summarize(detected_objects)
+        return detections, max_confidence, detected_objects
+    
+    def annotate_frame(self, frame, detected_objects):
+        """Draw bounding boxes and labels on a copy of the frame (buffer dari frame_pool)"""
+        annotated_frame = self.frame_pool.copy(frame)
+        
+        for obj in detected_objects:
+            class_name = obj['class']
+            conf = obj['confidence']
+            x1, y1, x2, y2 = obj['box']
             
-            # Create annotated frame
-            annotated_frame = frame.copy()
+            # Color: Green for bus, Blue for car
+            color = (0, 255, 0) if class_name == 'bus' else (255, 0, 0)
+            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
             
-            for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    cls = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    class_name = self.model.names[cls]
-                    
-                    # Only detect bus and car
-                    if class_name in ['bus', 'car']:
-                        detections[class_name] = True
-                        max_confidence = max(max_confidence, conf)
-                        detected_objects.append({
-                            'class': class_name,
-                            'confidence': conf
-                        })
-                        
-                        # Draw bounding box
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        
-                        # Color: Green for bus, Blue for car
-                        color = (0, 255, 0) if class_name == 'bus' else (255, 0, 0)
-                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
-                        
-                        # Draw label with background
-                        label = f"{class_name.upper()}: {conf:.2f}"
-                        label_size, _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                        cv2.rectangle(annotated_frame, (x1, y1 - label_size[1] - 10), 
-                                    (x1 + label_size[0], y1), color, -1)
-                        cv2.putText(annotated_frame, label, (x1, y1 - 5),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            # Draw label with background (sprite cache: class + confidence, track id terpisah)
+            label = f"{class_name.upper()}: {conf:.2f}"
+            prefix = f"#{obj['track_id']} " if obj['track_id'] else None
+            self.overlay.draw_label(annotated_frame, label, x1, y1, color, prefix=prefix)
+        
+        return annotated_frame
+    
+    def detect_vehicles(self, frame, annotate=None):
+        """
+        Detect bus and car using YOLO
+        Returns: detections dict, max_confidence, annotated_frame (None jika tanpa annotation), detected_objects
+        """
+        if annotate is None:
+            annotate = not self.headless
+        
+        try:
+            detections, max_confidence, detected_objects = self.analyze_frame(frame)
+            annotated_frame = self.annotate_frame(frame, detected_objects) if annotate else None
             
             return detections, max_confidence, annotated_frame, detected_objects
             
         except Exception as e:
             print(f"Detection error: {e}")
-            return {"bus": False, "car": False}, 0.0, frame, []
+            return ({"bus": False, "car": False}, 0.0, frame if annotate else None,
+                    DetectionResult.empty(self.model.names))
+    
+    def update_counters(self, detected_objects, timestamp=None):
+        """Update tracks and unique bus/car counts (satu kendaraan = satu hitungan)"""
+        self.tracker.update(detected_objects, timestamp, detected=self.last_detected)
+        self.bus_detected_count = self.tracker.counts.get('bus', 0)
+        self.car_detected_count = self.tracker.counts.get('car', 0)
+    
+    def update_barrier_state(self, detections):
+        """
+        Barrier logic: ada bus/car → DOWN, tidak ada → UP
+        Returns action taken, or None if the state did not change
+        """
+        vehicle_present = detections["bus"] or detections["car"]
+        if vehicle_present and self.barrier_state != "DOWN":
+            self.barrier_state = "DOWN"
+            return "BARRIER_LOWERED"
+        if not vehicle_present and self.barrier_state != "UP":
+            self.barrier_state = "UP"
+            return "BARRIER_RAISED"
+        return None
     
     def add_info_overlay(self, frame, detections, detected_objects):
         """Add information overlay to frame"""
         height, width = frame.shape[:2]
         
-        # Create semi-transparent overlay panel
-        overlay = frame.copy()
-        cv2.rectangle(overlay, (10, 10), (width - 10, 120), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.6, frame, 0.4, 0, frame)
+        # Semi-transparent overlay panel (blend hanya area panel)
+        self.overlay.panel(frame, (10, 10), (width - 10, 120))
         
         # Add text information
         y_offset = 35
@@ -132,6 +2670,10 @@ class VehicleDetector:
         cv2.putText(frame, f"Car Count: {self.car_detected_count}", (20, y_offset),
                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
         
+        if self.resolution is not None:
+            cv2.putText(frame, f"imgsz: {self.imgsz}", (250, 35),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+        
         # Show current detection status
         if detected_objects:
             status_text = "DETECTED: " + ", ".join([f"{obj['class'].upper()}({obj['confidence']:.2f})" 
@@ -144,46 +2686,113 @@ class VehicleDetector:
         
         return frame
     
-    def run_detection(self):
-        """Main detection loop"""
+    def make_result(self, frame, detections, confidence, detected_objects, timestamp):
+        """Structured per-frame result (tanpa annotation)"""
+        return {
+            'frame_id': self.total_frames,
+            'timestamp': timestamp,
+            'frame': frame,
+            'detections': detections,
+            'confidence': confidence,
+            'detected_objects': detected_objects
+        }
+    
+    def render_frame(self, result, fps=None):
+        """Annotate a structured result: boxes, info overlay, FPS and frame age"""
+        annotated_frame = self.annotate_frame(result['frame'], result['detected_objects'])
+        annotated_frame = self.add_info_overlay(annotated_frame, result['detections'], result['detected_objects'])
+        if self.roi is not None:
+            self.roi.draw(annotated_frame)
+        width = annotated_frame.shape[1]
+        
+        if fps is not None:
+            cv2.putText(annotated_frame, f"FPS: {fps:.0f}", (width - 120, 35),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        
+        # Frame age (capture -> render) & dropped frames
+        cv2.putText(annotated_frame, f"Age: {(time.time() - result['timestamp']) * 1000:.0f}ms", 
+                   (width - 120, 65), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        cv2.putText(annotated_frame, f"Drop: {self.dropped_frames()}", 
+                   (width - 120, 95), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        
+        return annotated_frame
+    
+    def get_annotated_frame(self):
+        """
+        Lazy annotation for viewers/recorders
+        Frame hanya digambar saat ada yang meminta
+        """
+        if self.latest_result is None:
+            return None
+        return self.render_frame(self.latest_result)
+    
+    def dropped_frames(self):
+        """Frames captured but never processed (ring buffer + pipeline)"""
+        dropped = self.frame_buffer.dropped_frames
+        if self.capture_process is not None:
+            dropped += self.capture_process.frame_bus.dropped
+        if self.pipeline is not None:
+            dropped += sum(stage.dropped for stage in self.pipeline.stages)
+        return dropped
+    
+    def print_detections(self, result):
+        """Print detection info to console"""
+        if result['detected_objects']:
+            detection_str = ", ".join([f"{obj['class'].upper()}{f'#' + str(obj['track_id']) if obj['track_id'] else ''}"
+                                       f"({obj['confidence']:.2f})" for obj in result['detected_objects']])
+            print(f"Frame {result['frame_id']}: {detection_str}")
+    
+    def print_banner(self, title):
+        """Print start banner and controls"""
         print("\n" + "="*60)
-        print("🚀 Starting Vehicle Detection")
+        print(f"🚀 {title}")
         print("="*60)
-        print("Controls:")
-        print("  - Press 'q' to quit")
-        print("  - Press 's' to save screenshot")
-        print("  - Press 'r' to reset counters")
+        if self.headless:
+            print("Headless mode - press Ctrl+C to stop")
+        else:
+            print("Controls:")
+            print("  - Press 'q' to quit")
+            print("  - Press 's' to save screenshot")
+            print("  - Press 'r' to reset counters")
         print("="*60 + "\n")
-        
-        # Setup OpenCV window
-        window_name = "Vehicle Detection - ESP32-CAM"
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 800, 600)
+    
+    def setup_window(self):
+        """Create OpenCV window (skipped in headless mode)"""
+        if not self.headless:
+            cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(self.window_name, 800, 600)
+    
+    def run_detection(self):
+        """Main detection loop"""
+        self.print_banner("Starting Vehicle Detection")
+        self.setup_window()
         
         fps_start_time = time.time()
         fps_frame_count = 0
         current_fps = 0
+        annotated_frame = None
+        
+        # Start camera stream + background capture thread
+        self.start_capture()
         
         try:
             while True:
-                # Capture frame
-                frame = self.capture_frame()
+                # Take newest frame from ring buffer
+                frame = self.get_latest_frame()
+                vehicle_present = False
                 
                 if frame is not None:
                     self.total_frames += 1
                     fps_frame_count += 1
                     
-                    # Run detection
-                    detections, confidence, annotated_frame, detected_objects = self.detect_vehicles(frame)
-                    
-                    # Update counters
-                    if detections["bus"]:
-                        self.bus_detected_count += 1
-                    if detections["car"]:
-                        self.car_detected_count += 1
+                    # Run detection (structured result only, no drawing)
+                    detections, confidence, detected_objects = self.analyze_frame(frame)
+                    self.latest_result = self.make_result(frame, detections, confidence,
+                                                          detected_objects, self.last_frame_timestamp)
                     
-                    # Add info overlay
-                    annotated_frame = self.add_info_overlay(annotated_frame, detections, detected_objects)
+                    # Update tracks & unique vehicle counts
+                    self.update_counters(detected_objects, self.last_frame_timestamp)
+                    vehicle_present = detections["bus"] or detections["car"]
                     
                     # Calculate FPS
                     if time.time() - fps_start_time >= 1.0:
@@ -191,67 +2800,442 @@ class VehicleDetector:
                         fps_frame_count = 0
                         fps_start_time = time.time()
                     
-                    # Add FPS to frame
-                    cv2.putText(annotated_frame, f"FPS: {current_fps}", 
-                               (annotated_frame.shape[1] - 120, 35),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-                    
-                    # Display frame
-                    cv2.imshow(window_name, annotated_frame)
+                    # Annotate & display only when there is a viewer
+                    if not self.headless:
+                        # imshow sudah menyalin frame sebelumnya, buffer-nya bisa dipakai ulang
+                        self.frame_pool.release(annotated_frame)
+                        annotated_frame = self.render_frame(self.latest_result, fps=current_fps)
+                        cv2.imshow(self.window_name, annotated_frame)
                     
                     # Print detection info to console
-                    if detected_objects:
-                        detection_str = ", ".join([f"{obj['class'].upper()}({obj['confidence']:.2f})" 
-                                                   for obj in detected_objects])
-                        print(f"Frame {self.total_frames}: {detection_str}")
+                    self.print_detections(self.latest_result)
                 
                 else:
+                    # get_latest_frame already waited for the capture thread
                     print("Failed to capture frame, retrying...")
-                    time.sleep(1)
                 
                 # Handle keyboard input
-                key = cv2.waitKey(1) & 0xFF
+                if not self.headless and not self.handle_key(annotated_frame):
+                    break
                 
-                if key == ord('q'):
-                    print("\n'q' pressed - stopping detection")
+                # Sleep only what is left of the frame budget (idle FPS while the scene is empty)
+                self.governor.wait(active=vehicle_present)
+                
+        except KeyboardInterrupt:
+            print("\n⏹️ Detection interrupted by user")
+        
+        finally:
+            # Cleanup
+            self.stop_capture()
+            if not self.headless:
+                cv2.destroyAllWindows()
+            
+            # Print final statistics
+            self.print_summary()
+    
+    def handle_key(self, annotated_frame):
+        """
+        Handle keyboard input from the OpenCV window
+        Returns False when the user wants to quit
+        """
+        key = cv2.waitKey(1) & 0xFF
+        
+        if key == ord('q'):
+            print("\n'q' pressed - stopping detection")
+            return False
+            
+        elif key == ord('s') and annotated_frame is not None:
+            # Save screenshot
+            timestamp = int(time.time())
+            filename = f"detection_{timestamp}.jpg"
+            cv2.imwrite(filename, annotated_frame)
+            print(f"📸 Screenshot saved: {filename}")
+            
+        elif key == ord('r'):
+            # Reset counters
+            self.total_frames = 0
+            self.bus_detected_count = 0
+            self.car_detected_count = 0
+            self.tracker.reset_counts()
+            print("🔄 Counters reset")
+        
+        return True
+    
+    def print_summary(self):
+        """Print final detection statistics"""
+        print("\n" + "="*60)
+        print("📊 Detection Summary")
+        print("="*60)
+        print(f"Total Frames Processed: {self.total_frames}")
+        print(f"Unique Buses: {self.bus_detected_count}")
+        print(f"Unique Cars: {self.car_detected_count}")
+        print(f"Active Tracks: {len(self.tracker.tracks)}")
+        print(f"Dropped Frames: {self.dropped_frames()}")
+        if self.governor.frames:
+            print(f"Frame Rate: {self.governor.report()}")
+        if self.frame_pool.allocations:
+            print(f"Frame Pool: {self.frame_pool.allocations} buffers allocated, "
+                  f"{self.frame_pool.reuse_ratio * 100:.1f}% reused, {self.frame_pool.in_use} in use")
+        if self.overlay.misses:
+            print(f"Overlay Sprites: {self.overlay.cached} cached, {self.overlay.hit_ratio * 100:.1f}% hit rate")
+        if self.decoder.frames:
+            size = "x".join(map(str, self.decoder.source_size or ()))
+            print(f"JPEG Decode: {size} at 1/{self.decoder.scale} scale, "
+                  f"avg {self.decoder.avg_decode_time * 1000:.1f} ms/frame")
+        if self.stream_reader is not None:
+            print(f"Camera FPS: {self.stream_reader.fps:.1f} | Reconnects: {self.stream_reader.reconnect_count}")
+        if self.motion_gate is not None:
+            print(f"Motion Gate: skipped {self.motion_gate.skipped}/{self.motion_gate.checked} frames "
+                  f"({self.motion_gate.skip_ratio * 100:.1f}% inference saved)")
+        if self.scheduler is not None:
+            print(f"Detect-every-N: YOLO on {self.scheduler.detection_ratio * 100:.1f}% of frames "
+                  f"(N={self.scheduler.interval}, infer {self.scheduler.avg_inference_time * 1000:.0f}ms, "
+                  f"flow {self.scheduler.avg_propagation_time * 1000:.1f}ms)")
+        if self.resolution is not None:
+            print(f"Adaptive Resolution: imgsz={self.imgsz} ({self.resolution.changes} changes)")
+            self.resolution.print_stats()
+        if self.pipeline is not None:
+            print("Pipeline Stages:")
+            self.pipeline.print_stats()
+        print("="*60)
+    
+    # ==================== PIPELINED MODE ====================
+    
+    def _stage_capture(self, _):
+        """Pipeline stage: get raw JPEG from camera, paced by the frame rate governor"""
+        # Hasil publish terakhir menentukan full / idle frame rate
+        result = self.latest_result
+        vehicle_present = result is not None and (result['detections']["bus"] or result['detections']["car"])
+        self.governor.wait(active=vehicle_present)
+        
+        jpeg = self.capture_jpeg()
+        if jpeg is None:
+            if self.capture_source == "http":
+                time.sleep(1)
+            return None
+        return {'jpeg': jpeg, 'timestamp': time.time()}
+    
+    def _stage_decode(self, item):
+        """Pipeline stage: JPEG -> BGR frame"""
+        item['frame'] = self.decode_frame(item.pop('jpeg'))
+        return item if item['frame'] is not None else None
+    
+    def _stage_infer(self, item):
+        """Pipeline stage: YOLO inference + post-processing (motion-gated)"""
+        detections, confidence, detected_objects = self.analyze_frame(item['frame'], item['timestamp'])
+        
+        self.total_frames += 1
+        self.update_counters(detected_objects, item['timestamp'])
+        
+        item['frame_id'] = self.total_frames
+        item['detections'] = detections
+        item['confidence'] = confidence
+        item['detected_objects'] = detected_objects
+        return item
+    
+    def _stage_annotate(self, item):
+        """Pipeline stage: boxes, info overlay and FPS"""
+        item['annotated_frame'] = self.render_frame(item, fps=self.pipeline.stages[-1].throughput)
+        return item
+    
+    def _stage_publish(self, item):
+        """Pipeline stage: console output, result handed to the consumer"""
+        self.latest_result = item
+        self.print_detections(item)
+        return item
+    
+    def run_pipelined_detection(self, queue_size=2, stats_interval=10):
+        """
+        Detection loop with capture, decode, infer, annotate and publish
+        each running on its own worker, joined by bounded queues
+        (headless: annotate stage is left out)
+        """
+        self.print_banner("Starting Vehicle Detection (pipelined)")
+        self.setup_window()
+        
+        stages = [
+            ("capture", self._stage_capture),
+            ("decode", self._stage_decode),
+            ("infer", self._stage_infer),
+        ]
+        if not self.headless:
+            stages.append(("annotate", self._stage_annotate))
+        stages.append(("publish", self._stage_publish))
+        self.pipeline = DetectionPipeline(stages, queue_size=queue_size)
+        
+        if self.stream_reader is not None:
+            self.stream_reader.start()
+        self.pipeline.start()
+        
+        annotated_frame = None
+        last_stats_time = time.time()
+        
+        try:
+            while True:
+                item = self.pipeline.get()
+                
+                if item is None:
+                    print("Waiting for frames from pipeline...")
+                elif not self.headless:
+                    self.frame_pool.release(annotated_frame)
+                    annotated_frame = item['annotated_frame']
+                    cv2.imshow(self.window_name, annotated_frame)
+                
+                # Handle keyboard input
+                if not self.headless and not self.handle_key(annotated_frame):
                     break
-                    
-                elif key == ord('s'):
-                    # Save screenshot
-                    timestamp = int(time.time())
-                    filename = f"detection_{timestamp}.jpg"
-                    cv2.imwrite(filename, annotated_frame)
-                    print(f"📸 Screenshot saved: {filename}")
-                    
-                elif key == ord('r'):
-                    # Reset counters
-                    self.total_frames = 0
-                    self.bus_detected_count = 0
-                    self.car_detected_count = 0
-                    print("🔄 Counters reset")
                 
-                time.sleep(0.05)  # ~20 FPS
+                # Periodic per-stage statistics
+                if time.time() - last_stats_time >= stats_interval:
+                    print("📈 Pipeline stats:")
+                    self.pipeline.print_stats()
+                    if self.motion_gate is not None:
+                        print(f"  motion gate: {self.motion_gate.skip_ratio * 100:.1f}% frames skipped")
+                    if self.scheduler is not None:
+                        print(f"  detect-every-N: N={self.scheduler.interval}, "
+                              f"YOLO on {self.scheduler.detection_ratio * 100:.1f}% of frames")
+                    if self.resolution is not None:
+                        print(f"  resolution: imgsz={self.imgsz} ({self.resolution.last_reason})")
+                    if self.frame_pool.allocations:
+                        print(f"  frame pool: {self.frame_pool.in_use} in use / {self.frame_pool.free} free "
+                              f"({self.frame_pool.occupancy * 100:.0f}% occupancy)")
+                    last_stats_time = time.time()
                 
         except KeyboardInterrupt:
             print("\n⏹️ Detection interrupted by user")
         
         finally:
             # Cleanup
-            cv2.destroyAllWindows()
+            self.pipeline.stop()
+            self.stop_capture()
+            if not self.headless:
+                cv2.destroyAllWindows()
             
             # Print final statistics
-            print("\n" + "="*60)
-            print("📊 Detection Summary")
-            print("="*60)
-            print(f"Total Frames Processed: {self.total_frames}")
-            print(f"Bus Detections: {self.bus_detected_count}")
-            print(f"Car Detections: {self.car_detected_count}")
-            print("="*60)
+            self.print_summary()
+
+class MultiCameraDetector:
+    def __init__(self, camera_ips, model_path, capture_source="stream", headless=False, backend="auto",
+                 motion_gate=False, roi_config=None, target_latency=None, adaptive_resolution=False,
+                 capture_process=False):
+        """
+        Multi-camera mode: satu YOLO model untuk N ESP32-CAM
+        Frame terbaru dari semua kamera di-inference dalam satu batch
+        adaptive_resolution: satu imgsz untuk seluruh batch, penuh jika ada kendaraan di kamera mana pun
+        capture_process: satu proses capture per kamera, frame lewat shared memory
+        """
+        # Load model once, shared by every camera
+        print(f"Loading YOLO model from: {model_path}")
+        model_backends = ModelBackends(model_path)
+        self.model = model_backends.load(backend)
+        self.backend = model_backends.backend
+        self.conf_threshold = 0.6
+        self.imgsz = 640
+        self.resolution = ResolutionController(sizes=(320, 480, self.imgsz)) if adaptive_resolution else None
+        
+        # Kamera baru (mis. dari CameraDiscovery) dibuat dengan setting yang sama
+        self.model_path = model_path
+        self.camera_options = dict(capture_source=capture_source, headless=headless, motion_gate=motion_gate,
+                                   roi_config=roi_config, target_latency=target_latency,
+                                   capture_process=capture_process)
+        self.cameras = [self.create_camera(ip) for ip in camera_ips]
+        self.headless = headless
+        self.running = False
+        
+        # Batch statistics
+        self.total_batches = 0
+        self.total_batched_frames = 0
+        self.batch_time = 0.0
+        
+        print(f"✅ Multi-Camera Detector Initialized ({len(self.cameras)} cameras)")
+    
+    def create_camera(self, ip):
+        """VehicleDetector untuk satu kamera, memakai model bersama"""
+        return VehicleDetector(ip, self.model_path, model=self.model, backend=self.backend, **self.camera_options)
+    
+    def add_camera(self, ip):
+        """Tambah kamera saat runtime (capture langsung di-start jika detection sedang berjalan)"""
+        if any(camera.esp32_cam_ip == ip for camera in self.cameras):
+            return None
+        print(f"➕ Adding camera {ip}")
+        camera = self.create_camera(ip)
+        if self.running:
+            camera.start_capture()
+        self.cameras.append(camera)
+        return camera
+    
+    def test_camera_connections(self):
+        """Test every camera, return list of reachable detectors"""
+        return [camera for camera in self.cameras if camera.test_camera_connection()]
+    
+    def gather_frames(self, timeout=1.0):
+        """Collect the newest frame from every camera that has one"""
+        deadline = time.time() + timeout
+        
+        while time.time() < deadline:
+            batch = []
+            for camera in self.cameras:
+                frame = camera.get_latest_frame(timeout=0)
+                if frame is not None:
+                    batch.append((camera, frame))
+            if batch:
+                return batch
+            time.sleep(0.005)
+        
+        return []
+    
+    def process_batch(self, batch):
+        """
+        Run one batched YOLO call and route results to per-camera state
+        Kamera tanpa gerakan (motion gate) tidak masuk batch, hasil terakhirnya dipakai ulang
+        Kamera di antara deteksi (detect-every-N) dipropagasi optical flow, juga tidak masuk batch
+        Returns list of (camera, frame, detections, confidence, detected_objects, action)
+        """
+        moving = []
+        for camera, frame in batch:
+            if not camera.needs_inference(frame):
+                continue
+            if camera.should_propagate():
+                camera.propagate_frame(frame)
+            else:
+                moving.append((camera, frame))
+        
+        if moving:
+            frames = [camera.model_input(frame) for camera, frame in moving]
+            start_time = time.time()
+            results = self.model(frames, conf=self.conf_threshold, imgsz=self.imgsz, verbose=False)
+            elapsed = time.time() - start_time
+            self.batch_time += elapsed
+            self.total_batches += 1
+            self.total_batched_frames += len(frames)
+            
+            for (camera, frame), result in zip(moving, results):
+                camera.last_analysis = camera.parse_results([result])
+                camera.record_detection(frame, elapsed)
+            
+            if self.resolution is not None:
+                # Latency frame tertua di batch, semua deteksi batch dianggap satu scene
+                oldest = min(camera.last_frame_timestamp or time.time() for camera, _ in moving)
+                detected = [camera.last_analysis[2] for camera, _ in moving]
+                combined = DetectionResult(np.concatenate([d.boxes for d in detected]),
+                                           np.concatenate([d.confidences for d in detected]),
+                                           np.concatenate([d.class_ids for d in detected]),
+                                           self.model.names)
+                self.imgsz = self.resolution.update(time.time() - oldest, elapsed / len(frames), combined)
+        
+        outputs = []
+        for camera, frame in batch:
+            detections, confidence, detected_objects = camera.last_analysis
+            
+            camera.total_frames += 1
+            camera.update_counters(detected_objects, camera.last_frame_timestamp)
+            action = camera.update_barrier_state(detections)
+            camera.latest_result = camera.make_result(frame, detections, confidence,
+                                                      detected_objects, camera.last_frame_timestamp)
+            
+            if action:
+                print(f"🚧 [{camera.esp32_cam_ip}] {action} (confidence: {confidence:.2f})")
+            
+            outputs.append((camera, frame, detections, confidence, detected_objects, action))
+        
+        return outputs
+    
+    def run_detection(self):
+        """Main multi-camera detection loop"""
+        print("\n" + "="*60)
+        print(f"🚀 Starting Multi-Camera Detection ({len(self.cameras)} cameras)")
+        print("="*60)
+        print("Press Ctrl+C to stop" if self.headless else "Controls:\n  - Press 'q' to quit")
+        print("="*60 + "\n")
+        
+        self.running = True
+        for camera in self.cameras:
+            camera.start_capture()
+        
+        try:
+            while True:
+                batch = self.gather_frames()
+                
+                if batch:
+                    for camera, frame, detections, confidence, detected_objects, action in self.process_batch(batch):
+                        if not self.headless:
+                            annotated_frame = camera.render_frame(camera.latest_result)
+                            cv2.imshow(f"Vehicle Detection - {camera.esp32_cam_ip}", annotated_frame)
+                            camera.frame_pool.release(annotated_frame)
+                else:
+                    print("No frames from any camera, retrying...")
+                
+                if not self.headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                    print("\n'q' pressed - stopping detection")
+                    break
+                
+        except KeyboardInterrupt:
+            print("\n⏹️ Detection interrupted by user")
+        
+        finally:
+            self.running = False
+            for camera in self.cameras:
+                camera.stop_capture()
+            if not self.headless:
+                cv2.destroyAllWindows()
+            self.print_summary()
+    
+    def set_camera_ip(self, old_ip, new_ip):
+        """
+        Hot-swap kamera dengan IP lama ke IP baru (dari CameraDiscovery)
+        old_ip None (kamera baru pertama kali publish IP) / tidak dikenal: kamera ditambahkan
+        """
+        if any(camera.esp32_cam_ip == new_ip for camera in self.cameras):
+            return
+        for camera in self.cameras:
+            if old_ip is not None and camera.esp32_cam_ip == old_ip:
+                camera.set_camera_ip(new_ip)
+                return
+        self.add_camera(new_ip)
+    
+    def print_summary(self):
+        """Print batch and per-camera statistics"""
+        print("\n" + "="*60)
+        print("📊 Multi-Camera Detection Summary")
+        print("="*60)
+        if self.total_batches:
+            print(f"Batches: {self.total_batches} "
+                  f"(avg size {self.total_batched_frames / self.total_batches:.1f}, "
+                  f"avg {self.batch_time / self.total_batches * 1000:.1f} ms/batch)")
+        if self.resolution is not None:
+            print(f"Adaptive Resolution: imgsz={self.imgsz} ({self.resolution.changes} changes)")
+            self.resolution.print_stats()
+        for camera in self.cameras:
+            print(f"[{camera.esp32_cam_ip}] Frames: {camera.total_frames} | "
+                  f"Bus: {camera.bus_detected_count} | Car: {camera.car_detected_count} | "
+                  f"Dropped: {camera.frame_buffer.dropped_frames} | Barrier: {camera.barrier_state}"
+                  + (f" | Skipped: {camera.motion_gate.skip_ratio * 100:.0f}%" if camera.motion_gate else "")
+                  + (f" | YOLO: {camera.scheduler.detection_ratio * 100:.0f}%" if camera.scheduler else ""))
+        print("="*60)
 
 def main():
     # ==================== CONFIGURATION ====================
     ESP32_CAM_IP = "192.168.1.187"  # Ganti dengan IP ESP32-CAM kamu
+    EXTRA_CAM_IPS = []  # IP ESP32-CAM tambahan untuk multi-camera mode (batched inference)
     MODEL_PATH = "./runs/detect/train/weights/best.pt"  # Path ke model YOLO
+    CAPTURE_SOURCE = "stream"  # "stream" (MJPEG /stream), "websocket" (firmware v7 port 81) atau "http" (/capture)
+    PIPELINED = True  # Capture, decode, inference, annotate & publish di thread terpisah
+    HEADLESS = False  # True untuk node production tanpa layar (tanpa window & annotation)
+    BACKEND = "auto"  # "auto", "pytorch", "onnx", "openvino", "onnx-int8", "openvino-int8"
+    MOTION_GATE = True  # Skip YOLO pada frame tanpa gerakan (full inference tetap tiap 2 detik)
+    ROI_CONFIG = "roi_config.json"  # Zona perlintasan per kamera (lihat roi_config.example.json), tidak ada = full frame
+    TARGET_LATENCY = 0.05  # Detik per frame: YOLO tiap N frame + optical flow di antaranya (None = YOLO setiap frame)
+    ADAPTIVE_RESOLUTION = True  # imgsz 320/480/640 sesuai beban & ada tidaknya kendaraan di zona perlintasan
+    CAPTURE_PROCESS = False  # Capture + decode di proses terpisah (shared memory), tidak untuk PIPELINED
+    TARGET_FPS = 20  # Frame rate detection loop (None = secepat mungkin)
+    IDLE_FPS = None  # Frame rate hemat daya saat tidak ada kendaraan (opt-in, mis. 2; None = selalu TARGET_FPS)
+    
+    # Camera discovery: IP kamera dari MQTT (smartTrain/camera/ip), ESP32_CAM_IP jadi fallback
+    CAMERA_DISCOVERY = False
+    MQTT_BROKER = "9e108cb03c734f0394b0f0b49508ec1e.s1.eu.hivemq.cloud"
+    MQTT_PORT = 8883
+    MQTT_USER = "Device02"
+    MQTT_PASS = "Device02"
     # =======================================================
     
     # Verify model exists
@@ -260,20 +3244,68 @@ def main():
         print("Please provide the correct path to your YOLO model")
         return
     
+    # Discover camera IP before loading the model
+    discovery = None
+    if CAMERA_DISCOVERY:
+        discovery = CameraDiscovery(MQTT_BROKER, MQTT_PORT, MQTT_USER, MQTT_PASS)
+        if discovery.connect():
+            print("⏳ Waiting for camera IP on smartTrain/camera/ip...")
+            discovered_ip = discovery.wait_for_ip(timeout=15)
+            if discovered_ip:
+                ESP32_CAM_IP = discovered_ip
+            else:
+                print(f"⚠️ No camera IP received yet, using {ESP32_CAM_IP}")
+        else:
+            discovery = None
+    
+    # Multi-camera mode: one shared model, batched inference
+    if EXTRA_CAM_IPS:
+        multi_detector = MultiCameraDetector([ESP32_CAM_IP] + EXTRA_CAM_IPS, MODEL_PATH,
+                                             capture_source=CAPTURE_SOURCE, headless=HEADLESS,
+                                             backend=BACKEND, motion_gate=MOTION_GATE,
+                                             roi_config=ROI_CONFIG, target_latency=TARGET_LATENCY,
+                                             adaptive_resolution=ADAPTIVE_RESOLUTION,
+                                             capture_process=CAPTURE_PROCESS)
+        if discovery:
+            discovery.on_ip_change = lambda camera_id, ip, old_ip: multi_detector.set_camera_ip(old_ip, ip)
+        if not multi_detector.test_camera_connections() and discovery is None:
+            print("\n⚠️ Cannot connect to any ESP32-CAM")
+            return
+        multi_detector.run_detection()
+        return
+    
     # Create detector
-    detector = VehicleDetector(ESP32_CAM_IP, MODEL_PATH)
+    detector = VehicleDetector(ESP32_CAM_IP, MODEL_PATH, capture_source=CAPTURE_SOURCE, headless=HEADLESS,
+                               backend=BACKEND, motion_gate=MOTION_GATE, roi_config=ROI_CONFIG,
+                               target_latency=TARGET_LATENCY, adaptive_resolution=ADAPTIVE_RESOLUTION,
+                               capture_process=CAPTURE_PROCESS and not PIPELINED,
+                               target_fps=TARGET_FPS, idle_fps=IDLE_FPS)
+    if discovery:
+        # IP berubah -> ganti capture source, model tetap
+        discovery.on_ip_change = lambda camera_id, ip, old_ip: detector.set_camera_ip(ip)
+        if discovery.get_ip() and discovery.get_ip() != detector.esp32_cam_ip:
+            detector.set_camera_ip(discovery.get_ip())
     
     # Test camera connection
     if not detector.test_camera_connection():
-        print("\n⚠️ Cannot connect to ESP32-CAM")
-        print(f"Please check:")
-        print(f"  1. ESP32-CAM is powered on")
-        print(f"  2. IP address is correct: {ESP32_CAM_IP}")
-        print(f"  3. ESP32-CAM is connected to same network")
-        return
+        if discovery:
+            print("\n⚠️ ESP32-CAM not reachable yet - waiting for it to (re)publish its IP via MQTT")
+        else:
+            print("\n⚠️ Cannot connect to ESP32-CAM")
+            print(f"Please check:")
+            print(f"  1. ESP32-CAM is powered on")
+            print(f"  2. IP address is correct: {ESP32_CAM_IP}")
+            print(f"  3. ESP32-CAM is connected to same network")
+            return
     
     # Start detection
-    detector.run_detection()
+    if PIPELINED:
+        detector.run_pipelined_detection()
+    else:
+        detector.run_detection()
+    
+    if discovery:
+        discovery.disconnect()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,261 @@
+import numpy as np
+import subprocess
+import argparse
+import platform
+import hashlib
+import json
+import time
+import sys
+import os
+from VehicleDetection_OnlyDetection import VehicleDetector
+
+class StageTimer:
+    def __init__(self):
+        """Kumpulan latency (ms) per stage"""
+        self.samples = {}
+
+    def add(self, stage, elapsed):
+        self.samples.setdefault(stage, []).append(elapsed * 1000.0)
+
+    def wrap(self, stage, func):
+        """Bungkus method detector supaya setiap panggilan tercatat di stage"""
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+        return timed
+
+    def summary(self):
+        """count, mean, p50/p95/p99 per stage"""
+        stats = {}
+        for stage, values in self.samples.items():
+            arr = np.asarray(values)
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            stats[stage] = {
+                'count': int(arr.size),
+                'mean_ms': round(float(arr.mean()), 3),
+                'p50_ms': round(float(p50), 3),
+                'p95_ms': round(float(p95), 3),
+                'p99_ms': round(float(p99), 3),
+            }
+        return stats
+
+def peak_rss_mb():
+    """Peak resident memory proses ini (MB), None kalau tidak bisa diukur"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux: KB, macOS: bytes
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+def git_revision():
+    """Commit yang di-benchmark (+ tanda kalau working tree dirty)"""
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                         stderr=subprocess.DEVNULL).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"], text=True,
+                                        stderr=subprocess.DEVNULL).strip()
+        return commit + ("-dirty" if dirty else "")
+    except Exception:
+        return "unknown"
+
+def package_version(name):
+    try:
+        module = __import__(name)
+        return getattr(module, "__version__", "unknown")
+    except ImportError:
+        return None
+
+class InferenceBenchmark:
+    def __init__(self, model_path, image_dirs, backend="auto", imgsz=640, warmup=10, limit=None):
+        """
+        Offline benchmark: replay images dataset lewat VehicleDetector.detect_vehicles
+        Tanpa kamera & network, JPEG dibaca ke memory dulu supaya disk I/O tidak ikut terukur
+        """
+        self.model_path = model_path
+        self.image_dirs = image_dirs
+        self.imgsz = imgsz
+        self.warmup = warmup
+
+        self.files = []
+        for image_dir in image_dirs:
+            self.files += sorted(os.path.join(image_dir, f) for f in os.listdir(image_dir)
+                                 if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        if limit:
+            self.files = self.files[:limit]
+        self.jpegs = []
+        for path in self.files:
+            with open(path, "rb") as f:
+                self.jpegs.append(f.read())
+
+        # Detector offline: tidak pernah start_capture, hanya dipakai untuk inference path
+        self.detector = VehicleDetector("offline", model_path, capture_source="http", headless=True,
+                                        backend=backend, imgsz=imgsz)
+
+    def dataset_fingerprint(self):
+        """Hash daftar file supaya run antar commit bisa dipastikan memakai dataset yang sama"""
+        digest = hashlib.sha1()
+        for path, jpeg in zip(self.files, self.jpegs):
+            digest.update(os.path.basename(path).encode())
+            digest.update(len(jpeg).to_bytes(8, "little"))
+        return digest.hexdigest()[:12]
+
+    def run_stages(self):
+        """p50/p95/p99 latency per stage: decode, inference, post-processing, annotation"""
+        detector = self.detector
+        timer = StageTimer()
+        run_inference, parse_results, annotate_frame = (detector.run_inference, detector.parse_results,
+                                                        detector.annotate_frame)
+
+        # Warmup (lazy init backend / first-call allocations) tidak ikut dihitung
+        for jpeg in self.jpegs[:self.warmup]:
+            detector.detect_vehicles(detector.decode_frame(jpeg), annotate=True)
+
+        detector.run_inference = timer.wrap("inference", run_inference)
+        detector.parse_results = timer.wrap("postprocess", parse_results)
+        detector.annotate_frame = timer.wrap("annotation", annotate_frame)
+        try:
+            for jpeg in self.jpegs:
+                start = time.perf_counter()
+                frame = detector.decode_frame(jpeg)
+                timer.add("decode", time.perf_counter() - start)
+
+                detector.detect_vehicles(frame, annotate=True)
+                timer.add("end_to_end", time.perf_counter() - start)
+        finally:
+            del detector.run_inference, detector.parse_results, detector.annotate_frame
+
+        return timer.summary()
+
+    def run_throughput(self, batch_sizes, resolutions):
+        """Images/second untuk setiap kombinasi batch size x input resolution"""
+        detector = self.detector
+        frames = [detector.decode_frame(jpeg) for jpeg in self.jpegs]
+        rows = []
+
+        for imgsz in resolutions:
+            for batch_size in batch_sizes:
+                batches = [frames[i:i + batch_size] for i in range(0, len(frames), batch_size)]
+                detector.model(batches[0], conf=detector.conf_threshold, imgsz=imgsz, verbose=False)
+
+                start = time.perf_counter()
+                for batch in batches:
+                    results = detector.model(batch, conf=detector.conf_threshold, imgsz=imgsz, verbose=False)
+                    detector.parse_results(results)
+                elapsed = time.perf_counter() - start
+
+                rows.append({
+                    'imgsz': imgsz,
+                    'batch': batch_size,
+                    'images': len(frames),
+                    'fps': round(len(frames) / elapsed, 2),
+                    'ms_per_image': round(elapsed * 1000.0 / len(frames), 3),
+                })
+                print(f"  imgsz={imgsz:<4} batch={batch_size:<3} -> {rows[-1]['fps']:.1f} img/s")
+
+        return rows
+
+    def run(self, batch_sizes, resolutions):
+        print(f"\n📊 Benchmarking {len(self.jpegs)} images from {', '.join(self.image_dirs)}")
+        print("⏱️ Stage latency...")
+        stages = self.run_stages()
+        print("🚀 Throughput sweep...")
+        throughput = self.run_throughput(batch_sizes, resolutions)
+
+        return {
+            'meta': {
+                'git_revision': git_revision(),
+                'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+                'cpu_count': os.cpu_count(),
+                'versions': {name: package_version(name) for name in ("ultralytics", "torch", "cv2", "numpy")},
+            },
+            'config': {
+                'model_path': self.model_path,
+                'backend': self.detector.backend,
+                'imgsz': self.imgsz,
+                'decode_scale': self.detector.decoder.scale,
+                'conf_threshold': self.detector.conf_threshold,
+                'warmup': self.warmup,
+                'image_dirs': self.image_dirs,
+                'images': len(self.jpegs),
+                'dataset_fingerprint': self.dataset_fingerprint(),
+            },
+            'stages': stages,
+            'throughput': throughput,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+def print_report(report, baseline=None):
+    """Tabel stage latency, dengan delta p50 terhadap baseline JSON (run/commit sebelumnya)"""
+    print("\n" + "="*72)
+    print(f"BENCHMARK {report['meta']['git_revision']} | backend={report['config']['backend']} "
+          f"imgsz={report['config']['imgsz']} images={report['config']['images']}")
+    if baseline:
+        print(f"Baseline: {baseline['meta']['git_revision']}")
+        if baseline['config'].get('dataset_fingerprint') != report['config']['dataset_fingerprint']:
+            print("⚠️ Dataset differs from baseline, numbers are not comparable")
+    print("="*72)
+    print(f"{'Stage':<14}{'p50 (ms)':>10}{'p95 (ms)':>10}{'p99 (ms)':>10}{'mean (ms)':>11}{'Δp50':>10}")
+    for stage in ("decode", "inference", "postprocess", "annotation", "end_to_end"):
+        if stage not in report['stages']:
+            continue
+        s = report['stages'][stage]
+        delta = ""
+        if baseline and stage in baseline['stages'] and baseline['stages'][stage]['p50_ms']:
+            old = baseline['stages'][stage]['p50_ms']
+            delta = f"{(s['p50_ms'] - old) / old * 100:+.1f}%"
+        print(f"{stage:<14}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['mean_ms']:>11.2f}{delta:>10}")
+    print("-"*72)
+    for row in report['throughput']:
+        print(f"imgsz={row['imgsz']:<4} batch={row['batch']:<3} {row['fps']:>8.1f} img/s "
+              f"({row['ms_per_image']:.2f} ms/img)")
+    print(f"Peak RSS: {report['peak_rss_mb']} MB")
+    print("="*72)
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline inference benchmark over the bundled dataset")
+    parser.add_argument("--model", default="./runs/detect/train/weights/best.pt")
+    parser.add_argument("--backend", default="auto")
+    parser.add_argument("--images", nargs="+", default=["data/test/images", "data/valid/images"])
+    parser.add_argument("--imgsz", type=int, default=640, help="Input resolution for stage latency")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--resolutions", type=int, nargs="+", default=[320, 480, 640])
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N images")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="Previous JSON report to compare against")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"❌ Model file not found: {args.model}")
+        return
+
+    benchmark = InferenceBenchmark(args.model, args.images, backend=args.backend, imgsz=args.imgsz,
+                                   warmup=args.warmup, limit=args.limit)
+    report = benchmark.run(args.batch_sizes, args.resolutions)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    print(f"💾 Results saved: {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,467 @@
+import cv2
+import numpy as np
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import socketserver
+import threading
+import argparse
+import hashlib
+import base64
+import random
+import struct
+import glob
+import json
+import time
+import os
+
+# Sama persis dengan firmware ESP32_CAM_Final_v6.0.0
+STREAM_BOUNDARY = "123456789000000000000987654321"
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+class FrameSource:
+    def __init__(self, source, resolution=(320, 240), jpeg_quality=80, max_frames=300):
+        """
+        Frame JPEG untuk kamera simulasi, dari images dataset (glob) atau file video
+        Semua frame di-resize & di-encode sekali di awal, dipakai bersama oleh semua kamera
+        """
+        self.source = source
+        self.resolution = resolution
+        self.jpeg_quality = jpeg_quality
+        self.jpegs = []
+
+        if os.path.isfile(source) and source.lower().endswith(VIDEO_EXTENSIONS):
+            cap = cv2.VideoCapture(source)
+            while len(self.jpegs) < max_frames:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                self.jpegs.append(self.encode(frame))
+            cap.release()
+        else:
+            files = []
+            for path in sorted(glob.glob(source)):
+                if os.path.isdir(path):
+                    files += sorted(os.path.join(path, f) for f in os.listdir(path))
+                else:
+                    files.append(path)
+            for path in files:
+                if len(self.jpegs) >= max_frames:
+                    break
+                if not path.lower().endswith((".jpg", ".jpeg", ".png")):
+                    continue
+                frame = cv2.imread(path)
+                if frame is not None:
+                    self.jpegs.append(self.encode(frame))
+
+        if not self.jpegs:
+            raise ValueError(f"No frames found in source: {source}")
+
+    def encode(self, frame):
+        """Resize ke resolusi kamera lalu encode JPEG"""
+        frame = cv2.resize(frame, self.resolution)
+        ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        return buffer.tobytes()
+
+    def __len__(self):
+        return len(self.jpegs)
+
+    def get(self, index):
+        return self.jpegs[index % len(self.jpegs)]
+
+class SimulatedCamera:
+    def __init__(self, ip, source, fps=10, latency=0.0, jitter=0.0, packet_loss=0.0,
+                 drop_interval=0, http_port=80, ws_port=81, start_index=0):
+        """
+        Satu ESP32-CAM palsu: /capture, /status, /stream (HTTP) dan WebSocket frame feed
+        latency/jitter: delay (detik) sebelum setiap response/frame
+        packet_loss: probabilitas frame hilang (stream di-skip, /capture koneksi diputus)
+        drop_interval: putus paksa koneksi stream setiap N detik (test reconnect), 0 = off
+        """
+        self.ip = ip
+        self.source = source
+        self.fps = fps
+        self.latency = latency
+        self.jitter = jitter
+        self.packet_loss = packet_loss
+        self.drop_interval = drop_interval
+        self.http_port = http_port
+        self.ws_port = ws_port
+
+        # "Sensor": frame terbaru, diganti setiap 1/fps detik
+        self.frame_index = start_index
+        self.latest_jpeg = source.get(start_index)
+        self.frame_seq = 0
+        self._condition = threading.Condition()
+
+        # WebSocket streaming (firmware hanya 1 streaming client)
+        self.streaming_client = None
+
+        # Statistics
+        self.start_time = time.time()
+        self.frames_sent = 0
+        self.frames_lost = 0
+        self.stream_clients = 0
+        self.forced_disconnects = 0
+        self._stats_lock = threading.Lock()
+
+        self.running = False
+        self.http_server = None
+        self.ws_server = None
+        self._threads = []
+
+    def start(self):
+        """Start sensor thread, HTTP server dan WebSocket server"""
+        self.running = True
+        self.http_server = ThreadingHTTPServer((self.ip, self.http_port), make_http_handler(self))
+        self.http_server.daemon_threads = True
+        self.ws_server = ThreadingTCPServer((self.ip, self.ws_port), make_ws_handler(self))
+
+        for target in (self.sensor_loop, self.http_server.serve_forever, self.ws_server.serve_forever):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"📷 Camera {self.ip}: http://{self.ip}:{self.http_port}  ws://{self.ip}:{self.ws_port}")
+
+    def stop(self):
+        """Stop semua server"""
+        self.running = False
+        with self._condition:
+            self._condition.notify_all()
+        for server in (self.http_server, self.ws_server):
+            if server:
+                server.shutdown()
+                server.server_close()
+
+    def sensor_loop(self):
+        """Ganti frame terbaru sesuai FPS kamera"""
+        interval = 1.0 / self.fps
+        next_tick = time.perf_counter()
+        while self.running:
+            next_tick += interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()
+
+            with self._condition:
+                self.frame_index += 1
+                self.latest_jpeg = self.source.get(self.frame_index)
+                self.frame_seq += 1
+                self._condition.notify_all()
+
+    def wait_frame(self, last_seq, timeout=2.0):
+        """Tunggu frame yang lebih baru dari last_seq, return (seq, jpeg)"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.frame_seq != last_seq or not self.running, timeout=timeout)
+            return self.frame_seq, self.latest_jpeg
+
+    def current_frame(self):
+        with self._condition:
+            return self.latest_jpeg
+
+    def delay(self):
+        """Injected network latency"""
+        total = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if total > 0:
+            time.sleep(total)
+
+    def lose_packet(self):
+        """True kalau frame ini 'hilang' (dihitung di statistik)"""
+        if self.packet_loss and random.random() < self.packet_loss:
+            with self._stats_lock:
+                self.frames_lost += 1
+            return True
+        return False
+
+    def count_sent(self):
+        with self._stats_lock:
+            self.frames_sent += 1
+
+    def status(self):
+        """JSON /status (gabungan field firmware v6 & v7.1.1)"""
+        return {
+            'status': 'online',
+            'ip': self.ip,
+            'camera': 'ESP32-CAM (simulated)',
+            'heap': 100000,
+            'uptime': int(time.time() - self.start_time),
+            'frames': self.frames_sent,
+            'streaming': self.streaming_client is not None,
+        }
+
+def make_http_handler(camera):
+    class CameraHTTPHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_cors_headers(self, content_type, length=None):
+            self.send_header("Content-Type", content_type)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            if length is not None:
+                self.send_header("Content-Length", str(length))
+            self.end_headers()
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path == "/capture":
+                self.handle_capture()
+            elif path == "/stream":
+                self.handle_stream()
+            elif path == "/status":
+                body = json.dumps(camera.status()).encode()
+                self.send_response(200)
+                self.send_cors_headers("application/json", len(body))
+                self.wfile.write(body)
+            elif path == "/":
+                body = (f"<html><body><h1>ESP32-CAM Simulator {camera.ip}</h1>"
+                        f"<p>/capture /stream /status ws://{camera.ip}:{camera.ws_port}</p></body></html>").encode()
+                self.send_response(200)
+                self.send_cors_headers("text/html", len(body))
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+
+        def handle_capture(self):
+            camera.delay()
+            if camera.lose_packet():
+                # Simulasi request hilang: koneksi diputus tanpa response
+                self.close_connection = True
+                return
+            jpeg = camera.current_frame()
+            self.send_response(200)
+            self.send_header("Content-Disposition", "inline; filename=capture.jpg")
+            self.send_cors_headers("image/jpeg", len(jpeg))
+            self.wfile.write(jpeg)
+            camera.count_sent()
+
+        def handle_stream(self):
+            """Multipart MJPEG, format part identik dengan firmware v6"""
+            self.close_connection = True
+            self.send_response(200)
+            self.send_cors_headers(f"multipart/x-mixed-replace; boundary=--{STREAM_BOUNDARY}")
+            with camera._stats_lock:
+                camera.stream_clients += 1
+            opened = time.time()
+            seq = 0
+            try:
+                self.wfile.write(f"--{STREAM_BOUNDARY}\r\n".encode())
+                while camera.running:
+                    if camera.drop_interval and time.time() - opened >= camera.drop_interval:
+                        with camera._stats_lock:
+                            camera.forced_disconnects += 1
+                        break
+                    seq, jpeg = camera.wait_frame(seq)
+                    camera.delay()
+                    if camera.lose_packet():
+                        continue
+                    self.wfile.write(f"Content-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode())
+                    self.wfile.write(jpeg)
+                    self.wfile.write(f"\r\n--{STREAM_BOUNDARY}\r\n".encode())
+                    self.wfile.flush()
+                    camera.count_sent()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                with camera._stats_lock:
+                    camera.stream_clients -= 1
+
+    return CameraHTTPHandler
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class WebSocketConnection:
+    def __init__(self, sock):
+        """Minimal RFC 6455 server-side connection (cukup untuk protokol ESP32-CAM v7.1.1)"""
+        self.sock = sock
+        self._send_lock = threading.Lock()
+
+    def handshake(self):
+        request = b""
+        while b"\r\n\r\n" not in request:
+            chunk = self.sock.recv(1024)
+            if not chunk:
+                return False
+            request += chunk
+        headers = {}
+        for line in request.decode(errors="ignore").split("\r\n")[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        key = headers.get("sec-websocket-key")
+        if not key:
+            return False
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.sock.sendall((
+            "HTTP/1.1 101 Switching Protocols\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode())
+        return True
+
+    def recv_exact(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("WebSocket closed")
+            data += chunk
+        return data
+
+    def recv(self):
+        """Return (opcode, payload)"""
+        b1, b2 = self.recv_exact(2)
+        opcode = b1 & 0x0F
+        length = b2 & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self.recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.recv_exact(8))[0]
+        mask = self.recv_exact(4) if b2 & 0x80 else None
+        payload = self.recv_exact(length)
+        if mask:
+            payload = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(mask, np.uint8), length)).tobytes()
+        return opcode, payload
+
+    def send(self, opcode, payload):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self._send_lock:
+            self.sock.sendall(header + payload)
+
+    def send_text(self, text):
+        self.send(0x1, text.encode())
+
+    def send_binary(self, data):
+        self.send(0x2, data)
+
+def make_ws_handler(camera):
+    class CameraWebSocketHandler(socketserver.BaseRequestHandler):
+        def handle(self):
+            conn = WebSocketConnection(self.request)
+            if not conn.handshake():
+                return
+            conn.send_text(json.dumps({'status': 'connected', 'version': '3.0'}))
+            streamer = None
+
+            try:
+                while camera.running:
+                    opcode, payload = conn.recv()
+                    if opcode == 0x8:
+                        conn.send(0x8, payload[:2])
+                        break
+                    if opcode == 0x9:
+                        conn.send(0xA, payload)
+                        continue
+                    if opcode != 0x1:
+                        continue
+
+                    message = payload.decode(errors="ignore").strip()
+                    if message == "GET_FRAME":
+                        camera.delay()
+                        if not camera.lose_packet():
+                            conn.send_binary(camera.current_frame())
+                            camera.count_sent()
+                    elif message == "START_STREAM":
+                        camera.streaming_client = conn
+                        if streamer is None or not streamer.is_alive():
+                            streamer = threading.Thread(target=self.stream_loop, args=(conn,), daemon=True)
+                            streamer.start()
+                    elif message == "STOP_STREAM":
+                        if camera.streaming_client is conn:
+                            camera.streaming_client = None
+                    elif message == "GET_STATUS":
+                        conn.send_text(json.dumps(camera.status()))
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                if camera.streaming_client is conn:
+                    camera.streaming_client = None
+
+        def stream_loop(self, conn):
+            """Kirim setiap frame baru selama client ini streaming client"""
+            opened = time.time()
+            seq = 0
+            try:
+                while camera.running and camera.streaming_client is conn:
+                    if camera.drop_interval and time.time() - opened >= camera.drop_interval:
+                        with camera._stats_lock:
+                            camera.forced_disconnects += 1
+                        self.request.shutdown(2)
+                        break
+                    seq, jpeg = camera.wait_frame(seq)
+                    camera.delay()
+                    if camera.lose_packet():
+                        continue
+                    conn.send_binary(jpeg)
+                    camera.count_sent()
+            except OSError:
+                pass
+
+    return CameraWebSocketHandler
+
+def camera_ips(base_ip, count):
+    """base_ip 127.0.0.10, count 3 -> 127.0.0.10, 127.0.0.11, 127.0.0.12"""
+    prefix, last = base_ip.rsplit(".", 1)
+    return [f"{prefix}.{int(last) + i}" for i in range(count)]
+
+def main():
+    parser = argparse.ArgumentParser(description="Local ESP32-CAM simulator (/capture, /stream, /status, ws:81)")
+    parser.add_argument("--source", default="data/*/images", help="Image glob/folder or video file")
+    parser.add_argument("--cameras", type=int, default=1, help="Number of simulated cameras")
+    parser.add_argument("--base-ip", default="127.0.0.10", help="First camera IP (one loopback IP per camera)")
+    parser.add_argument("--http-port", type=int, default=80)
+    parser.add_argument("--ws-port", type=int, default=81)
+    parser.add_argument("--fps", type=float, default=10)
+    parser.add_argument("--quality", type=int, default=80, help="JPEG quality")
+    parser.add_argument("--resolution", default="320x240", help="WxH (default QVGA like the firmware)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency per frame/response (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency 0..jitter (s)")
+    parser.add_argument("--loss", type=float, default=0.0, help="Frame/request loss probability 0..1")
+    parser.add_argument("--drop-interval", type=float, default=0,
+                        help="Force-close stream connections every N seconds (0 = never)")
+    parser.add_argument("--max-frames", type=int, default=300)
+    parser.add_argument("--stats-interval", type=float, default=10)
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.resolution.lower().split("x"))
+    source = FrameSource(args.source, resolution=(width, height), jpeg_quality=args.quality,
+                         max_frames=args.max_frames)
+    print(f"🎞️ Loaded {len(source)} frames from {args.source} ({width}x{height}, q={args.quality})")
+
+    cameras = []
+    for i, ip in enumerate(camera_ips(args.base_ip, args.cameras)):
+        camera = SimulatedCamera(ip, source, fps=args.fps, latency=args.latency, jitter=args.jitter,
+                                 packet_loss=args.loss, drop_interval=args.drop_interval,
+                                 http_port=args.http_port, ws_port=args.ws_port,
+                                 start_index=i * len(source) // max(args.cameras, 1))
+        camera.start()
+        cameras.append(camera)
+
+    print(f"✅ {len(cameras)} camera(s) running. Use these IPs as ESP32_CAM_IP / EXTRA_CAM_IPS")
+    print("Press Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            for camera in cameras:
+                print(f"[{camera.ip}] sent={camera.frames_sent} lost={camera.frames_lost} "
+                      f"stream_clients={camera.stream_clients} ws_streaming={camera.streaming_client is not None} "
+                      f"forced_disconnects={camera.forced_disconnects}")
+    except KeyboardInterrupt:
+        print("\nStopping simulator...")
+    finally:
+        for camera in cameras:
+            camera.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import cv2
+import numpy as np
+from ultralytics import YOLO
+import importlib.util
+import argparse
+import shutil
+import json
+import time
+import yaml
+import os
+
+# Backend -> runtime module yang harus ter-install
+BACKEND_RUNTIMES = {
+    "pytorch": None,
+    "onnx": "onnxruntime",
+    "onnx-int8": "onnxruntime",
+    "openvino": "openvino",
+    "openvino-int8": "openvino",
+}
+
+class ModelBackends:
+    def __init__(self, weights_path, data_yaml="data/data.yaml", imgsz=640, max_map_drop=0.02):
+        """
+        Export & loader untuk YOLO model (PyTorch / ONNX Runtime / OpenVINO, opsional INT8)
+        Artifact hasil export di-cache di samping weights (best.onnx, best_openvino_model/, ...)
+        max_map_drop: penurunan mAP50-95 maksimum vs PyTorch agar backend boleh dipilih otomatis
+        """
+        self.weights_path = weights_path
+        self.weights_dir = os.path.dirname(os.path.abspath(weights_path))
+        self.stem = os.path.splitext(os.path.basename(weights_path))[0]
+        self.data_yaml = data_yaml
+        self.imgsz = imgsz
+        self.max_map_drop = max_map_drop
+        self.report_path = os.path.join(self.weights_dir, "backend_report.json")
+        self.backend = None
+
+    def available_backends(self):
+        """Backends yang runtime-nya ter-install di mesin ini"""
+        return [name for name, runtime in BACKEND_RUNTIMES.items()
+                if runtime is None or importlib.util.find_spec(runtime) is not None]
+
+    def artifact_path(self, backend):
+        """Lokasi cache artifact untuk backend"""
+        names = {
+            "pytorch": os.path.basename(self.weights_path),
+            "onnx": f"{self.stem}.onnx",
+            "onnx-int8": f"{self.stem}_int8.onnx",
+            "openvino": f"{self.stem}_openvino_model",
+            "openvino-int8": f"{self.stem}_int8_openvino_model",
+        }
+        return os.path.join(self.weights_dir, names[backend])
+
+    def is_cached(self, backend):
+        """Artifact ada dan tidak lebih tua dari weights"""
+        path = self.artifact_path(backend)
+        if not os.path.exists(path):
+            return False
+        return os.path.getmtime(path) >= os.path.getmtime(self.weights_path)
+
+    def export(self, backend, force=False):
+        """Export weights ke backend (pakai cache kalau masih valid), return path artifact"""
+        if backend not in BACKEND_RUNTIMES:
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == "pytorch":
+            return self.weights_path
+
+        path = self.artifact_path(backend)
+        if not force and self.is_cached(backend):
+            return path
+
+        print(f"📦 Exporting {backend} -> {path}")
+        if backend == "onnx-int8":
+            # Ultralytics tidak quantize ONNX, pakai ONNX Runtime static quantization
+            self.quantize_onnx(self.export("onnx"), path)
+            return path
+
+        int8 = backend.endswith("-int8")
+        model = YOLO(self.weights_path)
+        exported = model.export(format=backend.split("-")[0], imgsz=self.imgsz, dynamic=True,
+                                int8=int8, data=self.data_yaml if int8 else None)
+
+        # Pindahkan ke nama cache kalau Ultralytics pakai nama lain
+        if os.path.abspath(exported) != os.path.abspath(path):
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+            shutil.move(exported, path)
+        return path
+
+    def calibration_dir(self):
+        """Folder images split 'val' dari data.yaml (format path Roboflow '../valid/images')"""
+        with open(self.data_yaml) as f:
+            data = yaml.safe_load(f)
+        root = os.path.dirname(os.path.abspath(self.data_yaml))
+        val = data.get("val", "valid/images")
+        path = os.path.normpath(os.path.join(root, val))
+        if not os.path.isdir(path) and val.startswith("../"):
+            path = os.path.normpath(os.path.join(root, val[3:]))
+        return path
+
+    def calibration_batches(self, max_images=100):
+        """Images validation yang sudah di-letterbox ke input model (NCHW float32)"""
+        image_dir = self.calibration_dir()
+        files = sorted(f for f in os.listdir(image_dir) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+        for filename in files[:max_images]:
+            img = cv2.imread(os.path.join(image_dir, filename))
+            if img is None:
+                continue
+
+            # Letterbox ke imgsz x imgsz (padding abu-abu seperti Ultralytics)
+            h, w = img.shape[:2]
+            r = self.imgsz / max(h, w)
+            new_w, new_h = round(w * r), round(h * r)
+            canvas = np.full((self.imgsz, self.imgsz, 3), 114, dtype=np.uint8)
+            top, left = (self.imgsz - new_h) // 2, (self.imgsz - new_w) // 2
+            canvas[top:top + new_h, left:left + new_w] = cv2.resize(img, (new_w, new_h))
+
+            # BGR HWC uint8 -> RGB NCHW float32 [0, 1]
+            blob = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+            yield np.ascontiguousarray(blob)
+
+    def quantize_onnx(self, fp32_path, int8_path, max_images=100):
+        """INT8 static quantization ONNX, dikalibrasi dengan images dari data/valid"""
+        import onnxruntime
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+        session = onnxruntime.InferenceSession(fp32_path, providers=["CPUExecutionProvider"])
+        input_name = session.get_inputs()[0].name
+        batches = self.calibration_batches(max_images)
+
+        class ValidationReader(CalibrationDataReader):
+            def get_next(self):
+                blob = next(batches, None)
+                return None if blob is None else {input_name: blob}
+
+        print(f"🔧 Calibrating INT8 with images from {self.calibration_dir()}")
+        quantize_static(fp32_path, int8_path, ValidationReader(),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8)
+
+    def load_report(self):
+        """Comparison report terakhir, None kalau belum ada / sudah basi"""
+        if not os.path.exists(self.report_path):
+            return None
+        if os.path.getmtime(self.report_path) < os.path.getmtime(self.weights_path):
+            return None
+        with open(self.report_path) as f:
+            report = json.load(f)
+        if report.get("imgsz") != self.imgsz:
+            return None
+        return report
+
+    def select_backend(self):
+        """
+        Backend tercepat yang tersedia menurut backend_report.json
+        Tanpa report yang valid: PyTorch (tidak export apa pun saat startup)
+        """
+        available = self.available_backends()
+        report = self.load_report()
+        if report:
+            results = report["backends"]
+            baseline = results.get("pytorch", {}).get("map50_95")
+            candidates = [
+                (result["latency_ms"], name) for name, result in results.items()
+                if name in available and "latency_ms" in result
+                and (baseline is None or baseline - result["map50_95"] <= self.max_map_drop)
+            ]
+            if candidates:
+                return min(candidates)[1]
+
+        print(f"ℹ️ No valid backend report at {self.report_path}, using PyTorch "
+              f"(run 'python model_backends.py --report' to compare backends)")
+        return "pytorch"
+
+    def load(self, backend="auto"):
+        """Load YOLO model untuk backend ('auto' = tercepat menurut report), fallback ke PyTorch kalau export gagal"""
+        if backend == "auto":
+            backend = self.select_backend()
+
+        try:
+            path = self.export(backend)
+        except Exception as e:
+            print(f"⚠️ {backend} export failed ({e}), falling back to PyTorch")
+            backend, path = "pytorch", self.weights_path
+
+        print(f"🚀 Inference backend: {backend} ({path})")
+        self.backend = backend
+        return YOLO(path, task="detect")
+
+    def compare(self, backends=None):
+        """Latency & mAP setiap backend pada validation set yang sama, disimpan ke backend_report.json"""
+        backends = backends or self.available_backends()
+        report = {
+            "weights": self.weights_path,
+            "data": self.data_yaml,
+            "imgsz": self.imgsz,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "backends": {},
+        }
+
+        for backend in backends:
+            print(f"\n⏱️ Evaluating {backend}...")
+            try:
+                model = YOLO(self.export(backend), task="detect")
+                metrics = model.val(data=self.data_yaml, split="val", imgsz=self.imgsz, batch=1,
+                                    device="cpu", plots=False, verbose=False)
+                report["backends"][backend] = {
+                    "map50": float(metrics.box.map50),
+                    "map50_95": float(metrics.box.map),
+                    "latency_ms": float(metrics.speed["inference"]),
+                    "preprocess_ms": float(metrics.speed["preprocess"]),
+                    "postprocess_ms": float(metrics.speed["postprocess"]),
+                }
+            except Exception as e:
+                print(f"❌ {backend} failed: {e}")
+                report["backends"][backend] = {"error": str(e)}
+
+        with open(self.report_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+        self.print_report(report)
+        print(f"💾 Report saved: {self.report_path}")
+        return report
+
+    def print_report(self, report):
+        """Print tabel perbandingan backend"""
+        print("\n" + "="*64)
+        print(f"BACKEND COMPARISON (imgsz={report['imgsz']}, data={report['data']})")
+        print("="*64)
+        print(f"{'Backend':<16}{'Latency (ms)':>14}{'mAP50':>10}{'mAP50-95':>12}")
+        for name, result in report["backends"].items():
+            if "error" in result:
+                print(f"{name:<16}{'failed':>14}")
+                continue
+            print(f"{name:<16}{result['latency_ms']:>14.1f}{result['map50']:>10.3f}{result['map50_95']:>12.3f}")
+        print("="*64)
+        print(f"Auto-selected backend: {self.select_backend()}")
+
+def load_model(weights_path, backend="auto", imgsz=640):
+    """Shortcut: load YOLO model dengan backend tercepat yang tersedia"""
+    return ModelBackends(weights_path, imgsz=imgsz).load(backend)
+
+def main():
+    parser = argparse.ArgumentParser(description="Export YOLO weights to ONNX/OpenVINO and compare backends")
+    parser.add_argument("--weights", default="./runs/detect/train/weights/best.pt")
+    parser.add_argument("--data", default="data/data.yaml")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--export", nargs="+", choices=list(BACKEND_RUNTIMES), default=[],
+                        help="Backends to export (cached next to the weights)")
+    parser.add_argument("--force", action="store_true", help="Re-export even if a cached artifact exists")
+    parser.add_argument("--report", action="store_true", help="Compare latency and mAP of every available backend")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        print(f"❌ Model file not found: {args.weights}")
+        return
+
+    backends = ModelBackends(args.weights, data_yaml=args.data, imgsz=args.imgsz)
+    print(f"Available backends: {', '.join(backends.available_backends())}")
+
+    for backend in args.export:
+        try:
+            print(f"✅ {backend}: {backends.export(backend, force=args.force)}")
+        except Exception as e:
+            print(f"❌ {backend} export failed: {e}")
+
+    if args.report:
+        backends.compare()
+    elif not args.export:
+        print(f"Auto-selected backend: {backends.select_backend()}")
+
+if __name__ == "__main__":
+    main()
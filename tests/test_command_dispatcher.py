@@ -0,0 +1,113 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+# Server v3 (unused/) butuh Flask stack
+pytest.importorskip("flask")
+pytest.importorskip("flask_socketio")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "unused"))
+from VehicleDetection_v3 import CommandDispatcher
+
+
+class FakeIO:
+    """send_command tercatat, hasilnya diselesaikan manual oleh test"""
+    def __init__(self, result=True):
+        self.result = result
+        self.sent = []
+        self.release = threading.Event()
+        self.release.set()
+        self.in_flight = threading.Event()
+
+    def send_command(self, command, value):
+        self.sent.append((command, value))
+        future = Future()
+        self.in_flight.set()
+
+        def finish():
+            self.release.wait(timeout=5)
+            future.set_result(self.result)
+        threading.Thread(target=finish, daemon=True).start()
+        return future
+
+
+def wait_idle(dispatcher, sent, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if not dispatcher._pending and dispatcher.succeeded + dispatcher.failed >= sent:
+            return
+        time.sleep(0.01)
+    raise AssertionError(f"dispatcher did not settle: {dispatcher.stats()}")
+
+
+@pytest.fixture
+def io():
+    return FakeIO()
+
+
+@pytest.fixture
+def dispatcher(io):
+    dispatcher = CommandDispatcher(io)
+    yield dispatcher
+    io.release.set()
+    dispatcher.stop()
+
+
+def test_unchanged_state_is_not_resent(io, dispatcher):
+    assert dispatcher.submit("barrier", "down")
+    wait_idle(dispatcher, 1)
+    for _ in range(5):
+        assert not dispatcher.submit("barrier", "down")
+    assert io.sent == [("barrier", "down")]
+    assert dispatcher.skipped_unchanged == 5
+    assert dispatcher.delivered_state == {"barrier": "down"}
+
+
+def test_pending_commands_are_coalesced(io, dispatcher):
+    io.release.clear()
+    dispatcher.submit("barrier", "down")
+    assert io.in_flight.wait(timeout=5)
+    # Selama "down" masih in flight, request berikutnya menimpa satu slot
+    dispatcher.submit("barrier", "up")
+    dispatcher.submit("barrier", "down")
+    dispatcher.submit("barrier", "up")
+    assert dispatcher.coalesced == 2
+    io.release.set()
+    wait_idle(dispatcher, 2)
+    assert io.sent == [("barrier", "down"), ("barrier", "up")]
+    assert dispatcher.delivered_state == {"barrier": "up"}
+
+
+def test_request_back_to_delivered_state_is_dropped(io, dispatcher):
+    dispatcher.submit("barrier", "down")
+    wait_idle(dispatcher, 1)
+    io.release.clear()
+    dispatcher.submit("brake", "on")
+    assert io.in_flight.wait(timeout=5)
+    # Palang bolak-balik sebelum worker sempat mengirim: tidak ada yang perlu dikirim
+    dispatcher.submit("barrier", "up")
+    dispatcher.submit("barrier", "down")
+    io.release.set()
+    wait_idle(dispatcher, 2)
+    assert io.sent == [("barrier", "down"), ("brake", "on")]
+
+
+def test_failed_command_can_be_retried():
+    io = FakeIO(result=False)
+    results = []
+    dispatcher = CommandDispatcher(io, on_result=lambda *args: results.append(args))
+    try:
+        dispatcher.submit("barrier", "down")
+        wait_idle(dispatcher, 1)
+        assert dispatcher.failed == 1
+        assert results[0][:3] == ("barrier", "down", False)
+        # requested_state di-rollback: request yang sama dikirim lagi
+        io.result = True
+        assert dispatcher.submit("barrier", "down")
+        wait_idle(dispatcher, 2)
+        assert dispatcher.delivered_state == {"barrier": "down"}
+    finally:
+        dispatcher.stop()
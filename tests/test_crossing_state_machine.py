@@ -0,0 +1,119 @@
+from VehicleDetection_OnlyDetection import CrossingStateMachine
+
+
+def machine(**kwargs):
+    options = dict(lower_hits=3, raise_misses=2, lower_confidence=0.7, hold_confidence=0.4,
+                   min_down_time=2.0, min_up_time=1.0, max_gap=10.0)
+    options.update(kwargs)
+    return CrossingStateMachine(**options)
+
+
+def feed(crossing, frames, start, step=0.1):
+    """frames: list of (present, confidence); returns events yang terjadi"""
+    events = []
+    for i, (present, confidence) in enumerate(frames):
+        event = crossing.update(present, confidence, start + i * step)
+        if event:
+            events.append(event)
+    return events
+
+
+def test_lowers_after_consecutive_hits():
+    crossing = machine()
+    assert feed(crossing, [(True, 0.9)] * 2, 100.0) == []
+    assert crossing.state == "UP"
+    events = feed(crossing, [(True, 0.9)], 100.2)
+    assert crossing.state == "DOWN"
+    assert events[0]['event'] == "BARRIER_LOWERED"
+    assert events[0]['from'] == "UP" and events[0]['to'] == "DOWN"
+
+
+def test_single_miss_resets_lower_hits():
+    crossing = machine()
+    feed(crossing, [(True, 0.9), (True, 0.9), (False, 0.0), (True, 0.9), (True, 0.9)], 100.0)
+    assert crossing.state == "UP"
+
+
+def test_low_average_confidence_does_not_lower():
+    crossing = machine()
+    feed(crossing, [(True, 0.5)] * 10, 100.0)
+    assert crossing.state == "UP"
+
+
+def test_hold_confidence_keeps_barrier_down():
+    crossing = machine()
+    feed(crossing, [(True, 0.9)] * 3, 100.0)
+    # Di bawah lower_confidence tapi >= hold_confidence: masih dihitung bus
+    feed(crossing, [(True, 0.45)] * 30, 100.3)
+    assert crossing.state == "DOWN"
+    # Di bawah hold_confidence: dihitung miss
+    events = feed(crossing, [(True, 0.3)] * 2, 103.3)
+    assert crossing.state == "UP"
+    assert events[0]['event'] == "BARRIER_RAISED"
+
+
+def test_min_down_time_delays_raise():
+    crossing = machine(min_down_time=2.0)
+    feed(crossing, [(True, 0.9)] * 3, 100.0)
+    assert feed(crossing, [(False, 0.0)] * 5, 100.3) == []
+    assert crossing.state == "DOWN"
+    feed(crossing, [(False, 0.0)], 102.2)
+    assert crossing.state == "UP"
+
+
+
+def test_zero_min_down_time_raises_after_raise_misses():
+    # Perilaku history list lama: naik setelah 2 frame tanpa bus, tanpa jeda waktu
+    crossing = machine(min_down_time=0.0)
+    feed(crossing, [(True, 0.9)] * 3, 100.0)
+    assert feed(crossing, [(False, 0.0)], 100.3) == []
+    assert feed(crossing, [(False, 0.0)], 100.4)[0]['event'] == "BARRIER_RAISED"
+
+
+def test_min_up_time_delays_lower_again():
+    crossing = machine(min_down_time=0.0, min_up_time=1.0)
+    feed(crossing, [(True, 0.9)] * 3, 100.0)
+    feed(crossing, [(False, 0.0)] * 2, 100.3)
+    assert crossing.state == "UP"
+    raised_at = crossing.state_since
+    feed(crossing, [(True, 0.9)] * 3, raised_at + 0.1)
+    assert crossing.state == "UP"
+    feed(crossing, [(True, 0.9)], raised_at + 1.0)
+    assert crossing.state == "DOWN"
+
+
+def test_history_resets_after_max_gap():
+    crossing = machine(max_gap=5.0)
+    feed(crossing, [(True, 0.9)] * 2, 100.0)
+    # Update berikutnya datang setelah gap panjang: dua hit lama tidak dihitung
+    assert crossing.update(True, 0.9, 120.0) is None
+    assert crossing.hits == 1
+    assert crossing.state == "UP"
+
+
+def test_veto_keeps_state_and_retries_next_frame():
+    allowed = []
+    crossing = machine(on_transition=lambda event: bool(allowed))
+    feed(crossing, [(True, 0.9)] * 5, 100.0)
+    assert crossing.state == "UP"
+    assert len(crossing.events) == 0
+    allowed.append(True)
+    event = crossing.update(True, 0.9, 100.5)
+    assert event['event'] == "BARRIER_LOWERED"
+    assert crossing.state == "DOWN"
+
+
+def test_callback_sees_every_transition():
+    seen = []
+    crossing = machine(min_down_time=0.0, on_transition=seen.append)
+    feed(crossing, [(True, 0.9)] * 3 + [(False, 0.0)] * 2, 100.0)
+    assert [event['event'] for event in seen] == ["BARRIER_LOWERED", "BARRIER_RAISED"]
+
+
+def test_sync_is_forced_and_ignores_veto():
+    crossing = machine(on_transition=lambda event: False)
+    event = crossing.sync("DOWN", 100.0, reason="manual")
+    assert crossing.state == "DOWN"
+    assert event['reason'] == "manual"
+    assert crossing.sync("DOWN", 100.1) is None
+    assert len(crossing.events) == 1
@@ -0,0 +1,90 @@
+import numpy as np
+
+from VehicleDetection_OnlyDetection import DetectionResult, RegionOfInterest, VehicleDetector
+
+NAMES = {0: 'person', 1: 'car', 2: 'bus'}
+
+
+class FakeBoxes:
+    def __init__(self, rows):
+        self.data = self
+        self._rows = np.array(rows, dtype=np.float32).reshape(-1, 6)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self._rows
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.boxes = FakeBoxes(rows)
+
+
+class StubModel:
+    names = NAMES
+
+
+def parser(roi=None):
+    """VehicleDetector tanpa model/kamera: hanya state yang dipakai parse_results"""
+    detector = VehicleDetector.__new__(VehicleDetector)
+    detector.model = StubModel()
+    detector.roi = roi
+    detector.target_classes = {'car': 1, 'bus': 2}
+    detector.target_class_ids = np.array([1, 2], dtype=np.int32)
+    return detector
+
+
+def test_iteration_yields_python_dicts():
+    result = DetectionResult(np.array([[1, 2, 3, 4]], dtype=np.int32), np.array([0.5], dtype=np.float32),
+                             np.array([2], dtype=np.int32), NAMES, track_ids=np.array([7]))
+    assert list(result) == [{'class': 'bus', 'confidence': 0.5, 'box': (1, 2, 3, 4), 'track_id': 7}]
+    assert result.count(2) == 1
+    assert result.count(1) == 0
+
+
+def test_empty_result():
+    result = DetectionResult.empty(NAMES)
+    assert len(result) == 0
+    assert list(result) == []
+    assert result.boxes.shape == (0, 4)
+
+
+def test_parse_keeps_only_bus_and_car():
+    results = [FakeResult([[10, 10, 50, 50, 0.9, 0],
+                           [60, 10, 90, 50, 0.8, 1],
+                           [10, 60, 50, 90, 0.7, 2]])]
+    detections, max_confidence, detected = parser().parse_results(results)
+    assert detections == {"bus": True, "car": True}
+    assert np.isclose(max_confidence, 0.8)
+    assert detected.class_ids.tolist() == [1, 2]
+    assert detected.boxes.dtype == np.int32
+    assert detected.boxes.tolist() == [[60, 10, 90, 50], [10, 60, 50, 90]]
+
+
+def test_parse_concatenates_results_and_skips_empty():
+    results = [FakeResult([[0, 0, 5, 5, 0.6, 1]]), FakeResult([]), FakeResult([[0, 0, 5, 5, 0.9, 2]])]
+    detections, max_confidence, detected = parser().parse_results(results)
+    assert len(detected) == 2
+    assert np.isclose(max_confidence, 0.9)
+
+
+def test_parse_without_boxes():
+    detections, max_confidence, detected = parser().parse_results([FakeResult([])])
+    assert detections == {"bus": False, "car": False}
+    assert max_confidence == 0.0
+    assert len(detected) == 0
+
+
+def test_parse_maps_roi_crop_back_and_filters_outside_zone():
+    roi = RegionOfInterest.from_rect(100, 100, 300, 300)
+    roi.crop(np.zeros((400, 400, 3), dtype=np.uint8))
+    results = [FakeResult([[10, 10, 50, 50, 0.9, 2],        # di dalam zona
+                           [150, 150, 250, 250, 0.9, 1]])]  # bagian bawah box di luar zona
+    detections, _, detected = parser(roi).parse_results(results)
+    assert detected.boxes.tolist() == [[110, 110, 150, 150]]
+    assert detections == {"bus": True, "car": False}
@@ -0,0 +1,44 @@
+from VehicleDetection_OnlyDetection import DetectionScheduler
+
+
+def run(scheduler, frames, inference_time, propagation_time, quality=1.0):
+    detected = []
+    for _ in range(frames):
+        if scheduler.should_detect():
+            scheduler.record_detection(inference_time)
+            detected.append(True)
+        else:
+            scheduler.record_propagation(propagation_time, quality)
+            detected.append(False)
+    return detected
+
+
+def test_fast_inference_detects_every_frame():
+    scheduler = DetectionScheduler(target_latency=0.05)
+    assert all(run(scheduler, 10, 0.02, 0.005))
+    assert scheduler.interval == 1
+    assert scheduler.detection_ratio == 1.0
+
+
+def test_interval_meets_target_latency():
+    scheduler = DetectionScheduler(target_latency=0.05, max_interval=10)
+    run(scheduler, 50, 0.2, 0.01)
+    # (0.2 + (N - 1) * 0.01) / N <= 0.05 -> N = ceil(0.19 / 0.04) = 5
+    assert scheduler.interval == 5
+    detected = run(scheduler, 20, 0.2, 0.01)
+    assert detected.count(True) == 4
+
+
+def test_interval_is_capped_when_propagation_is_too_slow():
+    scheduler = DetectionScheduler(target_latency=0.05, max_interval=6)
+    run(scheduler, 20, 0.2, 0.06)
+    assert scheduler.interval == 6
+
+
+def test_low_propagation_quality_forces_detection():
+    scheduler = DetectionScheduler(target_latency=0.05, min_quality=0.5)
+    run(scheduler, 10, 0.2, 0.01)
+    assert scheduler.interval > 2
+    scheduler.record_detection(0.2)
+    scheduler.record_propagation(0.01, quality=0.3)
+    assert scheduler.should_detect()
@@ -0,0 +1,100 @@
+from VehicleDetection_OnlyDetection import FrameRateGovernor, VehicleDetector
+
+
+class FakeClock:
+    """Waktu palsu: hanya maju lewat work() dan sleep()"""
+
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def work(self, seconds):
+        self.now += seconds
+
+
+def make_governor(clock, **kwargs):
+    return FrameRateGovernor(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def run_loop(governor, clock, frames, work=0.0, active=True):
+    for _ in range(frames):
+        clock.work(work)
+        governor.wait(active=active)
+
+
+class StubModel:
+    names = {0: 'bus', 1: 'car'}
+
+
+def test_sleeps_only_the_remaining_budget():
+    clock = FakeClock()
+    governor = make_governor(clock, target_fps=50)
+    run_loop(governor, clock, 11, work=0.015)
+    # Iterasi pertama belum punya interval, sisanya 15 ms kerja + 5 ms sleep (bukan 15 + 20)
+    assert len(clock.sleeps) == 10
+    assert all(abs(seconds - 0.005) < 1e-9 for seconds in clock.sleeps)
+    assert abs(governor.achieved_fps - 50) < 1e-6
+    assert abs(governor.sleep_time - 0.05) < 1e-9
+
+
+def test_slow_iteration_does_not_sleep():
+    clock = FakeClock()
+    governor = make_governor(clock, target_fps=50)
+    run_loop(governor, clock, 5, work=0.04)
+    assert clock.sleeps == []
+    assert abs(governor.achieved_fps - 25) < 1e-6
+
+
+def test_unlimited_target_never_sleeps():
+    clock = FakeClock()
+    governor = make_governor(clock, target_fps=None)
+    run_loop(governor, clock, 100, work=0.001)
+    assert clock.sleeps == []
+    assert governor.sleep_time == 0.0
+    assert governor.frames == 99
+
+
+def test_idle_is_opt_in():
+    clock = FakeClock()
+    governor = make_governor(clock, target_fps=100, idle_after=0.0)
+    run_loop(governor, clock, 5, active=False)
+    assert not governor.idle
+    assert governor.current_target == 100
+
+
+def test_detector_never_idles_by_default():
+    detector = VehicleDetector("offline", "best.pt", capture_source="http", headless=True, model=StubModel())
+    governor = detector.governor
+    governor.clock = clock = FakeClock()
+    governor.sleep = clock.sleep
+    governor._last_active = clock()
+    run_loop(governor, clock, 10, work=60.0, active=False)
+    assert not governor.idle
+    assert governor.current_target == governor.target_fps
+
+
+def test_idle_and_wake_up():
+    clock = FakeClock()
+    governor = make_governor(clock, target_fps=100, idle_fps=20, idle_after=0.045)
+    run_loop(governor, clock, 5, active=False)
+    # 5 iterasi @ 10 ms = 40 ms kosong: belum idle
+    assert not governor.idle
+
+    run_loop(governor, clock, 2, active=False)
+    assert governor.idle
+    assert governor.current_target == 20
+    # Selama idle sisa budget dihitung dari 1/idle_fps
+    assert abs(clock.sleeps[-1] - 0.05) < 1e-9
+
+    governor.wait(active=True)
+    assert not governor.idle
+    assert governor.current_target == 100
+    assert governor.stats() == {'achieved_fps': round(governor.achieved_fps, 2), 'target_fps': 100,
+                                'idle': False}
@@ -0,0 +1,52 @@
+import threading
+import time
+
+from VehicleDetection_OnlyDetection import FrameRingBuffer
+
+
+def test_latest_frame_wins():
+    buffer = FrameRingBuffer(capacity=3)
+    for i in range(3):
+        buffer.put(f"frame{i}", timestamp=100.0 + i)
+    latest = buffer.get_latest(timeout=0)
+    assert latest.frame == "frame2"
+    assert latest.timestamp == 102.0
+    assert latest.seq == 3
+    # Dua frame lama ikut dibuang
+    assert buffer.dropped_frames == 2
+    assert len(buffer) == 0
+
+
+def test_full_buffer_evicts_oldest():
+    buffer = FrameRingBuffer(capacity=2)
+    for i in range(5):
+        buffer.put(i, timestamp=100.0 + i)
+    assert len(buffer) == 2
+    assert buffer.dropped_frames == 3
+    assert buffer.get_latest(timeout=0).frame == 4
+
+
+def test_empty_buffer_times_out():
+    buffer = FrameRingBuffer()
+    start = time.perf_counter()
+    assert buffer.get_latest(timeout=0.05) is None
+    assert time.perf_counter() - start >= 0.04
+
+
+def test_get_latest_wakes_up_on_put():
+    buffer = FrameRingBuffer()
+    timer = threading.Timer(0.05, buffer.put, args=("late",))
+    timer.start()
+    try:
+        assert buffer.get_latest(timeout=2.0).frame == "late"
+    finally:
+        timer.cancel()
+
+
+def test_clear_does_not_count_drops():
+    buffer = FrameRingBuffer()
+    buffer.put("a")
+    buffer.put("b")
+    buffer.clear()
+    assert len(buffer) == 0
+    assert buffer.dropped_frames == 0
@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+
+from VehicleDetection_OnlyDetection import JpegDecoder, RegionOfInterest
+
+
+def encode(width, height):
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[:, :width // 2] = 255
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+
+def test_jpeg_size_reads_sof_marker():
+    assert JpegDecoder.jpeg_size(encode(320, 240)) == (320, 240)
+    assert JpegDecoder.jpeg_size(encode(1600, 1200)) == (1600, 1200)
+
+
+def test_jpeg_size_of_garbage_is_none():
+    assert JpegDecoder.jpeg_size(b"\xff\xd8" + b"\x00" * 64) is None
+
+
+def test_choose_scale_keeps_min_size():
+    decoder = JpegDecoder(min_size=640)
+    assert decoder.choose_scale(1600, 1200) == 2
+    assert decoder.choose_scale(5120, 3840) == 8
+    assert decoder.choose_scale(640, 480) == 1
+    assert decoder.choose_scale(1279, 720) == 1
+
+
+def test_choose_scale_respects_max_reduction():
+    assert JpegDecoder(min_size=640, max_reduction=2).choose_scale(5120, 3840) == 2
+
+
+def test_choose_scale_full_resolution_when_min_size_is_none():
+    assert JpegDecoder(min_size=None).choose_scale(5120, 3840) == 1
+
+
+def test_choose_scale_uses_roi_extent():
+    # ROI setengah lebar & tinggi: crop 800x600 dari UXGA -> tidak boleh di-reduce
+    roi = RegionOfInterest.from_rect(0.0, 0.0, 0.5, 0.5)
+    assert JpegDecoder(min_size=640, roi=roi).choose_scale(1600, 1200) == 1
+    assert JpegDecoder(min_size=640).choose_scale(1600, 1200) == 2
+
+
+def test_decode_uses_reduced_scale_and_updates_roi():
+    roi = RegionOfInterest.from_rect(0.0, 0.0, 1.0, 1.0)
+    decoder = JpegDecoder(min_size=320, roi=roi)
+    frame = decoder.decode(encode(1280, 960))
+    assert decoder.scale == 4
+    assert frame.shape == (240, 320, 3)
+    assert roi.pixel_scale == 4
+    assert decoder.decode(None) is None
@@ -0,0 +1,85 @@
+import threading
+
+from VehicleDetection_OnlyDetection import MetricsRegistry
+
+
+def render_lines(metrics):
+    text = metrics.render()
+    assert text.endswith("\n")
+    return text.splitlines()
+
+
+def test_help_and_type_lines():
+    metrics = MetricsRegistry(namespace="test")
+    metrics.counter("frames_total", "Frames processed")
+    metrics.histogram("inference_seconds", "YOLO inference time")
+    metrics.gauge("queue_depth", "Queue depth", lambda: 3, queue="commands")
+    lines = render_lines(metrics)
+    assert "# HELP test_frames_total Frames processed" in lines
+    assert "# TYPE test_frames_total counter" in lines
+    assert "# TYPE test_inference_seconds histogram" in lines
+    assert "# TYPE test_queue_depth gauge" in lines
+    assert 'test_queue_depth{queue="commands"} 3' in lines
+
+
+def test_counter_labels_and_escaping():
+    metrics = MetricsRegistry(namespace="test")
+    metrics.counter("dropped_total", "Dropped frames")
+    metrics.inc("dropped_total", reason="superseded")
+    metrics.inc("dropped_total", 2, reason="superseded")
+    metrics.inc("dropped_total", reason='bad "quote"\\path\nline')
+    metrics.info("model_info", "Model", backend="onnx", model="C:\\weights\\best.onnx")
+    lines = render_lines(metrics)
+    assert 'test_dropped_total{reason="superseded"} 3' in lines
+    assert 'test_dropped_total{reason="bad \\"quote\\"\\\\path\\nline"} 1' in lines
+    assert 'test_model_info{backend="onnx",model="C:\\\\weights\\\\best.onnx"} 1' in lines
+
+
+def test_histogram_buckets_sum_count():
+    metrics = MetricsRegistry(namespace="test")
+    metrics.histogram("latency_seconds", "Latency", buckets=(0.25, 0.5, 1.0))
+    for value in (0.125, 0.25, 0.375, 0.75, 4.0):
+        metrics.observe("latency_seconds", value, stage="decode")
+    lines = render_lines(metrics)
+    assert lines[2:] == [
+        'test_latency_seconds_bucket{stage="decode",le="0.25"} 2',
+        'test_latency_seconds_bucket{stage="decode",le="0.5"} 3',
+        'test_latency_seconds_bucket{stage="decode",le="1.0"} 4',
+        'test_latency_seconds_bucket{stage="decode",le="+Inf"} 5',
+        'test_latency_seconds_sum{stage="decode"} 5.5',
+        'test_latency_seconds_count{stage="decode"} 5',
+    ]
+
+
+def test_timer_observes_block_duration():
+    metrics = MetricsRegistry(namespace="test")
+    metrics.histogram("block_seconds", "Block")
+    with metrics.timer("block_seconds"):
+        pass
+    assert "test_block_seconds_count 1" in render_lines(metrics)
+
+
+def test_failing_gauge_is_skipped():
+    metrics = MetricsRegistry(namespace="test")
+    metrics.gauge("broken", "Broken gauge", lambda: 1 / 0)
+    assert render_lines(metrics) == ["# HELP test_broken Broken gauge", "# TYPE test_broken gauge"]
+
+
+def test_per_thread_shards_sum_exactly():
+    metrics = MetricsRegistry(namespace="test")
+    metrics.counter("events_total", "Events")
+    metrics.histogram("value_seconds", "Values")
+
+    def work():
+        for _ in range(5000):
+            metrics.inc("events_total")
+            metrics.observe("value_seconds", 0.003)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    lines = render_lines(metrics)
+    assert "test_events_total 20000" in lines
+    assert "test_value_seconds_count 20000" in lines
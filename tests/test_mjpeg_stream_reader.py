@@ -0,0 +1,66 @@
+from VehicleDetection_OnlyDetection import MJPEGStreamReader
+
+BOUNDARY = b"123456789000000000000987654321"
+
+
+def part(jpeg, content_length=True):
+    headers = b"Content-Type: image/jpeg\r\n"
+    if content_length:
+        headers += b"Content-Length: %d\r\n" % len(jpeg)
+    return b"--" + BOUNDARY + b"\r\n" + headers + b"\r\n" + jpeg + b"\r\n"
+
+
+def test_parse_boundary_strips_dashes_and_quotes():
+    parse = MJPEGStreamReader._parse_boundary
+    assert parse('multipart/x-mixed-replace;boundary=--frame') == b"frame"
+    assert parse('multipart/x-mixed-replace; boundary="frame"') == b"frame"
+    # Tanpa boundary di header: default firmware ESP32-CAM
+    assert parse("multipart/x-mixed-replace") == BOUNDARY
+
+
+def test_splits_parts_with_content_length():
+    buffer = bytearray(part(b"\xff\xd8one\xff\xd9") + part(b"\xff\xd8two\xff\xd9"))
+    frames = MJPEGStreamReader._split_frames(buffer, BOUNDARY)
+    assert frames == [b"\xff\xd8one\xff\xd9", b"\xff\xd8two\xff\xd9"]
+
+
+def test_body_may_contain_crlf_when_length_is_known():
+    jpeg = b"\xff\xd8\r\n\r\n--\xff\xd9"
+    frames = MJPEGStreamReader._split_frames(bytearray(part(jpeg)), BOUNDARY)
+    assert frames == [jpeg]
+
+
+def test_without_content_length_body_ends_at_next_boundary():
+    buffer = bytearray(part(b"first", content_length=False) + part(b"second", content_length=False))
+    frames = MJPEGStreamReader._split_frames(buffer, BOUNDARY)
+    # Part terakhir belum tentu lengkap sampai boundary berikutnya datang
+    assert frames == [b"first"]
+    assert buffer.startswith(BOUNDARY)
+    buffer.extend(b"--" + BOUNDARY)
+    assert MJPEGStreamReader._split_frames(buffer, BOUNDARY) == [b"second"]
+
+
+def test_partial_chunks_are_reassembled():
+    stream = part(b"A" * 100) + part(b"B" * 50)
+    buffer = bytearray()
+    frames = []
+    for i in range(0, len(stream), 7):
+        buffer.extend(stream[i:i + 7])
+        frames.extend(MJPEGStreamReader._split_frames(buffer, BOUNDARY))
+    assert frames == [b"A" * 100, b"B" * 50]
+
+
+def test_garbage_without_boundary_keeps_only_tail():
+    buffer = bytearray(b"x" * 1000)
+    assert MJPEGStreamReader._split_frames(buffer, BOUNDARY) == []
+    assert len(buffer) == len(BOUNDARY)
+
+
+def test_read_returns_frame_with_its_timestamp():
+    reader = MJPEGStreamReader("http://127.0.0.1/stream")
+    reader._publish(b"first")
+    jpeg, timestamp = reader.read(timeout=0)
+    assert jpeg == b"first"
+    assert timestamp == reader.latest_timestamp
+    # Frame yang sama tidak dikembalikan dua kali
+    assert reader.read(timeout=0) == (None, None)
@@ -0,0 +1,32 @@
+import json
+import os
+
+from model_backends import ModelBackends
+
+
+def make_backends(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"")
+    return ModelBackends(str(weights))
+
+
+def test_auto_without_report_uses_pytorch(tmp_path, capsys):
+    backends = make_backends(tmp_path)
+    assert backends.select_backend() == "pytorch"
+    # Tidak ada artifact yang di-export saat startup
+    assert os.listdir(tmp_path) == ["best.pt"]
+    assert "--report" in capsys.readouterr().out
+
+
+def test_auto_picks_fastest_backend_from_report(tmp_path):
+    backends = make_backends(tmp_path)
+    report = {"imgsz": 640, "backends": {
+        "pytorch": {"latency_ms": 40.0, "map50_95": 0.70},
+        "onnx": {"latency_ms": 25.0, "map50_95": 0.69},
+        "onnx-int8": {"latency_ms": 10.0, "map50_95": 0.60},
+    }}
+    with open(backends.report_path, "w") as f:
+        json.dump(report, f)
+    backends.available_backends = lambda: ["pytorch", "onnx", "onnx-int8"]
+    # onnx-int8 lebih cepat tapi mAP turun melebihi max_map_drop
+    assert backends.select_backend() == "onnx"
@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+import VehicleDetection_OnlyDetection as detection
+from VehicleDetection_OnlyDetection import MultiCameraDetector
+
+
+class StubModel:
+    names = {0: 'bus', 1: 'car'}
+
+
+@pytest.fixture
+def roi_config(tmp_path):
+    path = tmp_path / "roi_config.json"
+    path.write_text(json.dumps({
+        "default": {"rect": [0.0, 0.5, 1.0, 1.0]},
+        "10.0.0.2": {"polygon": [[0.1, 0.1], [0.9, 0.1], [0.9, 0.9], [0.1, 0.9]]},
+    }))
+    return str(path)
+
+
+@pytest.fixture
+def multi_detector(monkeypatch, roi_config):
+    monkeypatch.setattr(detection.ModelBackends, "load", lambda self, backend="auto": StubModel())
+    return MultiCameraDetector(["10.0.0.1"], "best.pt", capture_source="http", headless=True,
+                               roi_config=roi_config)
+
+
+def camera_ips(multi_detector):
+    return [camera.esp32_cam_ip for camera in multi_detector.cameras]
+
+
+def test_first_discovery_adds_camera(multi_detector):
+    multi_detector.set_camera_ip(None, "10.0.0.3")
+    assert camera_ips(multi_detector) == ["10.0.0.1", "10.0.0.3"]
+    added = multi_detector.cameras[-1]
+    assert added.model is multi_detector.model
+    assert added.capture_source == "http"
+
+
+def test_known_ip_is_not_added_twice(multi_detector):
+    multi_detector.set_camera_ip(None, "10.0.0.1")
+    multi_detector.set_camera_ip(None, "10.0.0.3")
+    multi_detector.set_camera_ip(None, "10.0.0.3")
+    assert camera_ips(multi_detector) == ["10.0.0.1", "10.0.0.3"]
+
+
+def test_ip_change_swaps_camera_and_reloads_roi(multi_detector):
+    camera = multi_detector.cameras[0]
+    assert camera.roi.points.tolist()[0] == [0.0, 0.5]
+
+    multi_detector.set_camera_ip("10.0.0.1", "10.0.0.2")
+    assert camera_ips(multi_detector) == ["10.0.0.2"]
+    assert camera.capture_url == "http://10.0.0.2/capture"
+    assert camera.roi.points.tolist()[0] == pytest.approx([0.1, 0.1])
+    assert camera.decoder.roi is camera.roi
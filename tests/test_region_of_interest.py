@@ -0,0 +1,53 @@
+import cv2
+import numpy as np
+
+from VehicleDetection_OnlyDetection import RegionOfInterest
+
+
+def reference_contains(roi, boxes):
+    contour = roi.polygon.reshape(-1, 1, 2)
+    return np.array([cv2.pointPolygonTest(contour, (float((x1 + x2) // 2), float(y2)), False) >= 0
+                     for x1, _, x2, y2 in boxes], dtype=bool)
+
+
+def test_contains_matches_point_polygon_test():
+    roi = RegionOfInterest([[100, 50], [500, 80], [560, 400], [60, 440]])
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    roi.crop(frame)
+
+    rng = np.random.default_rng(0)
+    corners = rng.integers(0, 600, size=(500, 2))
+    boxes = np.column_stack([corners[:, 0], corners[:, 1] // 2, corners[:, 0] + 40, corners[:, 1] // 2 + 80])
+    assert np.array_equal(roi.contains(boxes), reference_contains(roi, boxes))
+
+
+def test_contains_boundary_and_outside_frame():
+    roi = RegionOfInterest.from_rect(0.25, 0.25, 0.75, 0.75)
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    roi.crop(frame)
+    boxes = np.array([
+        [90, 10, 110, 50],     # bottom-centre (100, 50): inside
+        [40, 10, 60, 25],      # (50, 25): on the corner, counts as inside
+        [0, 0, 20, 20],        # (10, 20): outside
+        [90, 60, 110, 500],    # below the frame: clipped to the bottom edge, outside the zone
+    ])
+    assert roi.contains(boxes).tolist() == [True, True, False, False]
+    assert roi.contains(np.zeros((0, 4))).tolist() == []
+
+
+def test_crop_and_to_frame_round_trip():
+    roi = RegionOfInterest([[0.5, 0.5], [1.0, 0.5], [1.0, 1.0], [0.5, 1.0]])
+    frame = np.zeros((100, 200, 3), dtype=np.uint8)
+    crop = roi.crop(frame)
+    assert crop.shape == (50, 100, 3)
+    assert roi.box == (100, 50, 200, 100)
+    assert roi.to_frame(np.array([[0, 0, 10, 10]])).tolist() == [[100, 50, 110, 60]]
+
+
+def test_mask_follows_frame_size():
+    roi = RegionOfInterest.from_rect(0.0, 0.5, 1.0, 1.0)
+    roi.crop(np.zeros((100, 100, 3), dtype=np.uint8))
+    assert roi.contains(np.array([[40, 0, 60, 90]])).tolist() == [True]
+    roi.crop(np.zeros((400, 400, 3), dtype=np.uint8))
+    assert roi.mask.shape == (400, 400)
+    assert roi.contains(np.array([[40, 0, 60, 90]])).tolist() == [False]
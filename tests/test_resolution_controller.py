@@ -0,0 +1,50 @@
+import numpy as np
+
+from VehicleDetection_OnlyDetection import DetectionResult, ResolutionController
+
+NAMES = {0: 'bus', 1: 'car'}
+EMPTY = DetectionResult.empty(NAMES)
+VEHICLE = DetectionResult(np.array([[0, 0, 10, 10]], dtype=np.int32), np.array([0.8], dtype=np.float32),
+                          np.array([0], dtype=np.int32), NAMES)
+
+
+def test_starts_at_full_resolution():
+    assert ResolutionController(sizes=(640, 320, 480)).imgsz == 640
+
+
+def test_empty_scene_steps_down_with_hold_time():
+    controller = ResolutionController(sizes=(320, 480, 640), empty_frames=3, hold_time=3600)
+    for _ in range(3):
+        controller.update(0.01, 0.01, EMPTY)
+    assert controller.imgsz == 480
+    assert controller.last_reason == "empty scene"
+    # hold_time: tidak turun lagi sebelum jeda minimum lewat
+    for _ in range(10):
+        controller.update(0.01, 0.01, EMPTY)
+    assert controller.imgsz == 480
+
+
+def test_vehicle_restores_full_resolution_immediately():
+    controller = ResolutionController(sizes=(320, 480, 640), empty_frames=1, hold_time=0)
+    controller.update(0.01, 0.01, EMPTY)
+    controller.update(0.01, 0.01, EMPTY)
+    assert controller.imgsz == 320
+    assert controller.update(0.01, 0.01, VEHICLE) == 640
+    assert controller.last_reason == "vehicles"
+
+
+def test_backlog_steps_down_even_with_vehicles():
+    controller = ResolutionController(sizes=(320, 480, 640), latency_budget=0.2, hold_time=0)
+    assert controller.update(0.5, 0.05, VEHICLE) == 480
+    assert controller.last_reason == "backlog"
+
+
+def test_vehicles_use_largest_size_within_budget():
+    controller = ResolutionController(sizes=(320, 480, 640), latency_budget=0.2, empty_frames=1, hold_time=0)
+    # 640 terukur terlalu lambat untuk budget
+    controller.update(0.1, 0.3, VEHICLE)
+    assert controller.imgsz == 480
+    assert controller.update(0.1, 0.1, VEHICLE) == 480
+    assert controller.stats[640]['frames'] == 1
+    assert np.isclose(controller.stats[640]['avg_inference_ms'], 300.0)
+    assert np.isclose(controller.stats[480]['avg_confidence'], 0.8)
@@ -0,0 +1,161 @@
+import http.server
+import multiprocessing
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from VehicleDetection_OnlyDetection import CaptureProcess, SharedFrameBus
+
+
+@pytest.fixture
+def bus():
+    bus = SharedFrameBus(slots=3, max_shape=(48, 64, 3))
+    yield bus
+    bus.close()
+
+
+def make_frame(value, shape=(24, 32, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def test_put_get_round_trip(bus):
+    seq = bus.put(make_frame(7), 123.5, 2)
+    frame, got_seq, timestamp, scale = bus.get(timeout=1.0)
+    assert got_seq == seq
+    assert frame.shape == (24, 32, 3)
+    assert (frame == 7).all()
+    assert timestamp == 123.5
+    assert scale == 2
+
+
+def test_put_latest_round_trip(bus):
+    bus.put(make_frame(1), 1.0)
+    seq = bus.put(make_frame(2, (16, 16, 3)), 2.0, 4)
+    frame, got_seq, timestamp, scale = bus.latest()
+    assert got_seq == seq
+    assert frame.shape == (16, 16, 3)
+    assert (frame == 2).all()
+    assert (timestamp, scale) == (2.0, 4)
+    assert bus.latest(after_seq=seq) is None
+
+
+def test_default_scale_is_one(bus):
+    bus.put(make_frame(3), 5.0)
+    assert bus.get(timeout=1.0)[3] == 1
+
+
+def test_held_slot_is_not_overwritten(bus):
+    bus.put(make_frame(9), 1.0)
+    frame = bus.get(timeout=1.0)[0]
+    for value in range(10, 20):
+        bus.put(make_frame(value), float(value))
+    assert (frame == 9).all()
+
+
+def test_frame_too_large_is_rejected(bus):
+    assert bus.put(make_frame(0, (96, 64, 3))) is None
+
+
+def write_frames(bus, values):
+    try:
+        for value in values:
+            bus.put(make_frame(value), float(value), 2)
+    finally:
+        bus.detach()
+
+
+def read_frame(bus, results):
+    try:
+        frame, seq, timestamp, scale = bus.get(timeout=5.0)
+        results.put((int(frame[0, 0, 0]), frame.shape, timestamp, scale))
+    finally:
+        bus.detach()
+
+
+def test_frame_from_child_process(bus):
+    process = multiprocessing.Process(target=write_frames, args=(bus, [5]))
+    process.start()
+    process.join(timeout=10)
+    assert process.exitcode == 0
+
+    frame, seq, timestamp, scale = bus.get(timeout=5.0)
+    assert frame.shape == (24, 32, 3)
+    assert (frame == 5).all()
+    assert (seq, timestamp, scale) == (1, 5.0, 2)
+
+
+def test_frame_to_child_process(bus):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=read_frame, args=(bus, results))
+    process.start()
+    bus.put(make_frame(8), 8.0, 4)
+    assert results.get(timeout=10) == (8, (24, 32, 3), 8.0, 4)
+    process.join(timeout=10)
+    assert process.exitcode == 0
+
+
+def test_child_writer_respects_parent_reader(bus):
+    bus.put(make_frame(1), 1.0)
+    frame = bus.get(timeout=1.0)[0]
+
+    process = multiprocessing.Process(target=write_frames, args=(bus, range(10, 30)))
+    process.start()
+    process.join(timeout=10)
+    assert process.exitcode == 0
+    assert (frame == 1).all()
+
+    bus.release()
+    latest = bus.latest()
+    assert latest is not None and (latest[0] == 29).all()
+
+
+def test_restarted_writer_continues_sequence(bus):
+    # Proses capture baru untuk bus yang sama (set_camera_ip): seq tidak mulai dari 0 lagi
+    for values in ([1, 2, 3], [4]):
+        process = multiprocessing.Process(target=write_frames, args=(bus, values))
+        process.start()
+        process.join(timeout=10)
+        assert process.exitcode == 0
+
+    assert bus.seq == 4
+    frame, seq, timestamp, scale = bus.latest()
+    assert (frame == 4).all()
+    assert (seq, timestamp) == (4, 4.0)
+
+
+def test_attach_by_name_is_not_supported():
+    with pytest.raises(TypeError):
+        SharedFrameBus(name="smart_crossing_frames")
+
+
+class CaptureHandler(http.server.BaseHTTPRequestHandler):
+    jpeg = cv2.imencode(".jpg", np.full((40, 60, 3), 128, dtype=np.uint8))[1].tobytes()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(self.jpeg)))
+        self.end_headers()
+        self.wfile.write(self.jpeg)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_capture_process_delivers_frames(bus):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), CaptureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    capture = CaptureProcess(f"127.0.0.1:{server.server_address[1]}", "http", bus)
+    try:
+        capture.start()
+        shared = bus.get(timeout=10.0)
+        assert shared is not None
+        frame, seq, timestamp, scale = shared
+        assert frame.shape == (40, 60, 3)
+        assert abs(int(frame.mean()) - 128) <= 2
+        assert scale == 1
+    finally:
+        capture.stop()
+        server.shutdown()
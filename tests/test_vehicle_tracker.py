@@ -0,0 +1,92 @@
+import numpy as np
+
+from VehicleDetection_OnlyDetection import DetectionResult, MotionGate, VehicleDetector, VehicleTracker
+
+NAMES = {0: 'bus', 1: 'car'}
+
+
+def result(*boxes, class_id=0, confidence=0.9):
+    return DetectionResult(np.array(boxes, dtype=np.int32).reshape(-1, 4),
+                           np.full(len(boxes), confidence, dtype=np.float32),
+                           np.full(len(boxes), class_id, dtype=np.int32), NAMES)
+
+
+def test_track_id_is_stable_across_frames():
+    tracker = VehicleTracker(NAMES)
+    ids = []
+    for i in range(5):
+        detected = result((100 + 5 * i, 100, 200 + 5 * i, 200))
+        tracker.update(detected, timestamp=100 + i * 0.1)
+        ids.append(int(detected.track_ids[0]))
+    assert len(set(ids)) == 1
+
+
+def test_vehicle_counted_once_after_min_hits():
+    tracker = VehicleTracker(NAMES, min_hits=3)
+    for i in range(2):
+        tracker.update(result((100, 100, 200, 200)), timestamp=100 + i * 0.1)
+    assert tracker.counts.get('bus', 0) == 0
+    for i in range(2, 10):
+        tracker.update(result((100, 100, 200, 200)), timestamp=100 + i * 0.1)
+    assert tracker.counts == {'bus': 1}
+
+
+def test_different_classes_are_not_matched():
+    tracker = VehicleTracker(NAMES)
+    tracker.update(result((100, 100, 200, 200), class_id=0), timestamp=100.0)
+    car = result((100, 100, 200, 200), class_id=1)
+    tracker.update(car, timestamp=100.1)
+    assert len(tracker.tracks) == 2
+    assert int(car.track_ids[0]) == 2
+
+
+def test_track_expires_after_max_age():
+    tracker = VehicleTracker(NAMES, max_age=1.0, min_hits=1)
+    tracker.update(result((100, 100, 200, 200)), timestamp=100.0)
+    tracker.update(result(), timestamp=102.0)
+    assert tracker.tracks == []
+    assert tracker.completed[-1]['class'] == 'bus'
+
+
+def test_propagated_boxes_do_not_add_hits_or_tracks():
+    tracker = VehicleTracker(NAMES, min_hits=3)
+    tracker.update(result((100, 100, 200, 200)), timestamp=100.0)
+    for i in range(1, 10):
+        tracker.update(result((100, 100, 200, 200), (400, 400, 500, 500)), timestamp=100 + i * 0.1,
+                       detected=False)
+    assert len(tracker.tracks) == 1
+    assert tracker.tracks[0].hits == 1
+    assert tracker.counts == {}
+
+
+def static_detector():
+    """VehicleDetector tanpa model/kamera: hanya state yang dipakai analyze_frame & update_counters"""
+    detector = VehicleDetector.__new__(VehicleDetector)
+    detector.roi = None
+    detector.scheduler = None
+    detector.motion_gate = MotionGate(force_interval=3600)
+    detector.tracker = VehicleTracker(NAMES, min_hits=3)
+    detector.last_analysis = None
+    detector.last_detected = True
+    return detector
+
+
+def test_motion_gate_reuse_is_not_a_tracker_hit():
+    detector = static_detector()
+    frame = np.zeros((120, 160, 3), dtype=np.uint8)
+
+    # Deteksi YOLO pertama, lalu frame statis: hasil lama dipakai ulang
+    assert detector.needs_inference(frame)
+    detected = result((10, 10, 50, 50))
+    detector.last_analysis = ({"bus": True, "car": False}, 0.9, detected)
+    detector.last_detected = True
+    detector.update_counters(detected, 100.0)
+
+    for i in range(1, 10):
+        reused = detector.analyze_frame(frame)
+        assert reused is detector.last_analysis
+        assert detector.last_detected is False
+        detector.update_counters(reused[2], 100 + i * 0.1)
+
+    assert detector.tracker.tracks[0].hits == 1
+    assert detector.bus_detected_count == 0
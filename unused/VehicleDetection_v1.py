@@ -4,18 +4,20 @@ import requests
 from ultralytics import YOLO
 import time
 import threading
-from queue import Queue
 from flask import Flask, request, jsonify, render_template_string
 from flask_socketio import SocketIO, emit
-import json
-from datetime import datetime
 import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from VehicleDetection_OnlyDetection import CrossingStateMachine, FrameRateGovernor, AsyncDeviceIO, DetectionPipeline
 
 class SmartTrainServer:
-    def __init__(self, esp32_cam_ip, esp32_train_ip, model_path):
+    def __init__(self, esp32_cam_ip, esp32_train_ip, model_path, target_fps=10, idle_fps=None):
         """
         Smart Train Level Crossing Server
         Combines ML detection, HTTP communication, and WebSocket monitoring
+        target_fps / idle_fps: frame rate normal / saat scene kosong (None = tidak pernah throttle)
         """
         # Device configurations
         self.esp32_cam_ip = esp32_cam_ip
@@ -29,11 +31,17 @@ class SmartTrainServer:
         
         # Detection state
         self.current_detections = {"bus": False, "car": False}
-        self.detection_history = []
         self.consecutive_detections_needed = 3
         self.last_command_sent = None
         self.barrier_state = "UP"  # UP or DOWN
         
+        # Debounce palang: hysteresis + minimum hold time, setiap transisi mengirim perintah ke ESP32-Train
+        # Palang naik setelah 2 frame tanpa bus DAN minimal 2 detik DOWN (dulu: 2 frame saja)
+        self.crossing = CrossingStateMachine(lower_hits=self.consecutive_detections_needed, raise_misses=2,
+                                             lower_confidence=0.7, hold_confidence=0.4,
+                                             min_down_time=2.0, min_up_time=1.0,
+                                             on_transition=self.on_crossing_transition)
+        
         # Performance tracking
         self.total_frames_processed = 0
         self.detection_count = 0
@@ -47,6 +55,13 @@ class SmartTrainServer:
         # Detection control
         self.detection_running = False
         self.detection_thread = None
+        self.pipeline = None
+        self.governor = FrameRateGovernor(target_fps=target_fps, idle_fps=idle_fps)
+        
+        # Non-blocking network I/O: frame prefetch + perintah palang di event loop terpisah
+        self.io = AsyncDeviceIO(self.capture_url, None, self.train_control_url)
+        self.barrier_future = None  # perintah palang otomatis yang masih in flight
+        self.barrier_event = None   # transisi CrossingStateMachine milik perintah tsb
         
         self.setup_routes()
         self.setup_socketio_handlers()
@@ -256,7 +271,7 @@ class SmartTrainServer:
                 value = data.get('value')
                 
                 # Send command to ESP32 train
-                result = self.send_command_to_train(command, value)
+                result = self.send_command_to_train(command, value).result(timeout=30)
                 
                 # Broadcast to WebSocket clients
                 self.socketio.emit('barrier_status', {
@@ -299,7 +314,8 @@ class SmartTrainServer:
                 'total_frames': self.total_frames_processed,
                 'detection_count': self.detection_count,
                 'last_detection': self.last_detection_time,
-                'current_detections': self.current_detections
+                'current_detections': self.current_detections,
+                'frame_rate': self.governor.stats()
             })
     
     def setup_socketio_handlers(self):
@@ -346,22 +362,21 @@ class SmartTrainServer:
         return cam_ok, train_ok
     
     def capture_frame_from_camera(self):
-        """Capture frame from ESP32-CAM"""
-        try:
-            response = requests.get(self.capture_url, timeout=3)
-            if response.status_code == 200:
-                nparr = np.frombuffer(response.content, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                return frame
-            return None
-        except Exception as e:
-            print(f"Frame capture error: {e}")
+        """Get newest frame prefetched by the async camera task"""
+        jpeg = self.io.get_latest_jpeg(timeout=3)
+        if jpeg is None:
             return None
+        nparr = np.frombuffer(jpeg, np.uint8)
+        return cv2.imdecode(nparr, cv2.IMREAD_COLOR)
     
     def detect_objects(self, frame):
         """Run YOLO detection on frame and return annotated frame"""
         try:
-            results = self.model(frame, conf=self.conf_threshold, verbose=False)
+            # Selama palang DOWN, bus >= hold_confidence juga harus sampai ke CrossingStateMachine (hysteresis)
+            conf = self.conf_threshold
+            if self.crossing.state == "DOWN":
+                conf = min(conf, self.crossing.hold_confidence)
+            results = self.model(frame, conf=conf, verbose=False)
             
             detections = {"bus": False, "car": False}
             max_confidence = 0.0
@@ -377,6 +392,10 @@ class SmartTrainServer:
                         confidence = float(box.conf[0])
                         class_name = self.model.names[cls_id].lower()
                         
+                        # Di bawah conf_threshold hanya bus yang dipakai (menahan palang)
+                        if confidence < self.conf_threshold and class_name != "bus":
+                            continue
+                        
                         if class_name in detections:
                             detections[class_name] = True
                             if confidence > max_confidence:
@@ -446,134 +465,136 @@ class SmartTrainServer:
             return {"bus": False, "car": False}, 0.0, frame
     
     def send_command_to_train(self, command, value):
-        """Send HTTP command to ESP32 train with improved error handling"""
+        """
+        Schedule HTTP command to ESP32 train without blocking the caller
+        Returns Future (True/False); retries & timeouts run in AsyncDeviceIO,
+        barrier_state hanya diubah setelah ESP32 menjawab
+        """
+        def finished(future):
+            try:
+                success = future.result()
+            except Exception as e:
+                print(f"❌ Unexpected error sending command: {e}")
+                success = False
+            if success:
+                print(f"✅ Command sent: {command}={value}")
+                self.last_command_sent = f"{command}={value}"
+                if command == "barrier":
+                    self.barrier_state = value.upper()
+            else:
+                print(f"❌ Command failed: {command}={value}")
+        
+        return self.io.send_command(command, value, on_done=finished)
+    
+    def on_crossing_transition(self, event):
+        """
+        CrossingStateMachine event: jadwalkan perintah palang (non-blocking)
+        Transisi diterima optimistis; jika perintah gagal, resolve_barrier_command
+        mengembalikan state ke event['from'] (reason "command_failed")
+        """
+        if event['reason'] not in ("manual", "command_failed"):
+            print(f"{'🚨 Lowering' if event['to'] == 'DOWN' else '✅ Raising'} barrier - {event['reason']}")
+            self.barrier_future = self.send_command_to_train("barrier", event['to'].lower())
+            self.barrier_event = event
         try:
-            payload = {
-                "command": command,
-                "value": value,
-                "timestamp": time.time()
-            }
-            
-            # Increased timeout and retry logic
-            max_retries = 2
-            timeout_seconds = 10  # Increased from 5 to 10 seconds
-            
-            for attempt in range(max_retries):
-                try:
-                    response = requests.post(
-                        self.train_control_url,
-                        json=payload,
-                        timeout=timeout_seconds,
-                        headers={'Content-Type': 'application/json'}
-                    )
-                    
-                    if response.status_code == 200:
-                        print(f"✅ Command sent: {command}={value}")
-                        self.last_command_sent = f"{command}={value}"
-                        if command == "barrier":
-                            self.barrier_state = value.upper()
-                        return True
-                    else:
-                        print(f"⚠️  Command response {response.status_code}: {command}={value}")
-                        if attempt < max_retries - 1:
-                            print(f"🔄 Retrying... (attempt {attempt + 2}/{max_retries})")
-                            time.sleep(1)
-                        else:
-                            return False
-                            
-                except requests.exceptions.Timeout:
-                    print(f"⏱️  Timeout on attempt {attempt + 1}/{max_retries} for {command}={value}")
-                    if attempt < max_retries - 1:
-                        print(f"🔄 Retrying with longer timeout...")
-                        time.sleep(2)  # Wait longer before retry
-                    else:
-                        print(f"❌ Final timeout - ESP32 may be busy moving servo")
-                        # Still consider it successful since servo might be moving
-                        self.last_command_sent = f"{command}={value} (timeout)"
-                        if command == "barrier":
-                            self.barrier_state = value.upper()
-                        return True  # Return True because command was likely received
-                        
-                except requests.exceptions.ConnectionError as e:
-                    print(f"🔌 Connection error attempt {attempt + 1}: {e}")
-                    if attempt < max_retries - 1:
-                        time.sleep(2)
-                    else:
-                        return False
-                        
-        except Exception as e:
-            print(f"❌ Unexpected error sending command: {e}")
-            return False
+            self.socketio.emit('crossing_event', event)
+        except Exception:
+            pass
+        return True
     
     def process_detection_logic(self, detections, confidence):
-        """Smart detection logic with consecutive detection filtering"""
+        """Smart detection logic with consecutive detection filtering (CrossingStateMachine)"""
         current_time = time.time()
         
-        # Add to history
-        self.detection_history.append({
-            "timestamp": current_time,
-            "bus": detections["bus"],
-            "confidence": confidence
-        })
-        
-        # Keep only recent history (last 10 seconds)
-        cutoff_time = current_time - 10
-        self.detection_history = [
-            h for h in self.detection_history 
-            if h["timestamp"] > cutoff_time
-        ]
-        
-        # Check for consecutive detections
-        if len(self.detection_history) >= self.consecutive_detections_needed:
-            recent = self.detection_history[-self.consecutive_detections_needed:]
-            consecutive_bus = all(h["bus"] for h in recent)
-            avg_confidence = np.mean([h["confidence"] for h in recent if h["bus"]] or [0])
-            
-            action_taken = None
+        # Selama perintah palang masih in flight, state machine ditahan (tidak ada perintah bertumpuk)
+        event = None
+        if self.barrier_future is None or self.barrier_future.done():
+            self.resolve_barrier_command(current_time)
+            # Palang mungkin diubah manual lewat /api/control
+            self.crossing.sync(self.barrier_state, current_time, reason="manual")
+            event = self.crossing.update(detections["bus"], confidence, current_time)
+        action_taken = event['event'] if event else None
+        if action_taken == "BARRIER_LOWERED":
+            self.detection_count += 1
+        
+        # Broadcast detection via WebSocket (with error handling)
+        try:
+            self.socketio.emit('detection_update', {
+                'bus_detected': detections["bus"],
+                'car_detected': detections["car"],
+                'confidence': confidence,
+                'timestamp': current_time,
+                'action': action_taken,
+                'barrier_state': self.barrier_state
+            })
             
-            # Decision logic
-            if consecutive_bus and self.barrier_state == "UP" and avg_confidence > 0.7:
-                # Lower barrier
-                print(f"🚨 Lowering barrier - {self.consecutive_detections_needed} consecutive bus detections (avg conf: {avg_confidence:.2f})")
-                if self.send_command_to_train("barrier", "down"):
-                    action_taken = "BARRIER_LOWERED"
-                    self.detection_count += 1
-                    
-            elif not detections["bus"] and self.barrier_state == "DOWN":
-                # Check if no bus detected for last few frames
-                recent_no_bus = all(not h["bus"] for h in self.detection_history[-2:])
-                if recent_no_bus:
-                    print(f"✅ Raising barrier - no bus detected")
-                    if self.send_command_to_train("barrier", "up"):
-                        action_taken = "BARRIER_RAISED"
-        
-            # Broadcast detection via WebSocket (with error handling)
-            try:
-                self.socketio.emit('detection_update', {
-                    'bus_detected': detections["bus"],
-                    'car_detected': detections["car"],
-                    'confidence': confidence,
-                    'timestamp': current_time,
-                    'action': action_taken,
-                    'barrier_state': self.barrier_state
-                })
-                
-                # Update stats
-                self.socketio.emit('system_stats', {
-                    'total_frames': self.total_frames_processed,
-                    'bus_detections': self.detection_count,
-                    'detection_count': self.detection_count
-                })
-            except Exception as e:
-                # Don't let WebSocket errors break the main loop
-                pass
-        
+            # Update stats
+            self.socketio.emit('system_stats', {
+                'total_frames': self.total_frames_processed,
+                'bus_detections': self.detection_count,
+                'detection_count': self.detection_count,
+                'fps': round(self.governor.achieved_fps, 1),
+                'target_fps': self.governor.current_target
+            })
+        except Exception as e:
+            # Don't let WebSocket errors break the main loop
+            pass
+    
         self.current_detections = detections
         if detections["bus"]:
             self.last_detection_time = current_time
     
+    def resolve_barrier_command(self, timestamp):
+        """
+        Hasil perintah palang otomatis diambil dari future-nya sendiri:
+        future sudah done sebelum done-callback (yang mengubah barrier_state) selesai jalan
+        """
+        future, self.barrier_future = self.barrier_future, None
+        if future is None:
+            return
+        if self._command_succeeded(future):
+            self.barrier_state = self.barrier_event['to']
+        else:
+            # Kembali ke state sebelum transisi, dicoba lagi setelah min_up_time / min_down_time
+            self.crossing.sync(self.barrier_event['from'], timestamp, reason="command_failed")
+        self.barrier_event = None
+    
+    def _command_succeeded(self, future):
+        try:
+            return future.result() is True
+        except Exception:
+            return False
+    
+    def _stage_capture(self, _):
+        """Pipeline stage: newest frame from ESP32-CAM, paced by the frame rate governor"""
+        frame = self.capture_frame_from_camera()
+        self.governor.wait(active=any(self.current_detections.values()))
+        return frame
+    
+    def _stage_infer(self, frame):
+        """Pipeline stage: YOLO detection (+ annotation)"""
+        self.total_frames_processed += 1
+        detections, confidence, annotated_frame = self.detect_objects(frame)
+        return {'detections': detections, 'confidence': confidence, 'annotated_frame': annotated_frame}
+    
+    def _stage_publish(self, item):
+        """Pipeline stage: barrier logic + WebSocket broadcast"""
+        self.process_detection_logic(item['detections'], item['confidence'])
+        
+        # Display info in console
+        confidence = item['confidence']
+        if item['detections']["bus"]:
+            print(f"🚌 Bus detected! Confidence: {confidence:.2f}")
+        elif item['detections']["car"]:
+            print(f"🚗 Car detected! Confidence: {confidence:.2f}")
+        return item
+    
     def detection_loop(self):
-        """Main detection loop running in separate thread"""
+        """
+        Main detection loop running in separate thread
+        Capture, infer dan publish berjalan sebagai DetectionPipeline (thread per stage),
+        thread ini hanya menampilkan frame dan membaca keyboard
+        """
         print("🚀 Starting detection loop...")
         
         # Setup OpenCV window
@@ -581,54 +602,49 @@ class SmartTrainServer:
         cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
         cv2.resizeWindow(window_name, 800, 600)
         
+        self.pipeline = DetectionPipeline([
+            ("capture", self._stage_capture),
+            ("infer", self._stage_infer),
+            ("publish", self._stage_publish),
+        ])
+        self.pipeline.start()
+        
         while self.detection_running:
             try:
-                # Capture frame
-                frame = self.capture_frame_from_camera()
-                if frame is not None:
-                    self.total_frames_processed += 1
-                    
-                    # Run detection and get annotated frame
-                    detections, confidence, annotated_frame = self.detect_objects(frame)
-                    
-                    # Process detection logic
-                    self.process_detection_logic(detections, confidence)
-                    
-                    # Display annotated frame
-                    cv2.imshow(window_name, annotated_frame)
-                    
-                    # Display info in console
-                    if detections["bus"]:
-                        print(f"🚌 Bus detected! Confidence: {confidence:.2f}")
-                    elif detections["car"]:
-                        print(f"🚗 Car detected! Confidence: {confidence:.2f}")
-                    
-                    # Check for quit key
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('q'):
-                        print("🛑 'q' pressed - stopping detection")
-                        self.detection_running = False
-                        break
-                    elif key == ord('s'):
-                        # Save screenshot
-                        timestamp = int(time.time())
-                        filename = f"detection_screenshot_{timestamp}.jpg"
-                        cv2.imwrite(filename, annotated_frame)
-                        print(f"📸 Screenshot saved: {filename}")
+                item = self.pipeline.get(timeout=1.0)
+                if item is None:
+                    continue
+                annotated_frame = item['annotated_frame']
+                
+                # Display annotated frame
+                cv2.imshow(window_name, annotated_frame)
                 
-                time.sleep(0.1)  # 10 FPS
+                # Check for quit key
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    print("🛑 'q' pressed - stopping detection")
+                    self.detection_running = False
+                    break
+                elif key == ord('s'):
+                    # Save screenshot
+                    timestamp = int(time.time())
+                    filename = f"detection_screenshot_{timestamp}.jpg"
+                    cv2.imwrite(filename, annotated_frame)
+                    print(f"📸 Screenshot saved: {filename}")
                 
             except Exception as e:
                 print(f"Detection loop error: {e}")
                 time.sleep(1)
         
         # Cleanup
+        self.pipeline.stop()
         cv2.destroyAllWindows()
         print("🛑 Detection loop stopped")
     
     def start_detection_loop(self):
         """Start detection in separate thread"""
         if not self.detection_running:
+            self.io.start_camera()
             self.detection_running = True
             self.detection_thread = threading.Thread(target=self.detection_loop, daemon=True)
             self.detection_thread.start()
@@ -639,6 +655,7 @@ class SmartTrainServer:
         self.detection_running = False
         if self.detection_thread:
             self.detection_thread.join(timeout=2)
+        self.io.stop_camera()
         print("⏹️ Detection stopped")
     
     def run_server(self, host='0.0.0.0', port=5000, debug=False):
@@ -647,6 +664,7 @@ class SmartTrainServer:
         print(f"📊 Dashboard: http://{host}:{port}")
         print(f"🔌 WebSocket: ws://{host}:{port}")
         
+        self.io.start()
         self.socketio.run(self.app, host=host, port=port, debug=debug)
 
 def main():
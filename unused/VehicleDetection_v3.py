@@ -1,21 +1,165 @@
 import cv2
 import numpy as np
 import requests
-from ultralytics import YOLO
 import time
 import threading
-from queue import Queue
-from flask import Flask, request, jsonify, render_template_string
+from queue import Queue, Empty
+from flask import Flask, Response, request, jsonify, render_template_string
 from flask_socketio import SocketIO, emit
-import json
-from datetime import datetime
 import os
+import sys
+from collections import deque
+
+# Shared detector building blocks (repo root)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from VehicleDetection_OnlyDetection import AsyncDeviceIO, RegionOfInterest, FrameRateGovernor, MetricsRegistry, DetectionPipeline
+from model_backends import ModelBackends
+
+class CommandDispatcher:
+    def __init__(self, io, on_result=None, send_timeout=30):
+        """
+        Non-blocking dispatcher untuk command actuator (brake, barrier)
+        Command berulang untuk actuator yang sama digabung (coalescing),
+        hanya perubahan state yang dikirim ke ESP32
+        """
+        self.io = io
+        self.on_result = on_result
+        self.send_timeout = send_timeout
+        
+        # actuator -> (value, submit_time), satu slot per actuator
+        self._pending = {}
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        
+        # State per actuator
+        self.requested_state = {}
+        self.delivered_state = {}
+        
+        # Statistics
+        self.sent = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.skipped_unchanged = 0
+        self.latencies = deque(maxlen=100)
+        
+        self.running = False
+        self._thread = None
+    
+    def start(self):
+        """Start dispatcher worker thread"""
+        if not self.running:
+            self.running = True
+            self._thread = threading.Thread(target=self._worker, daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Stop dispatcher worker thread"""
+        self.running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+    
+    def submit(self, actuator, value):
+        """
+        Request actuator state, returns immediately
+        Returns True if this is a state change that will be sent
+        """
+        with self._lock:
+            if self.requested_state.get(actuator) == value:
+                self.skipped_unchanged += 1
+                return False
+            
+            self.requested_state[actuator] = value
+            if actuator in self._pending:
+                # Belum terkirim: ganti value, jangan antre dua kali
+                self.coalesced += 1
+                self._pending[actuator] = (value, self._pending[actuator][1])
+                return True
+            
+            self._pending[actuator] = (value, time.time())
+        
+        self.start()
+        self._queue.put(actuator)
+        return True
+    
+    def send_now(self, actuator, value):
+        """Send immediately and wait for the result (manual control)"""
+        with self._lock:
+            self.requested_state[actuator] = value
+            self._pending.pop(actuator, None)
+        return self._deliver(actuator, value, time.time())
+    
+    def _worker(self):
+        """Deliver pending commands one actuator at a time"""
+        while self.running:
+            try:
+                actuator = self._queue.get(timeout=0.5)
+            except Empty:
+                continue
+            
+            with self._lock:
+                if actuator not in self._pending:
+                    continue
+                value, submit_time = self._pending.pop(actuator)
+                if self.delivered_state.get(actuator) == value:
+                    # Request balik ke state yang sudah terkirim sebelum sempat dikirim
+                    self.skipped_unchanged += 1
+                    continue
+            
+            self._deliver(actuator, value, submit_time)
+    
+    def _deliver(self, actuator, value, submit_time):
+        """Send via the async I/O layer and record latency/success"""
+        self.sent += 1
+        try:
+            success = self.io.send_command(actuator, value).result(timeout=self.send_timeout)
+        except Exception as e:
+            print(f"❌ Train communication error: {e}")
+            success = False
+        
+        latency = time.time() - submit_time
+        self.latencies.append(latency)
+        
+        with self._lock:
+            if success:
+                self.succeeded += 1
+                self.delivered_state[actuator] = value
+            else:
+                self.failed += 1
+                # Allow the same request to be retried on the next frame
+                if self.requested_state.get(actuator) == value:
+                    self.requested_state[actuator] = self.delivered_state.get(actuator)
+        
+        if self.on_result is not None:
+            self.on_result(actuator, value, success, latency)
+        return success
+    
+    def stats(self):
+        """Delivery latency and success rate"""
+        latencies = sorted(self.latencies)
+        return {
+            'sent': self.sent,
+            'succeeded': self.succeeded,
+            'failed': self.failed,
+            'success_rate': self.succeeded / self.sent if self.sent else 1.0,
+            'coalesced': self.coalesced,
+            'skipped_unchanged': self.skipped_unchanged,
+            'pending': len(self._pending),
+            'avg_latency': sum(latencies) / len(latencies) if latencies else 0.0,
+            'p95_latency': latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0,
+            'delivered_state': dict(self.delivered_state)
+        }
 
 class SmartTrainServer:
-    def __init__(self, esp32_cam_ip, esp32_intersection_ip, esp32_train_ip, model_path):
+    def __init__(self, esp32_cam_ip, esp32_intersection_ip, esp32_train_ip, model_path, headless=False,
+                 roi_config=None, target_fps=10, idle_fps=None, backend="auto"):
         """
         Smart Train Level Crossing Server
         Combines ML detection, HTTP communication, and WebSocket monitoring
+        headless: tanpa OpenCV window & annotation (node production)
+        roi_config: file JSON zona perlintasan per kamera (None = full frame)
+        target_fps / idle_fps: frame rate normal / saat scene kosong (None = tidak pernah throttle)
+        backend: "auto" (tercepat menurut backend_report.json, PyTorch tanpa report), "pytorch", "onnx", ...
         """
         # Device configurations
         self.esp32_cam_ip = esp32_cam_ip
@@ -26,8 +170,12 @@ class SmartTrainServer:
         self.train_control_url = f"http://{esp32_train_ip}/control"
         
         # ML Model
-        self.model = YOLO(model_path)
+        model_backends = ModelBackends(model_path)
+        self.model = model_backends.load(backend)
+        self.model_path = model_path
+        self.backend = model_backends.backend
         self.conf_threshold = 0.6
+        self.roi = RegionOfInterest.from_config(roi_config, esp32_cam_ip)
         
         # Detection state
         self.current_detections = {"bus": False, "car": False, "person": False}
@@ -49,14 +197,47 @@ class SmartTrainServer:
         # Detection control
         self.detection_running = False
         self.detection_thread = None
+        self.pipeline = None
+        self.headless = headless
+        self.governor = FrameRateGovernor(target_fps=target_fps, idle_fps=idle_fps)
         
+        # Telemetry (/metrics)
+        self.metrics = MetricsRegistry()
+        
+        # Non-blocking network I/O (camera, intersection, train)
+        self.io = AsyncDeviceIO(self.capture_url, self.intersection_status_url, self.train_control_url,
+                                metrics=self.metrics)
+        self.dispatcher = CommandDispatcher(self.io, on_result=self._on_command_done)
+        
+        self.setup_metrics()
         self.setup_routes()
         self.setup_socketio_handlers()
         
         print(f"Smart Train Server Initialized")
         print(f"ESP32-CAM: {esp32_cam_ip}")
         print(f"ESP32-Train: {esp32_train_ip}")
-        print(f"Model: {model_path}")
+        print(f"Model: {model_path} ({self.backend})")
+    
+    def setup_metrics(self):
+        """Register metrics served on /metrics"""
+        m = self.metrics
+        m.counter("frames_processed_total", "Frames that went through detection")
+        m.counter("frames_dropped_total", "Frames captured but never detected, by reason")
+        m.histogram("capture_seconds", "ESP32-CAM /capture request latency")
+        m.histogram("decode_seconds", "JPEG decode time")
+        m.histogram("inference_seconds", "YOLO inference time")
+        m.histogram("postprocess_seconds", "Box filtering and annotation time")
+        m.histogram("command_roundtrip_seconds", "Train command latency from submit to ESP32 acknowledgement")
+        m.gauge("queue_depth", "Items waiting in internal queues", lambda: len(self.dispatcher._pending),
+                queue="commands")
+        m.gauge("queue_depth", "Items waiting in internal queues",
+                lambda: 1 if self.io.frame_seq != self.io._last_read_seq else 0, queue="camera")
+        m.gauge("queue_depth", "Items waiting in internal queues",
+                lambda: self.pipeline.stages[1].queue_depth if self.pipeline else 0, queue="infer")
+        m.gauge("queue_depth", "Items waiting in internal queues",
+                lambda: self.pipeline.stages[2].queue_depth if self.pipeline else 0, queue="publish")
+        m.gauge("fps", "Achieved detection loop frame rate", lambda: round(self.governor.achieved_fps, 2))
+        m.info("model_info", "Loaded detection model", backend=self.backend, model=self.model_path)
     
     def setup_routes(self):
         """Setup Flask HTTP routes"""
@@ -257,8 +438,8 @@ class SmartTrainServer:
                 command = data.get('command')
                 value = data.get('value')
                 
-                # Send command to ESP32 train
-                result = self.send_command_to_train(command, value)
+                # Send command to ESP32 train (manual request waits for the result)
+                result = self.send_command_to_train(command, value, wait=True)
                 
                 # Broadcast to WebSocket clients
                 self.socketio.emit('barrier_status', {
@@ -282,7 +463,8 @@ class SmartTrainServer:
             """Start detection loop"""
             if not self.detection_running:
                 self.start_detection_loop()
-                return jsonify({'status': 'success', 'message': 'Detection started - OpenCV window will appear'})
+                message = 'Detection started (headless)' if self.headless else 'Detection started - OpenCV window will appear'
+                return jsonify({'status': 'success', 'message': message})
             else:
                 return jsonify({'status': 'info', 'message': 'Detection already running'})
         
@@ -301,8 +483,15 @@ class SmartTrainServer:
                 'total_frames': self.total_frames_processed,
                 'detection_count': self.detection_count,
                 'last_detection': self.last_detection_time,
-                'current_detections': self.current_detections
+                'current_detections': self.current_detections,
+                'commands': self.dispatcher.stats(),
+                'frame_rate': self.governor.stats()
             })
+        
+        @self.app.route('/metrics')
+        def metrics():
+            """Prometheus scrape endpoint"""
+            return Response(self.metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
     
     def setup_socketio_handlers(self):
         """Setup WebSocket event handlers"""
@@ -348,28 +537,32 @@ class SmartTrainServer:
         return cam_ok, train_ok
     
     def capture_frame_from_camera(self):
-        """Capture frame from ESP32-CAM"""
-        try:
-            response = requests.get(self.capture_url, timeout=3)
-            if response.status_code == 200:
-                nparr = np.frombuffer(response.content, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                return frame
-            return None
-        except Exception as e:
-            print(f"Frame capture error: {e}")
+        """Get newest frame prefetched by the async camera task"""
+        jpeg = self.io.get_latest_jpeg(timeout=3)
+        if jpeg is None:
             return None
+        with self.metrics.timer("decode_seconds"):
+            nparr = np.frombuffer(jpeg, np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if frame is None:
+            self.metrics.inc("frames_dropped_total", reason="decode_error")
+        return frame
     
     def detect_objects(self, frame):
-        """Run YOLO detection on frame and return annotated frame"""
+        """Run YOLO detection on frame and return annotated frame (None in headless mode)"""
         try:
-            results = self.model(frame, conf=self.conf_threshold, verbose=False)
+            # Only the crossing zone goes to the model when an ROI is configured
+            model_input = self.roi.crop(frame) if self.roi is not None else frame
+            start = time.perf_counter()
+            results = self.model(model_input, conf=self.conf_threshold, verbose=False)
+            postprocess_start = time.perf_counter()
+            self.metrics.observe("inference_seconds", postprocess_start - start)
             
             detections = {"bus": False, "car": False, "person": False}
             max_confidence = 0.0
             
-            # Create annotated frame with bounding boxes
-            annotated_frame = frame.copy()
+            # Create annotated frame with bounding boxes (skipped in headless mode)
+            annotated_frame = None if self.headless else frame.copy()
             
             for result in results:
                 boxes = result.boxes
@@ -379,86 +572,91 @@ class SmartTrainServer:
                         confidence = float(box.conf[0])
                         class_name = self.model.names[cls_id].lower()
                         
+                        # Crop -> full-frame coordinates, ignore vehicles outside the crossing zone
+                        xyxy = box.xyxy[0].cpu().numpy()
+                        if self.roi is not None:
+                            xyxy = self.roi.to_frame(xyxy[None])[0]
+                            if not self.roi.contains(xyxy[None])[0]:
+                                continue
+                        
                         if class_name in detections:
                             detections[class_name] = True
                             if confidence > max_confidence:
                                 max_confidence = confidence
                             
-                            # Draw bounding box
-                            xyxy = box.xyxy[0].cpu().numpy().astype(int)
-                            x1, y1, x2, y2 = xyxy
+                            if annotated_frame is not None:
+                                # Draw bounding box
+                                x1, y1, x2, y2 = xyxy.astype(int)
                             
-                            # Choose color based on class
-                            if class_name == "bus":
-                                color = (0, 0, 255)  # Red for bus
-                                thickness = 3
-                            elif class_name == "car":
-                                color = (0, 255, 0)  # Green for car
-                                thickness = 2
-                            else:
-                                color = (255, 0, 0)  # Blue for person
-                                thickness = 2
+                                # Choose color based on class
+                                if class_name == "bus":
+                                    color = (0, 0, 255)  # Red for bus
+                                    thickness = 3
+                                elif class_name == "car":
+                                    color = (0, 255, 0)  # Green for car
+                                    thickness = 2
+                                else:
+                                    color = (255, 0, 0)  # Blue for person
+                                    thickness = 2
                             
-                            # Draw rectangle
-                            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, thickness)
+                                # Draw rectangle
+                                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, thickness)
                             
-                            # Draw label background
-                            label = f"{class_name}: {confidence:.2f}"
-                            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
-                            cv2.rectangle(annotated_frame, 
-                                        (x1, y1 - label_size[1] - 10), 
-                                        (x1 + label_size[0], y1), 
-                                        color, -1)
+                                # Draw label background
+                                label = f"{class_name}: {confidence:.2f}"
+                                label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)[0]
+                                cv2.rectangle(annotated_frame, 
+                                            (x1, y1 - label_size[1] - 10), 
+                                            (x1 + label_size[0], y1), 
+                                            color, -1)
                             
-                            # Draw label text
-                            cv2.putText(annotated_frame, label, 
-                                      (x1, y1 - 5), 
-                                      cv2.FONT_HERSHEY_SIMPLEX, 0.6, 
-                                      (255, 255, 255), 2)
+                                # Draw label text
+                                cv2.putText(annotated_frame, label, 
+                                          (x1, y1 - 5), 
+                                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, 
+                                          (255, 255, 255), 2)
             
-            # Add status text on frame
-            status_text = f"Barrier: {'DOWN' if self.barrier_state == 'DOWN' else 'UP'}"
-            cv2.putText(annotated_frame, status_text, (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+            if annotated_frame is not None:
+                if self.roi is not None:
+                    self.roi.draw(annotated_frame)
+                
+                # Add status text on frame
+                status_text = f"Barrier: {'DOWN' if self.barrier_state == 'DOWN' else 'UP'}"
+                cv2.putText(annotated_frame, status_text, (10, 30), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
             
-            detection_text = f"Detections: Bus={detections['bus']}, Car={detections['car']}"
-            cv2.putText(annotated_frame, detection_text, (10, 70), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+                detection_text = f"Detections: Bus={detections['bus']}, Car={detections['car']}"
+                cv2.putText(annotated_frame, detection_text, (10, 70), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
             
+            self.metrics.observe("postprocess_seconds", time.perf_counter() - postprocess_start)
             return detections, max_confidence, annotated_frame
             
         except Exception as e:
             print(f"Detection error: {e}")
-            return {"bus": False, "car": False, "person": False}, 0.0, frame
+            return {"bus": False, "car": False, "person": False}, 0.0, None if self.headless else frame
     
-    def send_command_to_train(self, command, value):
-        """Send HTTP command to ESP32 train"""
-        try:
-            payload = {
-                "command": command,
-                "value": value,
-                "timestamp": time.time()
-            }
-            
-            response = requests.post(
-                self.train_control_url,
-                json=payload,
-                timeout=5
-            )
-            
-            if response.status_code == 200:
-                print(f"Command sent: {command}={value}")
-                self.last_command_sent = f"{command}={value}"
-                if command == "barrier":
-                    self.barrier_state = value.upper()
-                return True
-            else:
-                print(f"❌ Command failed: {response.status_code}")
-                return False
-                
-        except Exception as e:
-            print(f"❌ Train communication error: {e}")
-            return False
+    def send_command_to_train(self, command, value, wait=False):
+        """
+        Send command to ESP32 train via the command dispatcher
+        wait=False: queue state change, return True if it differs from the last request
+        wait=True: send now and return True/False (manual control)
+        """
+        if wait:
+            return self.dispatcher.send_now(command, value)
+        return self.dispatcher.submit(command, value)
+    
+    def _on_command_done(self, command, value, success, latency):
+        """Update state once the ESP32 train acknowledged a command"""
+        self.metrics.observe("command_roundtrip_seconds", latency, command=command,
+                             result="success" if success else "failed")
+        if success:
+            print(f"Command sent: {command}={value} ({latency * 1000:.0f} ms)")
+            self.last_command_sent = f"{command}={value}"
+            if command == "barrier":
+                self.barrier_state = value.upper()
+        else:
+            print(f"❌ Command failed: {command}={value}")
     
     def process_detection_logic(self, detections, confidence):
         current_time = time.time()
@@ -469,7 +667,7 @@ class SmartTrainServer:
 
         action_taken = None
 
-        # Logika baru:
+        # Logika baru (hanya perubahan state yang dikirim, loop tidak menunggu servo):
         if detections["bus"] and intersection_barrier == "DOWN":
             # Kalau ada bus dan barrier Intersection turun → brake turun
             if self.send_command_to_train("brake", "down"):
@@ -493,7 +691,9 @@ class SmartTrainServer:
         self.socketio.emit('system_stats', {
             'total_frames': self.total_frames_processed,
             'bus_detections': self.detection_count,
-            'detection_count': self.detection_count
+            'detection_count': self.detection_count,
+            'fps': round(self.governor.achieved_fps, 1),
+            'target_fps': self.governor.current_target
         })
 
         self.current_detections = detections
@@ -501,63 +701,89 @@ class SmartTrainServer:
             self.last_detection_time = current_time
 
     
+    def _stage_capture(self, _):
+        """Pipeline stage: newest frame from ESP32-CAM, paced by the frame rate governor"""
+        frame = self.capture_frame_from_camera()
+        self.governor.wait(active=any(self.current_detections.values()))
+        return frame
+    
+    def _stage_infer(self, frame):
+        """Pipeline stage: YOLO detection (+ annotation)"""
+        self.total_frames_processed += 1
+        self.metrics.inc("frames_processed_total")
+        detections, confidence, annotated_frame = self.detect_objects(frame)
+        return {'detections': detections, 'confidence': confidence, 'annotated_frame': annotated_frame}
+    
+    def _stage_publish(self, item):
+        """Pipeline stage: barrier logic + WebSocket broadcast"""
+        self.process_detection_logic(item['detections'], item['confidence'])
+        
+        # Display info in console
+        confidence = item['confidence']
+        if item['detections']["bus"]:
+            print(f"Bus detected! Confidence: {confidence:.2f}")
+        elif item['detections']["car"]:
+            print(f"Car detected! Confidence: {confidence:.2f}")
+        return item
+    
     def detection_loop(self):
-        """Main detection loop running in separate thread"""
+        """
+        Main detection loop running in separate thread
+        Capture, infer dan publish berjalan sebagai DetectionPipeline (thread per stage),
+        thread ini hanya menampilkan frame dan membaca keyboard
+        """
         print("Starting detection loop...")
         
         # Setup OpenCV window
         window_name = "Smart Train - Live Detection"
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 800, 600)
+        if not self.headless:
+            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(window_name, 800, 600)
+        
+        self.pipeline = DetectionPipeline([
+            ("capture", self._stage_capture),
+            ("infer", self._stage_infer),
+            ("publish", self._stage_publish),
+        ])
+        self.pipeline.start()
         
         while self.detection_running:
             try:
-                # Capture frame
-                frame = self.capture_frame_from_camera()
-                if frame is not None:
-                    self.total_frames_processed += 1
-                    
-                    # Run detection and get annotated frame
-                    detections, confidence, annotated_frame = self.detect_objects(frame)
-                    
-                    # Process detection logic
-                    self.process_detection_logic(detections, confidence)
-                    
-                    # Display annotated frame
-                    cv2.imshow(window_name, annotated_frame)
-                    
-                    # Display info in console
-                    if detections["bus"]:
-                        print(f"Bus detected! Confidence: {confidence:.2f}")
-                    elif detections["car"]:
-                        print(f"Car detected! Confidence: {confidence:.2f}")
-                    
-                    # Check for quit key
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('q'):
-                        print("'q' pressed - stopping detection")
-                        self.detection_running = False
-                        break
-                    elif key == ord('s'):
-                        # Save screenshot
-                        timestamp = int(time.time())
-                        filename = f"detection_screenshot_{timestamp}.jpg"
-                        cv2.imwrite(filename, annotated_frame)
-                        print(f"Screenshot saved: {filename}")
+                item = self.pipeline.get(timeout=1.0)
+                if item is None or self.headless:
+                    continue
+                annotated_frame = item['annotated_frame']
+                
+                # Display annotated frame
+                cv2.imshow(window_name, annotated_frame)
                 
-                time.sleep(0.1)  # 10 FPS
+                # Check for quit key
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    print("'q' pressed - stopping detection")
+                    self.detection_running = False
+                    break
+                elif key == ord('s'):
+                    # Save screenshot
+                    timestamp = int(time.time())
+                    filename = f"detection_screenshot_{timestamp}.jpg"
+                    cv2.imwrite(filename, annotated_frame)
+                    print(f"Screenshot saved: {filename}")
                 
             except Exception as e:
                 print(f"Detection loop error: {e}")
                 time.sleep(1)
         
         # Cleanup
-        cv2.destroyAllWindows()
+        self.pipeline.stop()
+        if not self.headless:
+            cv2.destroyAllWindows()
         print("Detection loop stopped")
     
     def start_detection_loop(self):
         """Start detection in separate thread"""
         if not self.detection_running:
+            self.io.start_camera()
             self.detection_running = True
             self.detection_thread = threading.Thread(target=self.detection_loop, daemon=True)
             self.detection_thread.start()
@@ -568,25 +794,23 @@ class SmartTrainServer:
         self.detection_running = False
         if self.detection_thread:
             self.detection_thread.join(timeout=2)
+        self.io.stop_camera()
         print("Detection stopped")
     
     def run_server(self, host='0.0.0.0', port=5000, debug=False):
         """Run the Flask-SocketIO server"""
         print(f"\nStarting Smart Train Server on http://{host}:{port}")
         print(f"Dashboard: http://{host}:{port}")
+        print(f"Metrics: http://{host}:{port}/metrics")
         print(f"WebSocket: ws://{host}:{port}")
         
+        # Intersection polling harus jalan sebelum detection dimulai
+        self.io.start()
         self.socketio.run(self.app, host=host, port=port, debug=debug)
 
     def get_intersection_barrier_status(self):
-        try:
-            response = requests.get(self.intersection_status_url, timeout=3)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("barrier", "UNKNOWN")
-        except Exception as e:
-            print(f"Intersection status error: {e}")
-        return "UNKNOWN"
+        """Latest intersection barrier status, polled in the background"""
+        return self.io.intersection_barrier
 
 def main():
     # Configuration
@@ -594,6 +818,11 @@ def main():
     ESP32_INTERSECTION_IP = "192.168.1.26"     # Your ESP32-Intersection IP
     ESP32_TRAIN_IP = "192.168.1.27"        # Your ESP32-Train IP  
     MODEL_PATH = "./runs/detect/train/weights/best.pt"  # Your YOLO model
+    HEADLESS = False                     # True: no OpenCV window/annotation (production node)
+    ROI_CONFIG = "roi_config.json"       # Crossing zone per camera (see roi_config.example.json)
+    TARGET_FPS = 10                      # Frame rate while a vehicle is in view
+    IDLE_FPS = None                      # Power-saving rate while the scene is empty (opt-in, e.g. 2)
+    BACKEND = "auto"                     # Fastest backend from backend_report.json, PyTorch without a report
     
     # Verify model exists
     if not os.path.exists(MODEL_PATH):
@@ -602,7 +831,9 @@ def main():
         return
     
     # Create server
-    server = SmartTrainServer(ESP32_CAM_IP, ESP32_INTERSECTION_IP, ESP32_TRAIN_IP, MODEL_PATH)
+    server = SmartTrainServer(ESP32_CAM_IP, ESP32_INTERSECTION_IP, ESP32_TRAIN_IP, MODEL_PATH, headless=HEADLESS,
+                              roi_config=ROI_CONFIG, target_fps=TARGET_FPS, idle_fps=IDLE_FPS,
+                              backend=BACKEND)
     
     # Test connections
     cam_ok, train_ok = server.test_connections()
@@ -621,6 +852,8 @@ def main():
     except KeyboardInterrupt:
         print("\nShutting down server...")
         server.stop_detection_loop()
+        server.dispatcher.stop()
+        server.io.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,21 +1,31 @@
 import cv2
 import numpy as np
 import requests
-from ultralytics import YOLO
 import time
 import threading
-from flask import Flask, render_template_string
+from flask import Flask, Response, render_template_string
 from flask_socketio import SocketIO
 import paho.mqtt.client as mqtt
 import json
 import os
+import sys
 import ssl
 
+# Shared detector building blocks (repo root)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from VehicleDetection_OnlyDetection import RegionOfInterest, FrameRateGovernor, MetricsRegistry, DetectionPipeline
+from model_backends import ModelBackends
+
 class SmartCrossingDetector:
-    def __init__(self, esp32_cam_ip, model_path, mqtt_broker, mqtt_port, mqtt_user, mqtt_pass, mqtt_topic):
+    def __init__(self, esp32_cam_ip, model_path, mqtt_broker, mqtt_port, mqtt_user, mqtt_pass, mqtt_topic,
+                 headless=False, roi_config=None, target_fps=10, idle_fps=None, backend="auto"):
         """
         Smart Train Level Crossing - Simplified Version
         Hanya 1 IP untuk ESP32-CAM + Servo Palang
+        headless: tanpa OpenCV window & annotation (node production)
+        roi_config: file JSON zona perlintasan per kamera (None = full frame)
+        target_fps / idle_fps: frame rate normal / saat scene kosong (None = tidak pernah throttle)
+        backend: "auto" (tercepat menurut backend_report.json, PyTorch tanpa report), "pytorch", "onnx", ...
         """
         # Device configuration
         self.esp32_cam_ip = esp32_cam_ip
@@ -30,8 +40,12 @@ class SmartCrossingDetector:
         self.mqtt_topic = mqtt_topic
         
         # ML Model
-        self.model = YOLO(model_path)
+        model_backends = ModelBackends(model_path)
+        self.model = model_backends.load(backend)
+        self.model_path = model_path
+        self.backend = model_backends.backend
         self.conf_threshold = 0.6
+        self.roi = RegionOfInterest.from_config(roi_config, esp32_cam_ip)
         
         # Detection state
         self.current_detections = {"bus": False, "car": False}
@@ -50,6 +64,14 @@ class SmartCrossingDetector:
         # Detection control
         self.detection_running = False
         self.detection_thread = None
+        self.pipeline = None
+        self.headless = headless
+        self.governor = FrameRateGovernor(target_fps=target_fps, idle_fps=idle_fps)
+        
+        # Telemetry (/metrics): mid -> waktu publish / waktu PUBACK yang datang lebih dulu
+        self.metrics = MetricsRegistry()
+        self._publish_started = {}
+        self._publish_done = {}
         
         # MQTT Client
         self.mqtt_client = mqtt.Client()
@@ -57,14 +79,16 @@ class SmartCrossingDetector:
         self.mqtt_client.tls_set(cert_reqs=ssl.CERT_REQUIRED, tls_version=ssl.PROTOCOL_TLS)
         self.mqtt_client.on_connect = self.on_mqtt_connect
         self.mqtt_client.on_message = self.on_mqtt_message
+        self.mqtt_client.on_publish = self.on_mqtt_publish
         
+        self.setup_metrics()
         self.setup_routes()
         self.setup_socketio_handlers()
         
         print(f"Smart Crossing Detector Initialized")
         print(f"ESP32-CAM: {esp32_cam_ip}")
         print(f"MQTT Broker: {mqtt_broker}")
-        print(f"Model: {model_path}")
+        print(f"Model: {model_path} ({self.backend})")
     
     def on_mqtt_connect(self, client, userdata, flags, rc):
         """MQTT connection callback"""
@@ -90,6 +114,17 @@ class SmartCrossingDetector:
         except Exception as e:
             print(f"MQTT message error: {e}")
     
+    def on_mqtt_publish(self, client, userdata, mid):
+        """MQTT publish acknowledged by the broker: command round-trip"""
+        done = time.perf_counter()
+        entry = self._publish_started.pop(mid, None)
+        if entry is None:
+            # Callback lebih cepat dari publish() return, dicatat di send_barrier_command
+            self._publish_done[mid] = done
+            return
+        command, start = entry
+        self.metrics.observe("command_roundtrip_seconds", done - start, command=command, result="success")
+    
     def connect_mqtt(self):
         """Connect to MQTT broker"""
         try:
@@ -108,19 +143,47 @@ class SmartCrossingDetector:
         """
         try:
             payload = json.dumps({"status": command})
+            start = time.perf_counter()
             result = self.mqtt_client.publish(self.mqtt_topic, payload)
             
             if result.rc == mqtt.MQTT_ERR_SUCCESS:
+                done = self._publish_done.pop(result.mid, None)
+                if done is None:
+                    self._publish_started[result.mid] = (command, start)
+                else:
+                    self.metrics.observe("command_roundtrip_seconds", done - start, command=command,
+                                         result="success")
                 print(f"📤 MQTT Published: {payload}")
                 self.barrier_state = "UP" if command == "Terbuka" else "DOWN"
                 return True
             else:
                 print(f"❌ MQTT Publish failed: {result.rc}")
+                self.metrics.observe("command_roundtrip_seconds", time.perf_counter() - start, command=command,
+                                     result="failed")
                 return False
         except Exception as e:
             print(f"❌ MQTT error: {e}")
             return False
     
+    def setup_metrics(self):
+        """Register metrics served on /metrics"""
+        m = self.metrics
+        m.counter("frames_processed_total", "Frames that went through detection")
+        m.counter("frames_dropped_total", "Frames that could not be captured or decoded, by reason")
+        m.histogram("capture_seconds", "ESP32-CAM /capture request latency")
+        m.histogram("decode_seconds", "JPEG decode time")
+        m.histogram("inference_seconds", "YOLO inference time")
+        m.histogram("postprocess_seconds", "Box filtering and annotation time")
+        m.histogram("command_roundtrip_seconds", "Barrier command latency from MQTT publish to broker acknowledgement")
+        m.gauge("queue_depth", "Items waiting in internal queues", lambda: len(self._publish_started),
+                queue="mqtt_inflight")
+        m.gauge("queue_depth", "Items waiting in internal queues",
+                lambda: self.pipeline.stages[1].queue_depth if self.pipeline else 0, queue="infer")
+        m.gauge("queue_depth", "Items waiting in internal queues",
+                lambda: self.pipeline.stages[2].queue_depth if self.pipeline else 0, queue="publish")
+        m.gauge("fps", "Achieved detection loop frame rate", lambda: round(self.governor.achieved_fps, 2))
+        m.info("model_info", "Loaded detection model", backend=self.backend, model=self.model_path)
+    
     def setup_routes(self):
         """Setup Flask HTTP routes"""
         
@@ -288,6 +351,11 @@ class SmartCrossingDetector:
             self.stop_detection_loop()
             return jsonify({'status': 'stopped'})
         
+        @self.app.route('/metrics')
+        def metrics():
+            """Prometheus scrape endpoint"""
+            return Response(self.metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
+        
         from flask import request, jsonify
     
     def setup_socketio_handlers(self):
@@ -318,32 +386,42 @@ class SmartCrossingDetector:
     def capture_frame_from_camera(self):
         """Capture frame from ESP32-CAM"""
         try:
-            response = requests.get(self.capture_url, timeout=5)
+            with self.metrics.timer("capture_seconds"):
+                response = requests.get(self.capture_url, timeout=5)
             if response.status_code == 200:
-                img_array = np.frombuffer(response.content, np.uint8)
-                frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+                with self.metrics.timer("decode_seconds"):
+                    img_array = np.frombuffer(response.content, np.uint8)
+                    frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+                if frame is None:
+                    self.metrics.inc("frames_dropped_total", reason="decode_error")
                 return frame
             else:
                 print(f"Failed to capture: {response.status_code}")
+                self.metrics.inc("frames_dropped_total", reason="http_error")
                 return None
         except Exception as e:
             print(f"Capture error: {e}")
+            self.metrics.inc("frames_dropped_total", reason="capture_error")
             return None
     
     def detect_objects(self, frame):
         """
         Detect bus and car only using YOLO
-        Returns: detections dict, max_confidence, annotated_frame
+        Returns: detections dict, max_confidence, annotated_frame (None jika headless)
         """
         try:
-            # Run YOLO detection
-            results = self.model(frame, conf=self.conf_threshold, verbose=False)
+            # Run YOLO detection (hanya zona perlintasan jika ROI dikonfigurasi)
+            model_input = self.roi.crop(frame) if self.roi is not None else frame
+            start = time.perf_counter()
+            results = self.model(model_input, conf=self.conf_threshold, verbose=False)
+            postprocess_start = time.perf_counter()
+            self.metrics.observe("inference_seconds", postprocess_start - start)
             
             detections = {"bus": False, "car": False}
             max_confidence = 0.0
             
-            # Process results
-            annotated_frame = frame.copy()
+            # Process results (tanpa copy/drawing di headless mode)
+            annotated_frame = None if self.headless else frame.copy()
             
             for result in results:
                 boxes = result.boxes
@@ -352,26 +430,38 @@ class SmartCrossingDetector:
                     conf = float(box.conf[0])
                     class_name = self.model.names[cls]
                     
+                    # Koordinat crop -> full frame, kendaraan di luar zona perlintasan diabaikan
+                    xyxy = box.xyxy[0].cpu().numpy()
+                    if self.roi is not None:
+                        xyxy = self.roi.to_frame(xyxy[None])[0]
+                        if not self.roi.contains(xyxy[None])[0]:
+                            continue
+                    
                     # Only detect bus and car
                     if class_name in ['bus', 'car']:
                         detections[class_name] = True
                         max_confidence = max(max_confidence, conf)
                         
-                        # Draw bounding box
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        color = (0, 255, 0) if class_name == 'bus' else (255, 0, 0)
-                        cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
+                        if annotated_frame is not None:
+                            # Draw bounding box
+                            x1, y1, x2, y2 = map(int, xyxy)
+                            color = (0, 255, 0) if class_name == 'bus' else (255, 0, 0)
+                            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), color, 2)
                         
-                        # Draw label
-                        label = f"{class_name}: {conf:.2f}"
-                        cv2.putText(annotated_frame, label, (x1, y1 - 10),
-                                  cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+                            # Draw label
+                            label = f"{class_name}: {conf:.2f}"
+                            cv2.putText(annotated_frame, label, (x1, y1 - 10),
+                                      cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
             
+            if annotated_frame is not None and self.roi is not None:
+                self.roi.draw(annotated_frame)
+            
+            self.metrics.observe("postprocess_seconds", time.perf_counter() - postprocess_start)
             return detections, max_confidence, annotated_frame
             
         except Exception as e:
             print(f"Detection error: {e}")
-            return {"bus": False, "car": False}, 0.0, frame
+            return {"bus": False, "car": False}, 0.0, None if self.headless else frame
     
     def process_detection_logic(self, detections, confidence):
         """
@@ -408,59 +498,85 @@ class SmartCrossingDetector:
         # Update stats
         self.socketio.emit('system_stats', {
             'total_frames': self.total_frames_processed,
-            'detection_count': self.detection_count
+            'detection_count': self.detection_count,
+            'fps': round(self.governor.achieved_fps, 1),
+            'target_fps': self.governor.current_target
         })
         
         self.current_detections = detections
         if detections["bus"] or detections["car"]:
             self.last_detection_time = current_time
     
+    def _stage_capture(self, _):
+        """Pipeline stage: newest frame from ESP32-CAM, paced by the frame rate governor"""
+        frame = self.capture_frame_from_camera()
+        self.governor.wait(active=any(self.current_detections.values()))
+        return frame
+    
+    def _stage_infer(self, frame):
+        """Pipeline stage: YOLO detection (+ annotation)"""
+        self.total_frames_processed += 1
+        self.metrics.inc("frames_processed_total")
+        detections, confidence, annotated_frame = self.detect_objects(frame)
+        return {'detections': detections, 'confidence': confidence, 'annotated_frame': annotated_frame}
+    
+    def _stage_publish(self, item):
+        """Pipeline stage: barrier logic + WebSocket broadcast"""
+        self.process_detection_logic(item['detections'], item['confidence'])
+        return item
+    
     def detection_loop(self):
-        """Main detection loop running in separate thread"""
+        """
+        Main detection loop running in separate thread
+        Capture, infer dan publish berjalan sebagai DetectionPipeline (thread per stage),
+        thread ini hanya menampilkan frame dan membaca keyboard
+        """
         print("🚀 Starting detection loop...")
         
         # Setup OpenCV window
         window_name = "Smart Railway Crossing - Live Detection"
-        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-        cv2.resizeWindow(window_name, 800, 600)
+        if not self.headless:
+            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+            cv2.resizeWindow(window_name, 800, 600)
+        
+        self.pipeline = DetectionPipeline([
+            ("capture", self._stage_capture),
+            ("infer", self._stage_infer),
+            ("publish", self._stage_publish),
+        ])
+        self.pipeline.start()
         
         while self.detection_running:
             try:
-                # Capture frame
-                frame = self.capture_frame_from_camera()
-                if frame is not None:
-                    self.total_frames_processed += 1
-                    
-                    # Run detection and get annotated frame
-                    detections, confidence, annotated_frame = self.detect_objects(frame)
-                    
-                    # Process detection logic
-                    self.process_detection_logic(detections, confidence)
-                    
-                    # Display annotated frame
-                    cv2.imshow(window_name, annotated_frame)
-                    
-                    # Check for quit key
-                    key = cv2.waitKey(1) & 0xFF
-                    if key == ord('q'):
-                        print("'q' pressed - stopping detection")
-                        self.detection_running = False
-                        break
-                    elif key == ord('s'):
-                        # Save screenshot
-                        timestamp = int(time.time())
-                        filename = f"detection_{timestamp}.jpg"
-                        cv2.imwrite(filename, annotated_frame)
-                        print(f"📸 Screenshot saved: {filename}")
+                item = self.pipeline.get(timeout=1.0)
+                if item is None or self.headless:
+                    continue
+                annotated_frame = item['annotated_frame']
+                
+                # Display annotated frame
+                cv2.imshow(window_name, annotated_frame)
                 
-                time.sleep(0.1)  # 10 FPS
+                # Check for quit key
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    print("'q' pressed - stopping detection")
+                    self.detection_running = False
+                    break
+                elif key == ord('s'):
+                    # Save screenshot
+                    timestamp = int(time.time())
+                    filename = f"detection_{timestamp}.jpg"
+                    cv2.imwrite(filename, annotated_frame)
+                    print(f"📸 Screenshot saved: {filename}")
                 
             except Exception as e:
                 print(f"Detection loop error: {e}")
                 time.sleep(1)
         
         # Cleanup
-        cv2.destroyAllWindows()
+        self.pipeline.stop()
+        if not self.headless:
+            cv2.destroyAllWindows()
         print("Detection loop stopped")
     
     def start_detection_loop(self):
@@ -482,6 +598,7 @@ class SmartCrossingDetector:
         """Run the Flask-SocketIO server"""
         print(f"\n🌐 Starting Smart Crossing Server on http://{host}:{port}")
         print(f"📊 Dashboard: http://{host}:{port}")
+        print(f"📈 Metrics: http://{host}:{port}/metrics")
         
         self.socketio.run(self.app, host=host, port=port, debug=debug, allow_unsafe_werkzeug=True)
 
@@ -492,6 +609,11 @@ def main():
     
     # YOLO Model Path
     MODEL_PATH = "./runs/detect/train/weights/best.pt"  # Path ke model YOLO kamu
+    HEADLESS = False  # True: tanpa OpenCV window & annotation (node production)
+    ROI_CONFIG = "roi_config.json"  # Zona perlintasan per kamera (lihat roi_config.example.json)
+    TARGET_FPS = 10  # Frame rate saat ada kendaraan
+    IDLE_FPS = None  # Frame rate hemat daya saat scene kosong (opt-in, mis. 2)
+    BACKEND = "auto"  # Backend tercepat menurut backend_report.json, PyTorch kalau belum ada report
     
     # MQTT Configuration (HiveMQ Cloud)
     MQTT_BROKER = "9e108cb03c734f0394b0f0b49508ec1e.s1.eu.hivemq.cloud"
@@ -515,7 +637,12 @@ def main():
         mqtt_port=MQTT_PORT,
         mqtt_user=MQTT_USER,
         mqtt_pass=MQTT_PASS,
-        mqtt_topic=MQTT_TOPIC
+        mqtt_topic=MQTT_TOPIC,
+        headless=HEADLESS,
+        roi_config=ROI_CONFIG,
+        target_fps=TARGET_FPS,
+        idle_fps=IDLE_FPS,
+        backend=BACKEND
     )
     
     # Test camera connection